@@ -39,14 +39,25 @@ CREATE TABLE IF NOT EXISTS public.orders (
     code VARCHAR(64) NOT NULL UNIQUE,
     user_id UUID REFERENCES auth.users (id) ON DELETE CASCADE,
     client_id UUID REFERENCES public.clients (id) ON DELETE CASCADE,
-    created_at TIMESTAMPTZ DEFAULT now()
+    created_at TIMESTAMPTZ DEFAULT now(),
+    source_sha256 VARCHAR(64),
+    piece_count INTEGER NOT NULL DEFAULT 0,
+    hole_count INTEGER NOT NULL DEFAULT 0,
+    total_area_m2 FLOAT NOT NULL DEFAULT 0,
+    total_cut_length_m FLOAT NOT NULL DEFAULT 0,
+    materials JSONB NOT NULL DEFAULT '[]'
 );
 
+CREATE INDEX IF NOT EXISTS ix_public_orders_created_at ON public.orders (created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS ix_public_orders_client_id ON public.orders (client_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS ix_public_orders_user_id ON public.orders (user_id, created_at DESC, id DESC);
+
 -- 5. Tabella Poligoni (Pezzi dell'ordine)
 CREATE TABLE IF NOT EXISTS public.polygons (
     id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
     order_id UUID NOT NULL REFERENCES public.orders (id) ON DELETE CASCADE,
     label VARCHAR(255),
+    page_number INTEGER,
     width_mm FLOAT NOT NULL,
     height_mm FLOAT NOT NULL,
     material VARCHAR(255),
@@ -55,6 +66,10 @@ CREATE TABLE IF NOT EXISTS public.polygons (
     preview_path VARCHAR(512),
     technical_preview_path VARCHAR(512),
     dxf_path VARCHAR(512),
+    area_mm2 FLOAT,
+    cut_length_mm FLOAT,
+    outer_coords JSONB,
+    fingerprint VARCHAR(64),
     created_at TIMESTAMPTZ DEFAULT now()
 );
 
@@ -72,6 +87,9 @@ CREATE TABLE IF NOT EXISTS public.holes (
     created_at TIMESTAMPTZ DEFAULT now()
 );
 
+CREATE INDEX IF NOT EXISTS ix_public_polygons_order_id ON public.polygons (order_id, page_number, is_mirrored);
+CREATE INDEX IF NOT EXISTS ix_public_holes_polygon_id ON public.holes (polygon_id);
+
 -- 7. Libreria Fori
 CREATE TABLE IF NOT EXISTS public.hole_library (
     id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
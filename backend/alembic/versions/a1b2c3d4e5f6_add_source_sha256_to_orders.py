@@ -0,0 +1,24 @@
+"""Add source_sha256 to orders
+
+Revision ID: a1b2c3d4e5f6
+Revises: f0a1b2c3d4e5
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'a1b2c3d4e5f6'
+down_revision: Union[str, Sequence[str], None] = 'f0a1b2c3d4e5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('orders', sa.Column('source_sha256', sa.String(length=64), nullable=True), schema='public')
+
+
+def downgrade() -> None:
+    op.drop_column('orders', 'source_sha256', schema='public')
@@ -0,0 +1,77 @@
+"""Add denormalized aggregates to orders and per-piece metrics to polygons
+
+Revision ID: b2c3d4e5f6a7
+Revises: a1b2c3d4e5f6
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'b2c3d4e5f6a7'
+down_revision: Union[str, Sequence[str], None] = 'a1b2c3d4e5f6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('polygons', sa.Column('area_mm2', sa.Float(), nullable=True), schema='public')
+    op.add_column('polygons', sa.Column('cut_length_mm', sa.Float(), nullable=True), schema='public')
+
+    op.add_column('orders', sa.Column('piece_count', sa.Integer(), server_default=sa.text('0'), nullable=False), schema='public')
+    op.add_column('orders', sa.Column('hole_count', sa.Integer(), server_default=sa.text('0'), nullable=False), schema='public')
+    op.add_column('orders', sa.Column('total_area_m2', sa.Float(), server_default=sa.text('0'), nullable=False), schema='public')
+    op.add_column('orders', sa.Column('total_cut_length_m', sa.Float(), server_default=sa.text('0'), nullable=False), schema='public')
+    op.add_column('orders', sa.Column('materials', postgresql.JSONB(), server_default=sa.text("'[]'"), nullable=False), schema='public')
+
+    # Backfill: per i pezzi già importati il contorno non è salvato, si usa il rettangolo
+    # width x height (stessa approssimazione di piece_metrics senza outer_coords)
+    op.execute("""
+        UPDATE public.polygons p SET
+            area_mm2 = GREATEST(p.width_mm * p.height_mm - COALESCE(h.area, 0), 0),
+            cut_length_mm = 2 * (p.width_mm + p.height_mm) + COALESCE(h.length, 0)
+        FROM (
+            SELECT pp.id,
+                   SUM(CASE WHEN hh.diameter_mm IS NOT NULL THEN pi() * hh.diameter_mm ^ 2 / 4
+                            ELSE COALESCE(hh.width_mm * hh.height_mm, 0) END) AS area,
+                   SUM(CASE WHEN hh.diameter_mm IS NOT NULL THEN pi() * hh.diameter_mm
+                            ELSE COALESCE(2 * (hh.width_mm + hh.height_mm), 0) END) AS length
+            FROM public.polygons pp
+            LEFT JOIN public.holes hh ON hh.polygon_id = pp.id AND COALESCE(hh.depth_mm, 0) = 0
+            GROUP BY pp.id
+        ) h
+        WHERE h.id = p.id
+    """)
+    op.execute("""
+        UPDATE public.orders o SET
+            piece_count = a.piece_count,
+            hole_count = a.hole_count,
+            total_area_m2 = ROUND((a.area / 1000000)::numeric, 4),
+            total_cut_length_m = ROUND((a.length / 1000)::numeric, 3),
+            materials = a.materials
+        FROM (
+            SELECT p.order_id,
+                   COUNT(*) AS piece_count,
+                   SUM((SELECT COUNT(*) FROM public.holes h WHERE h.polygon_id = p.id)) AS hole_count,
+                   COALESCE(SUM(p.area_mm2), 0) AS area,
+                   COALESCE(SUM(p.cut_length_mm), 0) AS length,
+                   COALESCE(jsonb_agg(DISTINCT p.material ORDER BY p.material)
+                            FILTER (WHERE p.material IS NOT NULL), '[]'::jsonb) AS materials
+            FROM public.polygons p
+            GROUP BY p.order_id
+        ) a
+        WHERE a.order_id = o.id
+    """)
+
+
+def downgrade() -> None:
+    op.drop_column('orders', 'materials', schema='public')
+    op.drop_column('orders', 'total_cut_length_m', schema='public')
+    op.drop_column('orders', 'total_area_m2', schema='public')
+    op.drop_column('orders', 'hole_count', schema='public')
+    op.drop_column('orders', 'piece_count', schema='public')
+    op.drop_column('polygons', 'cut_length_mm', schema='public')
+    op.drop_column('polygons', 'area_mm2', schema='public')
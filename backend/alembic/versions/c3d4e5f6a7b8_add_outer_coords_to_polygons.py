@@ -0,0 +1,27 @@
+"""Store the piece outline on polygons
+
+Revision ID: c3d4e5f6a7b8
+Revises: b2c3d4e5f6a7
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3d4e5f6a7b8'
+down_revision: Union[str, Sequence[str], None] = 'b2c3d4e5f6a7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Nessun backfill: per i pezzi già importati l'export usa il rettangolo width x height
+    # finché il pezzo non viene rigenerato da un nuovo import o da una rielaborazione
+    op.add_column('polygons', sa.Column('outer_coords', postgresql.JSONB(), nullable=True), schema='public')
+
+
+def downgrade() -> None:
+    op.drop_column('polygons', 'outer_coords', schema='public')
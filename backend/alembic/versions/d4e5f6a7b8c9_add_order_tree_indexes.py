@@ -0,0 +1,41 @@
+"""Index foreign keys and sort columns of orders, polygons and holes
+
+Revision ID: d4e5f6a7b8c9
+Revises: c3d4e5f6a7b8
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4e5f6a7b8c9'
+down_revision: Union[str, Sequence[str], None] = 'c3d4e5f6a7b8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (nome, tabella, colonne)
+INDEXES = [
+    ('ix_public_polygons_order_id', 'polygons', ['order_id', 'page_number', 'is_mirrored']),
+    ('ix_public_holes_polygon_id', 'holes', ['polygon_id']),
+    ('ix_public_orders_created_at', 'orders', [sa.text('created_at DESC'), sa.text('id DESC')]),
+    ('ix_public_orders_client_id', 'orders', ['client_id', sa.text('created_at DESC'), sa.text('id DESC')]),
+    ('ix_public_orders_user_id', 'orders', ['user_id', sa.text('created_at DESC'), sa.text('id DESC')]),
+]
+
+
+def upgrade() -> None:
+    # CONCURRENTLY non blocca le scritture sulle tabelle ma non può girare in una transazione
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(
+                name, table, columns, unique=False, schema='public',
+                postgresql_concurrently=True, if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, schema='public', postgresql_concurrently=True, if_exists=True)
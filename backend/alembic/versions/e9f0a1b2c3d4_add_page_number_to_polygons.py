@@ -0,0 +1,24 @@
+"""Add page_number to polygons
+
+Revision ID: e9f0a1b2c3d4
+Revises: d8e9f0a1b2c3
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'e9f0a1b2c3d4'
+down_revision: Union[str, Sequence[str], None] = 'd8e9f0a1b2c3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('polygons', sa.Column('page_number', sa.Integer(), nullable=True), schema='public')
+
+
+def downgrade() -> None:
+    op.drop_column('polygons', 'page_number', schema='public')
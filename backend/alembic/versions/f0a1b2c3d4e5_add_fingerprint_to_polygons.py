@@ -0,0 +1,24 @@
+"""Add fingerprint to polygons
+
+Revision ID: f0a1b2c3d4e5
+Revises: e9f0a1b2c3d4
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'f0a1b2c3d4e5'
+down_revision: Union[str, Sequence[str], None] = 'e9f0a1b2c3d4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('polygons', sa.Column('fingerprint', sa.String(length=64), nullable=True), schema='public')
+
+
+def downgrade() -> None:
+    op.drop_column('polygons', 'fingerprint', schema='public')
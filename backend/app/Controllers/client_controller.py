@@ -12,7 +12,7 @@ from app.Router.supabase_auth import get_current_claims
 
 router = APIRouter(prefix="/clients", tags=["Clients"])
 
-def get_service(session: Annotated[AsyncSession, Depends(get_db)]) -> ClientService:
+def get_service(session: Annotated[AsyncSession, Depends(get_db, scope="function")]) -> ClientService:
     return ClientService(session)
 
 @router.get("/", response_model=List[ClientRead])
@@ -13,7 +13,7 @@ from app.Router.supabase_auth import get_current_claims
 router = APIRouter(prefix="/hole-library", tags=["Hole Library"])
 
 # Dependency per il servizio
-def get_service(session: Annotated[AsyncSession, Depends(get_db)]) -> HoleLibraryService:
+def get_service(session: Annotated[AsyncSession, Depends(get_db, scope="function")]) -> HoleLibraryService:
     return HoleLibraryService(session)
 
 @router.get("/", response_model=List[HoleLibraryRead])
@@ -1,19 +1,90 @@
 # app/Controllers/order_controller.py
 
-from typing import Annotated, List
-from fastapi import Depends, HTTPException, UploadFile, File
+import io
+import json
+import asyncio
+import logging
+import zipfile
+from collections import Counter, defaultdict
+from typing import Annotated, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+from fastapi import Depends, HTTPException, UploadFile, File, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from sqlalchemy.orm import selectinload
-from app.Infrastructure.db_supabase import get_db
+from app.Core.config import settings
+from app.Core.uploads import StoredUpload, receive_upload
+from app.Core.pagination import clamp_limit, encode_cursor, decode_cursor
+from app.Core.responses import dumps_json, cached_json_response
+from app.Core.response_cache import order_cache, LISTS
+from app.Infrastructure.db_supabase import get_db, SessionLocal, open_read_session
 from app.Services.pdf_processing_service import PDFProcessingService
-from app.Models.order import Order
-from app.Models.polygon import Polygon
-from app.Models.hole import Hole
-from app.Schemas.order import OrderRead
+from app.Services.order_service import OrderService
+from app.Services import merged_dxf_service
+from app.Repositories.order_repository import OrderRepository
+from app.Schemas.order import (
+    OrderRead, OrderPreview, PiecePreview, ParserOverrides, OrderSummary, OrderSummaryPage,
+    PolygonRead, HoleRead,
+)
 from uuid import UUID
 from pathlib import Path
-import shutil
+from datetime import datetime
+
+# Colonne lette per gli alberi ordine/pezzi/fori: le stesse dei relativi schemi di lettura
+ORDER_FIELDS = tuple(f for f in OrderRead.model_fields if f != "polygons")
+POLYGON_FIELDS = tuple(f for f in PolygonRead.model_fields if f != "holes")
+HOLE_FIELDS = tuple(HoleRead.model_fields)
+
+_RELATIONS = ("polygons", "polygons.holes")
+
+logger = logging.getLogger(__name__)
+
+
+def resolve_selection(
+    fields: Optional[str] = None,
+    include: Optional[str] = None,
+) -> Tuple[Tuple[str, ...], Optional[Tuple[str, ...]], Optional[Tuple[str, ...]]]:
+    """
+    Traduce `?fields=` e `?include=` nelle colonne da leggere per ordine, pezzi e fori.
+    - include: relazioni da espandere (`polygons`, `polygons.holes`); se assente si espande tutto.
+    - fields: colonne separate da virgola; `polygons.x` e `polygons.holes.x` qualificano
+      pezzi e fori. Un livello senza campi richiesti restituisce tutte le colonne.
+    L'`id` è sempre incluso. Ritorna None per le relazioni da non caricare.
+    """
+    if include is None:
+        relations = set(_RELATIONS)
+    else:
+        relations = {r.strip() for r in include.split(",") if r.strip()}
+        unknown = relations - set(_RELATIONS)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Relazioni non valide: {', '.join(sorted(unknown))}")
+        if "polygons.holes" in relations:
+            relations.add("polygons")
+
+    levels = {"": ORDER_FIELDS, "polygons": POLYGON_FIELDS, "polygons.holes": HOLE_FIELDS}
+    requested: Dict[str, List[str]] = {}
+    for item in (fields or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        prefix, _, name = item.rpartition(".")
+        if prefix not in levels or name not in levels[prefix]:
+            raise HTTPException(status_code=400, detail=f"Campo non valido: {item}")
+        if prefix and prefix not in relations:
+            raise HTTPException(status_code=400, detail=f"Il campo {item} richiede include={prefix}")
+        requested.setdefault(prefix, []).append(name)
+
+    def pick(prefix: str) -> Tuple[str, ...]:
+        names = requested.get(prefix)
+        if not names:
+            return levels[prefix]
+        return tuple(dict.fromkeys(["id", *names]))
+
+    return (
+        pick(""),
+        pick("polygons") if "polygons" in relations else None,
+        pick("polygons.holes") if "polygons.holes" in relations else None,
+    )
+
 
 class OrderController:
     def __init__(self):
@@ -22,106 +93,295 @@ class OrderController:
 
     async def list_orders(
         self,
-        db: Annotated[AsyncSession, Depends(get_db)],
-    ) -> List[OrderRead]:
-        stmt = select(Order).options(
-            selectinload(Order.polygons).selectinload(Polygon.holes)
-        ).order_by(Order.created_at.desc())
-        result = await db.execute(stmt)
-        rows = result.scalars().all()
-        return [OrderRead.model_validate(r) for r in rows]
+        fields: Optional[str] = None,
+        include: Optional[str] = None,
+        if_none_match: Optional[str] = None,
+    ) -> Response:
+        selection = resolve_selection(fields, include)
+        return await self._cached(
+            LISTS, ("tree", selection), if_none_match,
+            # Dati letti dal DB con le sole colonne richieste: nessuna validazione per oggetto,
+            # serializzazione diretta con orjson
+            lambda db: self._dump_trees(db, None, selection),
+        )
+
+    async def list_order_summaries(
+        self,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        client_id: Optional[UUID] = None,
+        user_id: Optional[UUID] = None,
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None,
+        if_none_match: Optional[str] = None,
+    ) -> Response:
+        limit = clamp_limit(limit)
+        after = decode_cursor(cursor) if cursor else None
+
+        async def load(db: AsyncSession) -> bytes:
+            # Si chiede una riga in più per sapere se esiste una pagina successiva
+            rows = await OrderRepository(db).list_summaries(
+                limit + 1,
+                after=after,
+                client_id=client_id,
+                user_id=user_id,
+                created_from=created_from,
+                created_to=created_to,
+            )
+            items = [OrderSummary.model_validate(r) for r in rows[:limit]]
+            next_cursor = encode_cursor(items[-1].created_at, items[-1].id) if len(rows) > limit else None
+            return OrderSummaryPage(items=items, next_cursor=next_cursor).model_dump_json().encode()
+
+        variant = ("summary", limit, after, client_id, user_id, created_from, created_to)
+        return await self._cached(LISTS, variant, if_none_match, load)
 
     async def import_pdf(
         self,
-        db: Annotated[AsyncSession, Depends(get_db)],
-        file: UploadFile = File(...),
-        claims: dict = None # Will be passed from router if needed
-    ) -> OrderRead:
-        # 1. Salva il file PDF (sanitizzazione base del nome file)
-        safe_filename = Path(file.filename).name
-        file_id = Path(safe_filename).stem
-        import_path = self.pdf_svc.imports_dir / safe_filename
-        with import_path.open("wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-
-        # 2. Elaborazione
-        processing_results = self.pdf_svc.process_pdf(import_path, file_id)
-        if not processing_results:
-            raise HTTPException(status_code=400, detail="Nessuna quota valida trovata nel PDF")
+        db: Annotated[AsyncSession, Depends(get_db, scope="function")],
+        request: Request,
+        claims: dict = None, # Will be passed from router if needed
+        dry_run: bool = False,
+    ) -> OrderRead | OrderPreview:
+        if dry_run:
+            # Solo geometria, letta in memoria: nessun file salvato, nessun artefatto, nessuna riga a DB
+            upload = await receive_upload(request)
+            return await run_in_threadpool(self.preview_pdf, upload)
 
-        # 3. Salvataggio nel DB
+        # 1. Il PDF viene scritto una sola volta, direttamente negli import (nome base sanificato),
+        #    calcolando SHA-256 e dimensione durante la ricezione
+        upload = await receive_upload(request, dest_dir=self.pdf_svc.imports_dir)
+
+        # 2. Elaborazione e salvataggio nel DB (solo i pezzi cambiati in caso di reimport)
+        user_id = UUID(claims["sub"]) if claims and "sub" in claims else None
+        return await OrderService(db, self.pdf_svc).import_pdf(
+            upload.path, upload.path.stem, user_id, source_sha256=upload.sha256
+        )
+
+    async def import_batch(
+        self,
+        files: List[UploadFile],
+        claims: dict = None,
+    ) -> StreamingResponse:
+        """
+        Importa più PDF (anche dentro archivi ZIP) in una sola richiesta.
+        Ogni ordine è elaborato in parallelo (entro il numero di worker di parsing),
+        con una propria sessione e un proprio commit; i risultati sono restituiti
+        in NDJSON man mano che i singoli import terminano. I file con lo stesso codice
+        ordine (nome) di un altro file del batch vengono rifiutati senza essere salvati.
+        """
         user_id = UUID(claims["sub"]) if claims and "sub" in claims else None
 
-        # Default client for now: Veneta Cucine
-        from app.Models.client import Client
-        stmt_client = select(Client).where(Client.code == "VENETA_CUCINE")
-        res_client = await db.execute(stmt_client)
-        client = res_client.scalar_one_or_none()
-        client_id = client.id if client else None
-
-        # Cerca se l'ordine esiste già o creane uno nuovo
-        stmt = select(Order).where(Order.code == file_id)
-        existing = await db.execute(stmt)
-        order = existing.scalar_one_or_none()
-
-        if not order:
-            order = Order(code=file_id, user_id=user_id, client_id=client_id)
-            db.add(order)
-            await db.flush()
-        else:
-            # Opzionale: pulisci poligoni vecchi se stai ri-importando
-            pass
-
-        for res in processing_results:
-            poly = Polygon(
-                order_id=order.id,
-                label=res["label"],
-                width_mm=res["width_mm"],
-                height_mm=res["height_mm"],
-                dxf_path=res["dxf_path"],
-                preview_path=res["preview_path"],
-                technical_preview_path=res.get("technical_preview_path"),
-                is_mirrored=res.get("is_mirrored", False),
-                is_machining=res.get("is_machining", False),
-                material=res.get("material"),
-                thickness_mm=res.get("thickness_mm")
+        # I file vengono salvati come imports/{nome}: nomi (codici ordine) ripetuti nel
+        # batch si sovrascriverebbero a vicenda, quindi vanno individuati prima di salvare
+        sources: List[Tuple[UploadFile, str, Optional[List[str]]]] = []
+        for f in files:
+            safe_filename = Path(f.filename or "").name
+            names = None  # PDF contenuti, solo per gli ZIP
+            if safe_filename.lower().endswith(".zip") or zipfile.is_zipfile(f.file):
+                f.file.seek(0)
+                names = await run_in_threadpool(self.pdf_svc.list_zip_pdfs, f.file)
+            sources.append((f, safe_filename, names))
+        codes = Counter(
+            Path(name).stem
+            for _, safe_filename, names in sources
+            for name in (names if names is not None else [safe_filename])
+        )
+        duplicates = {code for code, count in codes.items() if count > 1}
+
+        # Gli upload vanno salvati prima di rispondere: dopo, Starlette chiude i file temporanei
+        rejected: List[dict] = []
+        entries: List[Tuple[str, StoredUpload]] = []
+        for f, safe_filename, names in sources:
+            members = (
+                [(safe_filename, safe_filename)] if names is None
+                else [(f"{safe_filename}/{name}", name) for name in names]
             )
-            db.add(poly)
-            await db.flush()
-
-            for h_res in res["holes"]:
-                hole = Hole(
-                    polygon_id=poly.id,
-                    type=h_res["type"],
-                    x_mm=h_res["x_mm"],
-                    y_mm=h_res["y_mm"],
-                    width_mm=h_res.get("width_mm"),
-                    height_mm=h_res.get("height_mm"),
-                    diameter_mm=h_res.get("diameter_mm"),
-                    depth_mm=h_res.get("depth_mm")
+            skipped = {name for _, name in members if Path(name).stem in duplicates}
+            rejected.extend(
+                {
+                    "file": source,
+                    "status": "error",
+                    "detail": f"Codice ordine {Path(name).stem} presente in più file del batch",
+                }
+                for source, name in members if name in skipped
+            )
+            f.file.seek(0)
+            if names is not None:
+                uploads = await run_in_threadpool(self.pdf_svc.extract_zip, f.file, skipped)
+                entries.extend((f"{safe_filename}/{u.filename}", u) for u in uploads)
+            elif not skipped:
+                upload = await run_in_threadpool(self.pdf_svc.store_upload, f.file, safe_filename)
+                entries.append((safe_filename, upload))
+
+        if not entries and not rejected:
+            raise HTTPException(status_code=400, detail="Nessun PDF trovato negli upload")
+
+        return StreamingResponse(self._run_batch(entries, user_id, rejected), media_type="application/x-ndjson")
+
+    async def _run_batch(
+        self,
+        entries: List[Tuple[str, StoredUpload]],
+        user_id: Optional[UUID],
+        rejected: List[dict] = (),
+    ) -> AsyncIterator[str]:
+        for result in rejected:
+            yield json.dumps(result) + "\n"
+        semaphore = asyncio.Semaphore(settings.import_workers)
+        # Due file con lo stesso codice ordine non devono essere importati in parallelo
+        code_locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+
+        async def run(source: str, upload: StoredUpload) -> dict:
+            async with code_locks[upload.path.stem], semaphore:
+                return await self._import_one(source, upload, user_id)
+
+        tasks = [asyncio.create_task(run(source, upload)) for source, upload in entries]
+        try:
+            for fut in asyncio.as_completed(tasks):
+                yield json.dumps(await fut) + "\n"
+        finally:
+            for t in tasks:
+                t.cancel()
+
+    async def _import_one(self, source: str, upload: StoredUpload, user_id: Optional[UUID]) -> dict:
+        async with SessionLocal() as db:
+            try:
+                order = await OrderService(db, self.pdf_svc).import_pdf(
+                    upload.path, upload.path.stem, user_id, source_sha256=upload.sha256
                 )
-                db.add(hole)
+            except HTTPException as e:
+                return {"file": source, "status": "error", "detail": e.detail}
+            except Exception:
+                # Il testo delle eccezioni (SQL, percorsi, vincoli) resta nei log, non nella risposta
+                logger.exception("Import di %s non riuscito", source)
+                return {"file": source, "status": "error", "detail": "Errore durante l'import"}
+        return {
+            "file": source,
+            "status": "ok",
+            "order_id": str(order.id),
+            "code": order.code,
+            "pieces": len(order.polygons),
+        }
+
+    def preview_pdf(self, upload: StoredUpload) -> OrderPreview:
+        file_id = Path(upload.filename).stem
+        processing_results = self.pdf_svc.process_pdf(io.BytesIO(upload.data), file_id, render=False)
+        if not processing_results:
+            raise HTTPException(status_code=400, detail="Nessuna quota valida trovata nel PDF")
+
+        def r(v):
+            return round(v, 2) if isinstance(v, float) else v
 
-        await db.commit()
-        await db.refresh(order)
+        return OrderPreview(
+            code=file_id,
+            pieces=[
+                PiecePreview(
+                    **{k: res.get(k) for k in ("label", "page_number", "width_mm", "height_mm",
+                                               "material", "thickness_mm", "is_mirrored", "is_machining")},
+                    outer_coords=[(r(x), r(y)) for x, y in res["outer_coords"]],
+                    holes=[{k: r(v) for k, v in h.items()} for h in res["holes"]],
+                )
+                for res in processing_results
+            ],
+        )
 
-        # Ricarica con relazioni per la risposta
-        stmt = select(Order).where(Order.id == order.id).options(
-            selectinload(Order.polygons).selectinload(Polygon.holes)
+    async def reprocess_page(
+        self,
+        order_id: UUID,
+        page_number: int,
+        db: Annotated[AsyncSession, Depends(get_db, scope="function")],
+        overrides: Optional[ParserOverrides] = None,
+    ) -> Response:
+        await OrderService(db, self.pdf_svc).reprocess_page(
+            order_id,
+            page_number,
+            overrides.model_dump(exclude_none=True) if overrides else None,
         )
-        result = await db.execute(stmt)
-        return OrderRead.model_validate(result.scalar_one())
+        return await self.get_order(order_id, db=db)
 
-    async def get_order(
+    async def download_bundle(
+        self,
+        order_id: UUID,
+        db: Annotated[AsyncSession, Depends(get_db, scope="function")],
+        previews: bool = False,
+    ) -> StreamingResponse:
+        trees = await OrderRepository(db).fetch_trees(
+            [order_id], ("code",), ("dxf_path", "preview_path", "technical_preview_path")
+        )
+        if not trees:
+            raise HTTPException(status_code=404, detail="Ordine non trovato")
+        code = trees[0]["code"]
+        return StreamingResponse(
+            self.pdf_svc.iter_bundle(code, trees[0]["polygons"], previews=previews),
+            media_type="application/zip",
+            headers={"Content-Disposition": f'attachment; filename="{code}.zip"'},
+        )
+
+    async def download_merged_dxf(
         self,
         order_id: UUID,
-        db: Annotated[AsyncSession, Depends(get_db)],
-    ) -> OrderRead:
-        stmt = select(Order).where(Order.id == order_id).options(
-            selectinload(Order.polygons).selectinload(Polygon.holes)
+        db: Annotated[AsyncSession, Depends(get_db, scope="function")],
+        material: Optional[str] = None,
+        thickness_mm: Optional[float] = None,
+    ) -> StreamingResponse:
+        trees = await OrderRepository(db).fetch_trees(
+            [order_id], ("code",), merged_dxf_service.PIECE_FIELDS, merged_dxf_service.HOLE_FIELDS
         )
-        result = await db.execute(stmt)
-        row = result.scalar_one_or_none()
-        if not row:
+        if not trees:
             raise HTTPException(status_code=404, detail="Ordine non trovato")
-        return OrderRead.model_validate(row)
+        code = trees[0]["code"]
+        pieces = merged_dxf_service.filter_pieces(trees[0]["polygons"], material, thickness_mm)
+        if not pieces:
+            raise HTTPException(status_code=404, detail="Nessun pezzo per il materiale e lo spessore indicati")
+        filename = code
+        if material is not None or thickness_mm is not None:
+            filename += "_" + merged_dxf_service.group_name((material, thickness_mm))
+        return StreamingResponse(
+            merged_dxf_service.iter_merged_dxf(pieces, title=code),
+            media_type="application/dxf",
+            headers={"Content-Disposition": f'attachment; filename="{filename}.dxf"'},
+        )
+
+    async def get_order(
+        self,
+        order_id: UUID,
+        fields: Optional[str] = None,
+        include: Optional[str] = None,
+        if_none_match: Optional[str] = None,
+        db: Optional[AsyncSession] = None,
+    ) -> Response:
+        selection = resolve_selection(fields, include)
+
+        async def load(db: AsyncSession) -> Optional[bytes]:
+            trees = await OrderRepository(db).fetch_trees([order_id], *selection)
+            return dumps_json(trees[0]) if trees else None
+
+        return await self._cached(str(order_id), ("tree", selection), if_none_match, load, db)
+
+    async def _dump_trees(self, db: AsyncSession, order_ids, selection) -> bytes:
+        return dumps_json(await OrderRepository(db).fetch_trees(order_ids, *selection))
+
+    async def _cached(
+        self,
+        scope: str,
+        variant,
+        if_none_match: Optional[str],
+        load: Callable[[AsyncSession], Awaitable[Optional[bytes]]],
+        db: Optional[AsyncSession] = None,
+    ) -> Response:
+        """
+        Risposta dalla cache versionata; la sessione DB (sulla replica, se utilizzabile)
+        viene aperta solo se la voce manca, quindi un 304 o un hit non toccano il database.
+        """
+        key = order_cache.key(scope, variant)
+        hit = order_cache.get(key)
+        if hit is None:
+            if db is not None:
+                body = await load(db)
+            else:
+                async with open_read_session(scope) as session:
+                    body = await load(session)
+            if body is None:
+                raise HTTPException(status_code=404, detail="Ordine non trovato")
+            hit = order_cache.set(key, body), body
+        etag, body = hit
+        return cached_json_response(body, etag, if_none_match)
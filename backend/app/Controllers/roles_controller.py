@@ -16,7 +16,7 @@ class RolesController:
 
     async def list_roles(
         self,
-        db: Annotated[AsyncSession, Depends(get_db)],         # Inietta la sessione DB asincrona
+        db: Annotated[AsyncSession, Depends(get_db, scope="function")], # Inietta la sessione DB asincrona
     ) -> list[RoleRead]:                                      # Ritorna una lista di DTO di ruoli
         svc = RoleService(db)                                 # Istanzia il service ruoli
         rows = await svc.roles.list()                         # Chiede al service l’elenco dei ruoli
@@ -25,7 +25,7 @@ class RolesController:
     async def get_role(
         self,
         role_id: UUID,                                        # ID del ruolo (UUID, allineato al DB)
-        db: Annotated[AsyncSession, Depends(get_db)],         # Sessione DB asincrona
+        db: Annotated[AsyncSession, Depends(get_db, scope="function")], # Sessione DB asincrona
     ) -> RoleRead:                                            # Ritorna il DTO del ruolo
         svc = RoleService(db)                                 # Istanzia il service ruoli
         row = await svc.roles.get(role_id)                    # Recupera il ruolo per ID
@@ -37,7 +37,7 @@ class RolesController:
     async def create_role(
         self,
         payload: RoleCreate,                                  # Body JSON validato per la creazione
-        db: Annotated[AsyncSession, Depends(get_db)],         # Sessione DB asincrona
+        db: Annotated[AsyncSession, Depends(get_db, scope="function")], # Sessione DB asincrona
     ) -> RoleRead:                                            # Ritorna il DTO del ruolo creato
         svc = RoleService(db)                                 # Istanzia il service ruoli
         row = await svc.roles.create(payload.model_dump())    # Crea il ruolo (passa i campi del payload)
@@ -47,7 +47,7 @@ class RolesController:
         self,
         role_id: UUID,                                        # ID del ruolo da aggiornare
         payload: RoleUpdate,                                  # Body con campi parziali aggiornabili
-        db: Annotated[AsyncSession, Depends(get_db)],         # Sessione DB asincrona
+        db: Annotated[AsyncSession, Depends(get_db, scope="function")], # Sessione DB asincrona
     ) -> RoleRead:                                            # Ritorna il DTO aggiornato
         svc = RoleService(db)                                 # Istanzia il service ruoli
         row = await svc.roles.update(                         # Esegue l’aggiornamento
@@ -62,7 +62,7 @@ class RolesController:
     async def delete_role(
         self,
         role_id: UUID,                                        # ID del ruolo da eliminare
-        db: Annotated[AsyncSession, Depends(get_db)],         # Sessione DB asincrona
+        db: Annotated[AsyncSession, Depends(get_db, scope="function")], # Sessione DB asincrona
     ) -> dict:                                                # Ritorna un esito semplice
         svc = RoleService(db)                                 # Istanzia il service ruoli
         ok = await svc.roles.delete(role_id)                  # Prova a eliminare il ruolo
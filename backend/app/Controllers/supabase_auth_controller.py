@@ -162,7 +162,7 @@ class SupabaseAuthController:
     async def register(
         self,
         payload: SupabaseRegisterInput,
-        db: Annotated[AsyncSession, Depends(get_db)],
+        db: Annotated[AsyncSession, Depends(get_db, scope="function")],
     ) -> SupabaseRegisterResponse:
         """
         Endpoint per la registrazione di un nuovo utente.
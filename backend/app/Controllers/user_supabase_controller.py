@@ -17,7 +17,7 @@ class UserSupabaseController:
 
     async def list_users(
         self,
-        db: Annotated[AsyncSession, Depends(get_db)],           # Sessione DB async iniettata da FastAPI
+        db: Annotated[AsyncSession, Depends(get_db, scope="function")], # Sessione DB async iniettata da FastAPI
         offset: int = 0,                                        # Paginazione: da quale record partire (default 0)
         limit: int = Query(50, le=200),                         # Paginazione: quanti record (max 200)
     ) -> list[UserSupabaseRead]:                                    # Ritorna una lista serializzabile di utenti
@@ -28,7 +28,7 @@ class UserSupabaseController:
     async def get_user(
         self,
         user_id: UUID,                                          # ID utente come UUID (allineato al DB)
-        db: Annotated[AsyncSession, Depends(get_db)],           # Sessione DB async iniettata
+        db: Annotated[AsyncSession, Depends(get_db, scope="function")], # Sessione DB async iniettata
     ) -> UserSupabaseRead:                                          # Ritorna il DTO utente
         svc = UserSupabaseService(db)                                   # Istanzia il service
         row = await svc.get_user(user_id)                       # Recupera il singolo utente
@@ -39,7 +39,7 @@ class UserSupabaseController:
     async def create_user(
         self,
         payload: UserSupabaseCreate,                                # Body JSON validato (email/password/meta)
-        db: Annotated[AsyncSession, Depends(get_db)],           # Sessione DB async
+        db: Annotated[AsyncSession, Depends(get_db, scope="function")], # Sessione DB async
     ) -> UserSupabaseRead:                                          # Ritorna il DTO del nuovo utente
         svc = UserSupabaseService(db)                                   # Istanzia il service
         row = await svc.create_user_via_supabase(payload)       # Crea l’utente tramite Supabase Admin API
@@ -54,7 +54,7 @@ class UserSupabaseController:
         self,
         user_id: UUID,                                          # Utente da aggiornare (UUID)
         payload: UserSupabaseUpdate,                                # Body parziale con i campi aggiornabili
-        db: Annotated[AsyncSession, Depends(get_db)],           # Sessione DB async
+        db: Annotated[AsyncSession, Depends(get_db, scope="function")], # Sessione DB async
     ) -> UserSupabaseRead:                                          # Ritorna il DTO aggiornato
         svc = UserSupabaseService(db)                                   # Istanzia il service
         row = await svc.update_user(                            # Esegue update con i soli campi presenti
@@ -68,7 +68,7 @@ class UserSupabaseController:
     async def delete_user(
         self,
         user_id: UUID,                                          # Utente da eliminare (UUID)
-        db: Annotated[AsyncSession, Depends(get_db)],           # Sessione DB async
+        db: Annotated[AsyncSession, Depends(get_db, scope="function")], # Sessione DB async
     ) -> dict:                                                  # Ritorna un semplice esito JSON
         svc = UserSupabaseService(db)                                   # Istanzia il service
         ok = await svc.delete_user(user_id)                     # Esegue la cancellazione
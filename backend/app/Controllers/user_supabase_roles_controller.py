@@ -16,7 +16,7 @@ class UserSupabaseRolesController:
     async def list_user_supabase_roles(
         self,
         user_id: UUID,                                          # Utente per cui elencare i ruoli
-        db: Annotated[AsyncSession, Depends(get_db)],           # Sessione DB async iniettata da FastAPI
+        db: Annotated[AsyncSession, Depends(get_db, scope="function")], # Sessione DB async iniettata da FastAPI
     ) -> list[RoleRead]:                                        # Ritorna lista di ruoli (DTO Pydantic)
         svc = RoleService(db)                                   # Istanzia il service ruoli
         roles = await svc.user_supabase_roles.list_user_supabase_roles(user_id)   # Deve restituire una lista di oggetti Role (join sul ponte)
@@ -25,7 +25,7 @@ class UserSupabaseRolesController:
     async def assign_role(
         self,
         payload: AssignRoleInput,                               # Body JSON validato (user_id + role_id)
-        db: Annotated[AsyncSession, Depends(get_db)],           # Sessione DB async
+        db: Annotated[AsyncSession, Depends(get_db, scope="function")], # Sessione DB async
     ) -> RoleRead:                                              # Ritorna il ruolo appena assegnato (DTO)
         svc = RoleService(db)                                   # Istanzia il service
         await svc.user_supabase_roles.assign(payload.user_id, payload.role_id)  # Crea la riga nella tabella ponte
@@ -39,7 +39,7 @@ class UserSupabaseRolesController:
         self,
         user_id: UUID,                                          # Utente target (UUID)
         role_id: UUID,                                          # Ruolo da rimuovere (UUID)
-        db: Annotated[AsyncSession, Depends(get_db)],           # Sessione DB async
+        db: Annotated[AsyncSession, Depends(get_db, scope="function")], # Sessione DB async
     ) -> dict:                                                  # Ritorna conferma di eliminazione
         svc = RoleService(db)                                   # Istanzia il service
         ok = await svc.user_supabase_roles.unassign(user_id, role_id)    # Prova a rimuovere l’associazione
@@ -0,0 +1,92 @@
+# app/Core/artifact_files.py
+
+import os
+import re
+import gzip
+import shutil
+import mimetypes
+import hashlib
+from pathlib import Path
+from typing import Optional
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+# Nome con hash del contenuto: {base}.{hash}{estensione}, es. ORD_1_tech.3f9a0c1d2b4e5f60.png
+HASHED_NAME = re.compile(r"\.(?P<hash>[0-9a-f]{16})(?P<ext>\.[A-Za-z0-9]+(?:\.gz)?)$")
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+def content_hash(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        while chunk := f.read(1024 * 1024):
+            h.update(chunk)
+    return h.hexdigest()[:16]
+
+
+def rename_to_content_hash(path: Path) -> str:
+    """
+    Rinomina un artefatto appena generato in {base}.{hash}{estensione} e ritorna il nuovo nome.
+    Lo stesso contenuto produce sempre lo stesso nome, contenuti diversi non si sovrascrivono mai.
+    """
+    suffix = "".join(path.suffixes[-2:]) if path.name.endswith(".gz") else path.suffix
+    base = path.name[: -len(suffix)] if suffix else path.name
+    target = path.with_name(f"{base}.{content_hash(path)}{suffix}")
+    os.replace(path, target)
+    return target.name
+
+
+# Artefatti testuali per cui si salva anche una copia .gz accanto all'originale
+PRECOMPRESSED_SUFFIXES = (".dxf",)
+
+
+def write_gzip_sibling(path: Path) -> None:
+    """Comprime una sola volta, in fase di scrittura, un artefatto testuale in `{nome}.gz`."""
+    with path.open("rb") as src, gzip.open(path.with_name(path.name + ".gz"), "wb", compresslevel=9) as dst:
+        shutil.copyfileobj(src, dst)
+
+
+class ArtifactFiles(StaticFiles):
+    """
+    StaticFiles per gli artefatti (DXF/PNG). I file con hash nel nome non cambiano
+    mai: vengono serviti come immutabili con l'hash come ETag forte, così il browser
+    non li riscarica né li rivalida. I nomi senza hash (import precedenti) vanno
+    sempre rivalidati. Range, If-Range e Last-Modified sono gestiti da FileResponse.
+    Se esiste la copia `.gz` e il client accetta gzip, viene servita quella con
+    `Content-Encoding: gzip`, senza comprimere a ogni richiesta.
+    """
+
+    def file_response(
+        self,
+        full_path,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        request_headers = Headers(scope=scope)
+        headers = {"cache-control": "no-cache"}
+        match: Optional[re.Match] = HASHED_NAME.search(os.path.basename(full_path))
+        if match:
+            headers = {"cache-control": IMMUTABLE, "etag": f'"{match["hash"]}"'}
+
+        media_type = None
+        if str(full_path).endswith(PRECOMPRESSED_SUFFIXES):
+            headers["vary"] = "Accept-Encoding"
+            gz_path = f"{full_path}.gz"
+            if "gzip" in request_headers.get("accept-encoding", "") and os.path.isfile(gz_path):
+                full_path, stat_result = gz_path, os.stat(gz_path)
+                media_type = mimetypes.guess_type(full_path[:-3])[0] or "application/octet-stream"
+                headers["content-encoding"] = "gzip"
+                if "etag" in headers:
+                    headers["etag"] = f'"{match["hash"]}-gz"'
+
+        response = FileResponse(
+            full_path, status_code=status_code, headers=headers, media_type=media_type, stat_result=stat_result
+        )
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
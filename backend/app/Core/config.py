@@ -41,10 +41,88 @@ class Settings(BaseSettings):
     DB_PORT: Optional[int] = 5432
     DB_CHARSET: Optional[str] = "utf8"
 
+    # Pool di connessioni:
+    #   queue = pool nell'app (connessione diretta o session pooler, porta 5432)
+    #   null  = una connessione per sessione (transaction pooler, porta 6543)
+    #   auto  = null se la porta è 6543, altrimenti queue
+    DB_POOL_MODE: str = "auto"
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: int = 30
+    # Secondi dopo cui una connessione viene riaperta (i pooler chiudono quelle inattive)
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    # Cache dei prepared statement di asyncpg; None = attiva solo senza transaction pooler
+    DB_STATEMENT_CACHE_SIZE: Optional[int] = None
+
+    # Replica in sola lettura (opzionale) per le GET pesanti sugli ordini. Si torna al
+    # primario se il ritardo di replica supera DB_REPLICA_MAX_LAG (secondi, misurato al
+    # più ogni DB_REPLICA_LAG_CHECK secondi) e, per DB_READ_YOUR_WRITES secondi dopo
+    # una modifica, per gli ordini modificati e per gli elenchi (le risposte lette dalla
+    # replica finiscono in cache: DB_READ_YOUR_WRITES deve restare > DB_REPLICA_MAX_LAG)
+    DATABASE_READ_URL: Optional[str] = Field(default=None)
+    DB_REPLICA_MAX_LAG: float = 5.0
+    DB_REPLICA_LAG_CHECK: float = 2.0
+    DB_READ_YOUR_WRITES: float = 10.0
+
     SUPABASE_URL: str
     SUPABASE_ANON_KEY: str  # Public key for frontend/client-side
     SUPABASE_SERVICE_KEY: str # Secret key for backend/admin operations
     AUTH_AUTO_CONFIRM_DEV: bool = True
+    # Ruoli per utente tenuti in memoria (secondi); 0 = sempre letti dal DB
+    ROLE_CACHE_TTL: int = 30
+    # Se attivo, i ruoli presenti nel token (claim AUTH_ROLES_CLAIM, in radice o in
+    # app_metadata, es. aggiunto da un Custom Access Token Hook) sono usati senza query
+    AUTH_TRUST_JWT_ROLES: bool = False
+    AUTH_ROLES_CLAIM: str = "roles"
+    # Token JWT già verificati tenuti in memoria (numero massimo), validi fino a `exp`
+    JWT_VERIFIED_CACHE_SIZE: int = 10_000
+    # JWKS di Supabase: aggiornato in background dopo JWKS_REFRESH_AFTER secondi; un kid
+    # sconosciuto lo riscarica al più ogni JWKS_MIN_REFETCH_INTERVAL secondi
+    JWKS_REFRESH_AFTER: float = 3000
+    JWKS_MIN_REFETCH_INTERVAL: float = 30
+    # Client HTTP condiviso verso Supabase: timeout (secondi), limiti del pool keep-alive
+    # e HTTP/2 (usato solo se è installato `h2`, es. pip install "httpx[http2]")
+    HTTP_CLIENT_TIMEOUT: float = 30.0
+    HTTP_CLIENT_CONNECT_TIMEOUT: float = 8.0
+    HTTP_CLIENT_MAX_CONNECTIONS: int = 100
+    HTTP_CLIENT_MAX_KEEPALIVE: int = 20
+    HTTP_CLIENT_KEEPALIVE_EXPIRY: float = 30.0
+    HTTP_CLIENT_HTTP2: bool = False
+    # Chiamate a Supabase Auth: tempo massimo complessivo (secondi, tentativi compresi)
+    # per lettura dell'utente, login/MFA e operazioni admin; le GET vengono ritentate
+    # SUPABASE_GET_RETRIES volte con attesa casuale (fino a SUPABASE_RETRY_BACKOFF * 2^tentativo).
+    # Dopo SUPABASE_BREAKER_FAILURES errori consecutivi di un gruppo le sue chiamate
+    # rispondono subito 503 per SUPABASE_BREAKER_RESET secondi, poi una sola chiamata di prova
+    SUPABASE_TIMEOUT_READ: float = 3.0
+    SUPABASE_TIMEOUT_AUTH: float = 5.0
+    SUPABASE_TIMEOUT_ADMIN: float = 10.0
+    SUPABASE_GET_RETRIES: int = 2
+    SUPABASE_RETRY_BACKOFF: float = 0.2
+    SUPABASE_BREAKER_FAILURES: int = 5
+    SUPABASE_BREAKER_RESET: float = 30.0
+    # Header Server-Timing con la durata di ogni chiamata a Supabase della richiesta;
+    # None = attivo solo con ENV=dev
+    SERVER_TIMING: Optional[bool] = None
+
+    # Import ordini: oltre questa soglia di righe si usa COPY invece di INSERT multi-riga
+    IMPORT_COPY_THRESHOLD: int = 5000
+    # Processi dedicati al parsing dei PDF (0 = numero di core); limita anche la concorrenza degli import batch
+    IMPORT_WORKERS: int = 0
+    # Dimensione massima di un singolo PDF caricato (anche se estratto da uno ZIP)
+    IMPORT_MAX_UPLOAD_MB: int = 50
+
+    # Cache delle risposte JSON degli ordini (dimensione in MB e scadenza in secondi).
+    # Con più worker impostare ORDER_CACHE_DIR (cartella locale condivisa) perché le
+    # invalidazioni raggiungano tutti i processi; nella cartella i corpi scadono dopo
+    # ORDER_CACHE_TTL e occupano al più ORDER_CACHE_DIR_MAX_MB
+    ORDER_CACHE_MAX_MB: int = 64
+    ORDER_CACHE_TTL: int = 300
+    ORDER_CACHE_DIR: Optional[str] = None
+    ORDER_CACHE_DIR_MAX_MB: int = 512
+
+    # Risposte più piccole di questa soglia (byte) non vengono compresse
+    COMPRESSION_MIN_SIZE: int = 1024
 
     def assemble_db_url(self, url: Optional[str] = None) -> str:
         if url is None:
@@ -118,6 +196,41 @@ class Settings(BaseSettings):
 
         print(f"---------------------------")
 
+    @property
+    def import_workers(self) -> int:
+        import os
+        return self.IMPORT_WORKERS if self.IMPORT_WORKERS > 0 else (os.cpu_count() or 1)
+
+    def pool_mode_for(self, url: str) -> str:
+        mode = self.DB_POOL_MODE.lower()
+        if mode in ("queue", "null"):
+            return mode
+        if mode != "auto":
+            raise ValueError("DB_POOL_MODE deve essere 'auto', 'queue' oppure 'null'")
+        from sqlalchemy.engine import make_url
+        return "null" if make_url(url).port == 6543 else "queue"
+
+    def check_replica_config(self) -> None:
+        """
+        Il read-your-writes sulla replica si basa sulle invalidazioni della cache ordini:
+        senza ORDER_CACHE_DIR restano nel processo e, con più worker, una lettura
+        subito dopo un import su un altro worker finirebbe sulla replica in ritardo.
+        """
+        if self.DATABASE_READ_URL and not self.ORDER_CACHE_DIR:
+            raise ValueError("DATABASE_READ_URL richiede ORDER_CACHE_DIR (cartella condivisa tra i worker)")
+
+    @property
+    def db_pool_mode(self) -> str:
+        return self.pool_mode_for(self.DATABASE_URL)
+
+    @property
+    def server_timing_enabled(self) -> bool:
+        return self.ENV == "dev" if self.SERVER_TIMING is None else self.SERVER_TIMING
+
+    @property
+    def import_max_upload_bytes(self) -> int:
+        return self.IMPORT_MAX_UPLOAD_MB * 1024 * 1024
+
     @property
     def cors_origins_list(self) -> List[str]:
         """
@@ -152,3 +265,5 @@ class Settings(BaseSettings):
 
 settings = Settings()
 settings.DATABASE_URL = settings.assemble_db_url()
+if settings.DATABASE_READ_URL:
+    settings.DATABASE_READ_URL = settings.assemble_db_url(settings.DATABASE_READ_URL)
@@ -4,11 +4,20 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.Core.config import settings
 from app.Middleware.security_headers import SecurityHeadersMiddleware
+from app.Middleware.compression import CompressionMiddleware
+from app.Middleware.server_timing import ServerTimingMiddleware
 
 def setup_middlewares(app: FastAPI) -> None:
     """
     Configura i middleware per l'applicazione FastAPI.
     """
+    # Compressione gzip/brotli delle risposte (i DXF precompressi passano invariati)
+    app.add_middleware(CompressionMiddleware, minimum_size=settings.COMPRESSION_MIN_SIZE)
+
+    # Durata delle chiamate a Supabase nell'header Server-Timing
+    if settings.server_timing_enabled:
+        app.add_middleware(ServerTimingMiddleware)
+
     # Middleware per gli header di sicurezza personalizzati
     app.add_middleware(SecurityHeadersMiddleware)
 
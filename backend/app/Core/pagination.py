@@ -1,4 +1,33 @@
-# app/Utils/pagination.py
+# app/Core/pagination.py
 
-def clamp_limit(limit: int, max_limit: int = 100) -> int:
+import json
+import base64
+import binascii
+from datetime import datetime
+from typing import Tuple
+from uuid import UUID
+
+from fastapi import HTTPException
+
+
+# Numero massimo di elementi per pagina negli elenchi
+MAX_PAGE_SIZE = 200
+
+
+def clamp_limit(limit: int, max_limit: int = MAX_PAGE_SIZE) -> int:
     return max(1, min(limit, max_limit))
+
+
+def encode_cursor(created_at: datetime, id: UUID) -> str:
+    """Cursore opaco per la paginazione keyset su (created_at, id)."""
+    raw = json.dumps([created_at.isoformat(), str(id)], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, id = json.loads(raw)
+        return datetime.fromisoformat(created_at), UUID(id)
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Cursore di paginazione non valido")
@@ -0,0 +1,191 @@
+# app/Core/response_cache.py
+
+from __future__ import annotations
+
+import os
+import time
+import uuid
+import hashlib
+import tempfile
+from pathlib import Path
+from typing import Hashable, Optional, Tuple
+
+from cachetools import TTLCache
+
+from app.Core.config import settings
+
+# Chiave di versione condivisa da tutti gli elenchi: cambia a ogni modifica di un qualsiasi ordine
+LISTS = "_lists"
+
+
+def _atomic_write(path: Path, data: bytes) -> None:
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _create_if_missing(path: Path, data: bytes) -> None:
+    """
+    Crea il file solo se non esiste, con mtime a zero: una versione creata da una
+    lettura non è una modifica. Il link fallisce se un altro processo l'ha già scritta.
+    """
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.utime(tmp, (0, 0))
+        os.link(tmp, path)
+    except FileExistsError:
+        pass
+    finally:
+        os.unlink(tmp)
+
+
+class FileCacheBackend:
+    """
+    Backend condiviso su una cartella locale, per più worker sulla stessa macchina.
+    Versioni e corpi sono file scritti con rename atomico; i corpi sono immutabili
+    (la chiave contiene la versione), quindi non servono lock.
+    I corpi più vecchi di `ttl` secondi vengono eliminati e la cartella resta sotto
+    `max_bytes` cancellando i meno recenti; la pulizia gira al più ogni `prune_interval`
+    secondi, durante una scrittura.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int, ttl: float, prune_interval: float = 60) -> None:
+        self.versions_dir = directory / "versions"
+        self.bodies_dir = directory / "bodies"
+        self.versions_dir.mkdir(parents=True, exist_ok=True)
+        self.bodies_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.prune_interval = prune_interval
+        self._next_prune = 0.0
+
+    def get_version(self, scope: str) -> str:
+        path = self.versions_dir / scope
+        try:
+            return path.read_text()
+        except FileNotFoundError:
+            _create_if_missing(path, uuid.uuid4().hex.encode())
+            return path.read_text()
+
+    def bump_version(self, scope: str) -> str:
+        version = uuid.uuid4().hex
+        _atomic_write(self.versions_dir / scope, version.encode())
+        # I corpi delle versioni precedenti non verranno più letti
+        for stale in self.bodies_dir.glob(f"{scope}.*"):
+            stale.unlink(missing_ok=True)
+        return version
+
+    def last_write(self, scope: str) -> Optional[float]:
+        try:
+            return (self.versions_dir / scope).stat().st_mtime
+        except FileNotFoundError:
+            return None
+
+    def get(self, key: str) -> Optional[Tuple[str, bytes]]:
+        try:
+            raw = (self.bodies_dir / key).read_bytes()
+        except FileNotFoundError:
+            return None
+        etag, _, body = raw.partition(b"\n")
+        return etag.decode(), body
+
+    def set(self, key: str, etag: str, body: bytes) -> None:
+        _atomic_write(self.bodies_dir / key, etag.encode() + b"\n" + body)
+        if time.monotonic() >= self._next_prune:
+            self.prune()
+
+    def prune(self) -> None:
+        self._next_prune = time.monotonic() + self.prune_interval
+        expired_before = time.time() - self.ttl
+        bodies = []
+        for path in self.bodies_dir.iterdir():
+            if path.name.startswith(".tmp-"):
+                continue  # scrittura in corso
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            if st.st_mtime < expired_before:
+                path.unlink(missing_ok=True)
+            else:
+                bodies.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in bodies)
+        for _, size, path in sorted(bodies):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+
+class ResponseCache:
+    """
+    Cache versionata di risposte JSON già serializzate.
+    Ogni ambito (un ordine, oppure gli elenchi) ha una versione casuale che cambia
+    a ogni invalidazione: le voci delle versioni precedenti non vengono più lette e
+    scadono dalla cache. L'ETag è l'hash del contenuto, quindi resta valido anche
+    dopo un riavvio.
+    Senza backend condiviso le versioni vivono nel processo: con più worker
+    un'invalidazione non raggiunge gli altri, per cui le voci scadono comunque dopo
+    `ORDER_CACHE_TTL` secondi; per più worker configurare `ORDER_CACHE_DIR`.
+    """
+
+    def __init__(
+        self, max_bytes: int, ttl: int, directory: Optional[str] = None, dir_max_bytes: Optional[int] = None,
+    ) -> None:
+        # Dimensione misurata in byte dei corpi, non in numero di voci
+        self._bodies = TTLCache(maxsize=max_bytes, ttl=ttl, getsizeof=lambda hit: len(hit[1]) + 1)
+        self._versions: dict = {}
+        self._written: dict = {}
+        self._shared = (
+            FileCacheBackend(Path(directory), max_bytes=dir_max_bytes or max_bytes, ttl=ttl) if directory else None
+        )
+
+    def version(self, scope: str) -> str:
+        if self._shared:
+            return self._shared.get_version(scope)
+        return self._versions.setdefault(scope, uuid.uuid4().hex)
+
+    def invalidate(self, *scopes: str) -> None:
+        for scope in (*scopes, LISTS):
+            if self._shared:
+                self._shared.bump_version(scope)
+            else:
+                self._versions[scope] = uuid.uuid4().hex
+                self._written[scope] = time.time()
+
+    def changed_within(self, scope: str, seconds: float) -> bool:
+        """True se l'ambito è stato invalidato (cioè modificato) negli ultimi `seconds` secondi."""
+        written = self._shared.last_write(scope) if self._shared else self._written.get(scope)
+        return written is not None and time.time() - written < seconds
+
+    def key(self, scope: str, variant: Hashable) -> str:
+        """Chiave per la versione corrente dell'ambito; `variant` distingue le varianti (es. campi selezionati)."""
+        raw = f"{self.version(scope)}|{variant!r}"
+        return f"{scope}.{hashlib.sha256(raw.encode()).hexdigest()}"
+
+    def get(self, key: str) -> Optional[Tuple[str, bytes]]:
+        hit = self._bodies.get(key)
+        if hit is None and self._shared:
+            hit = self._shared.get(key)
+            if hit is not None and len(hit[1]) < self._bodies.maxsize:
+                self._bodies[key] = hit
+        return hit
+
+    def set(self, key: str, body: bytes) -> str:
+        etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+        if len(body) < self._bodies.maxsize:
+            self._bodies[key] = (etag, body)
+        if self._shared:
+            self._shared.set(key, etag, body)
+        return etag
+
+
+order_cache = ResponseCache(
+    max_bytes=settings.ORDER_CACHE_MAX_MB * 1024 * 1024,
+    ttl=settings.ORDER_CACHE_TTL,
+    directory=settings.ORDER_CACHE_DIR,
+    dir_max_bytes=settings.ORDER_CACHE_DIR_MAX_MB * 1024 * 1024,
+)
@@ -0,0 +1,31 @@
+# app/Core/responses.py
+
+from typing import Any, Optional
+
+import orjson
+from fastapi import Response
+
+
+def dumps_json(content: Any) -> bytes:
+    # OPT_UTC_Z: date UTC con suffisso `Z`, come le serializza Pydantic (response_model)
+    return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Confronto di If-None-Match con un ETag (confronto debole, come da RFC 9110)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in (t.strip().removeprefix("W/") for t in if_none_match.split(","))
+
+
+def cached_json_response(body: bytes, etag: str, if_none_match: Optional[str] = None) -> Response:
+    """
+    Risposta JSON già serializzata con ETag; 304 senza corpo se il client ha già questa versione.
+    `no-cache` obbliga il browser a rivalidare, perché un ordine può cambiare con un reimport.
+    """
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
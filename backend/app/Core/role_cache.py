@@ -0,0 +1,42 @@
+# app/Core/role_cache.py
+
+from __future__ import annotations
+
+from typing import FrozenSet, Optional
+from uuid import UUID
+
+from cachetools import TTLCache
+
+from app.Core.config import settings
+
+
+class RoleCache:
+    """
+    Ruoli per utente (nomi come a DB) in memoria con scadenza breve.
+    Assegnazioni e revoche invalidano subito l'utente, modifiche ed eliminazioni
+    di un ruolo svuotano tutto. La cache è per processo: con più worker gli altri
+    processi vedono la modifica al più dopo `ROLE_CACHE_TTL` secondi.
+    """
+
+    def __init__(self, maxsize: int, ttl: int) -> None:
+        self._roles: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, user_id: UUID) -> Optional[FrozenSet[str]]:
+        return self._roles.get(user_id)
+
+    def set(self, user_id: UUID, roles: FrozenSet[str]) -> None:
+        self._roles[user_id] = roles
+
+    def invalidate(self, user_id: UUID) -> None:
+        self._roles.pop(user_id, None)
+
+    def clear(self) -> None:
+        self._roles.clear()
+
+
+def normalize_role(name: str) -> str:
+    """Confronto dei nomi di ruolo senza distinzione di maiuscole e spazi esterni."""
+    return name.strip().lower()
+
+
+role_cache = RoleCache(maxsize=10_000, ttl=settings.ROLE_CACHE_TTL)
@@ -0,0 +1,38 @@
+# app/Core/server_timing.py
+
+from contextvars import ContextVar
+from typing import List, Optional, Tuple
+
+"""
+Tempi delle chiamate in uscita (es. Supabase Auth) durante una richiesta, restituiti
+al client nell'header `Server-Timing` da ServerTimingMiddleware e visibili nei
+DevTools del browser: login e registrazione mostrano quante chiamate fanno e quanto durano.
+"""
+
+# (nome, durata in ms, descrizione) delle chiamate della richiesta corrente
+Timing = Tuple[str, float, str]
+_timings: ContextVar[Optional[List[Timing]]] = ContextVar("server_timings", default=None)
+
+
+def start() -> List[Timing]:
+    """Nuova raccolta per la richiesta corrente (la lista è condivisa anche con i task figli)."""
+    timings: List[Timing] = []
+    _timings.set(timings)
+    return timings
+
+
+def record(name: str, duration_ms: float, description: str = "") -> None:
+    """Registra una chiamata; fuori da una richiesta (CLI, test) non fa nulla."""
+    timings = _timings.get()
+    if timings is not None:
+        timings.append((name, duration_ms, description))
+
+
+def header_value(timings: List[Timing], total_ms: Optional[float] = None) -> str:
+    parts = [
+        f'{name};dur={duration:.1f}' + (f';desc="{description}"' if description else "")
+        for name, duration, description in timings
+    ]
+    if total_ms is not None:
+        parts.append(f"total;dur={total_ms:.1f}")
+    return ", ".join(parts)
@@ -0,0 +1,208 @@
+# app/Core/uploads.py
+
+from __future__ import annotations
+
+import io
+import os
+import uuid
+import hashlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, List, Optional
+
+from fastapi import HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+from app.Core.config import settings
+
+# Dimensione dei blocchi scritti su disco: abbastanza grande da ammortizzare il passaggio al threadpool
+_WRITE_BATCH = 1024 * 1024
+
+# Schema OpenAPI del body per gli endpoint che leggono l'upload direttamente dallo stream
+PDF_UPLOAD_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["file"],
+                    "properties": {"file": {"type": "string", "format": "binary"}},
+                }
+            }
+        },
+    }
+}
+
+
+@dataclass
+class StoredUpload:
+    """File ricevuto: su disco (`path`) oppure in memoria (`data`), con impronta e dimensione."""
+    filename: str
+    size: int
+    sha256: str
+    path: Optional[Path] = None
+    data: Optional[bytes] = None
+
+
+class UploadSink:
+    """
+    Riceve i blocchi di un upload calcolando SHA-256 e dimensione al volo e
+    interrompendo la ricezione appena si supera il limite.
+    Su disco scrive in un file temporaneo nella cartella di destinazione e lo
+    rinomina solo a upload completo, così un upload interrotto non lascia file parziali.
+    """
+
+    def __init__(self, filename: str, dest_dir: Optional[Path] = None, max_bytes: Optional[int] = None) -> None:
+        self.filename = Path(filename).name
+        self.dest_dir = dest_dir
+        self.max_bytes = max_bytes if max_bytes is not None else settings.import_max_upload_bytes
+        self.size = 0
+        self._hash = hashlib.sha256()
+        if dest_dir is not None:
+            self._tmp_path: Optional[Path] = dest_dir / f".upload-{uuid.uuid4().hex}.part"
+            self._out: BinaryIO = self._tmp_path.open("wb")
+        else:
+            self._tmp_path = None
+            self._out = io.BytesIO()
+
+    def write(self, data: bytes) -> None:
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            self.abort()
+            raise HTTPException(
+                status_code=413,
+                detail=f"File '{self.filename}' troppo grande (massimo {self.max_bytes // (1024 * 1024)} MB)",
+            )
+        self._hash.update(data)
+        self._out.write(data)
+
+    def finish(self) -> StoredUpload:
+        upload = StoredUpload(filename=self.filename, size=self.size, sha256=self._hash.hexdigest())
+        if self._tmp_path is not None:
+            self._out.close()
+            upload.path = self.dest_dir / self.filename
+            os.replace(self._tmp_path, upload.path)
+        else:
+            upload.data = self._out.getvalue()
+        return upload
+
+    def abort(self) -> None:
+        self._out.close()
+        if self._tmp_path is not None:
+            self._tmp_path.unlink(missing_ok=True)
+
+
+def store_stream(
+    fileobj: BinaryIO,
+    filename: str,
+    dest_dir: Optional[Path] = None,
+    max_bytes: Optional[int] = None,
+) -> StoredUpload:
+    """
+    Copia sincrona a blocchi di un file già aperto (es. voce di uno ZIP). Da eseguire nel threadpool.
+    """
+    sink = UploadSink(filename, dest_dir, max_bytes)
+    try:
+        while chunk := fileobj.read(_WRITE_BATCH):
+            sink.write(chunk)
+    except BaseException:
+        sink.abort()
+        raise
+    return sink.finish()
+
+
+async def receive_upload(
+    request: Request,
+    field_name: str = "file",
+    dest_dir: Optional[Path] = None,
+    max_bytes: Optional[int] = None,
+) -> StoredUpload:
+    """
+    Legge un upload multipart direttamente dallo stream della richiesta, senza
+    lo spooling di Starlette: il file viene scritto una sola volta (in `dest_dir`
+    oppure in memoria se `dest_dir` è None) e le scritture su disco avvengono nel
+    threadpool, senza bloccare l'event loop.
+    """
+    limit = max_bytes if max_bytes is not None else settings.import_max_upload_bytes
+    content_length = request.headers.get("content-length")
+    # Il body multipart contiene anche gli header delle parti: lasciamo un margine
+    if content_length and content_length.isdigit() and int(content_length) > limit + 64 * 1024:
+        raise HTTPException(status_code=413, detail=f"Upload troppo grande (massimo {limit // (1024 * 1024)} MB)")
+
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise HTTPException(status_code=415, detail="Atteso un upload multipart/form-data")
+
+    state: dict = {"headers": {}, "field": b"", "value": b"", "target": False}
+    sink: List[UploadSink] = []
+    pending: List[bytes] = []
+
+    def on_part_begin() -> None:
+        state["headers"] = {}
+        state["target"] = False
+
+    def on_header_field(data: bytes, start: int, end: int) -> None:
+        state["field"] += data[start:end]
+
+    def on_header_value(data: bytes, start: int, end: int) -> None:
+        state["value"] += data[start:end]
+
+    def on_header_end() -> None:
+        state["headers"][state["field"].lower()] = state["value"]
+        state["field"] = b""
+        state["value"] = b""
+
+    def on_headers_finished() -> None:
+        _, disp = parse_options_header(state["headers"].get(b"content-disposition", b""))
+        name = disp.get(b"name", b"").decode("latin-1")
+        filename = disp.get(b"filename", b"").decode("utf-8", errors="replace")
+        # Viene considerato solo il primo file del campo richiesto
+        if name == field_name and filename and not sink:
+            sink.append(UploadSink(filename, dest_dir, limit))
+            state["target"] = True
+
+    def on_part_data(data: bytes, start: int, end: int) -> None:
+        if state["target"]:
+            pending.append(data[start:end])
+
+    def on_part_end() -> None:
+        state["target"] = False
+
+    parser = MultipartParser(params[b"boundary"], {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+
+    async def flush() -> None:
+        data = b"".join(pending)
+        pending.clear()
+        if dest_dir is not None:
+            await run_in_threadpool(sink[0].write, data)
+        else:
+            sink[0].write(data)
+
+    buffered = 0
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            buffered = sum(len(p) for p in pending)
+            if sink and buffered >= _WRITE_BATCH:
+                await flush()
+        parser.finalize()
+        if not sink:
+            raise HTTPException(status_code=422, detail=f"Campo file '{field_name}' mancante")
+        if pending:
+            await flush()
+    except BaseException:
+        if sink:
+            sink[0].abort()
+        raise
+
+    return await run_in_threadpool(sink[0].finish) if dest_dir is not None else sink[0].finish()
@@ -0,0 +1,61 @@
+# app/Core/zip_stream.py
+
+import time
+import zipfile
+from pathlib import Path
+from typing import Iterable, Iterator, Tuple
+
+_CHUNK = 64 * 1024
+
+
+class _Sink:
+    """File non posizionabile su cui scrive ZipFile: i byte vengono raccolti e svuotati a ogni blocco."""
+
+    def __init__(self) -> None:
+        self._parts = []
+        self._offset = 0
+
+    def write(self, data: bytes) -> int:
+        self._parts.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._offset
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def stream_zip(entries: Iterable[Tuple[str, Path, bool]]) -> Iterator[bytes]:
+    """
+    Genera un archivio ZIP a blocchi senza mai tenerlo interamente in memoria o su disco.
+    `entries` contiene (nome nell'archivio, file, comprimere?): i file già compressi
+    (PNG) vanno salvati come STORED. Essendo lo stream non posizionabile, ZipFile
+    scrive CRC e dimensioni nei data descriptor dopo ogni voce.
+    Generatore sincrono: StreamingResponse lo consuma nel threadpool.
+    """
+    sink = _Sink()
+    with zipfile.ZipFile(sink, "w", allowZip64=True) as zf:
+        for arcname, path, compress in entries:
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            info = zipfile.ZipInfo(arcname, date_time=time.localtime(st.st_mtime)[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+            info.file_size = st.st_size
+            info.external_attr = 0o644 << 16
+            with path.open("rb") as src, zf.open(info, "w") as dst:
+                while chunk := src.read(_CHUNK):
+                    dst.write(chunk)
+                    if data := sink.drain():
+                        yield data
+            if data := sink.drain():
+                yield data
+    yield sink.drain()
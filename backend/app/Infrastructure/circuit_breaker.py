@@ -0,0 +1,117 @@
+# app/Infrastructure/circuit_breaker.py
+
+from __future__ import annotations
+
+import asyncio
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Dict
+
+import httpx
+from fastapi import HTTPException, status
+
+from app.Core.config import settings
+
+"""
+Circuit breaker per le chiamate in uscita verso Supabase. Dopo `failure_threshold`
+errori consecutivi (rete, timeout, risposte 5xx) il circuito si apre e per
+`reset_timeout` secondi le chiamate falliscono subito con 503 e Retry-After, senza
+occupare worker e socket in attesa di un servizio che non risponde. Trascorso il
+tempo lascia passare una sola chiamata di prova (half-open): se riesce il circuito
+si richiude, altrimenti resta aperto per un altro periodo.
+Ogni gruppo di endpoint ha il proprio circuito: un'API admin lenta non blocca i login.
+"""
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class ServiceUnavailableError(HTTPException):
+    """Supabase non raggiungibile o circuito aperto: 503 con il tempo dopo cui riprovare."""
+
+    def __init__(self, detail: str, retry_after: float) -> None:
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=detail,
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float) -> None:
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    def retry_after(self) -> float:
+        return max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+
+    def before_call(self) -> None:
+        """Solleva ServiceUnavailableError se la chiamata non può partire."""
+        if self.state == OPEN:
+            if self.retry_after() > 0:
+                raise ServiceUnavailableError(f"{self.name} temporaneamente non disponibile", self.retry_after())
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN:
+            # Una sola chiamata di prova alla volta; le altre falliscono subito
+            if self._probing:
+                raise ServiceUnavailableError(f"{self.name} temporaneamente non disponibile", 1)
+            self._probing = True
+
+    def record_success(self) -> None:
+        self.state, self.failures, self._probing = CLOSED, 0, False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state, self._opened_at = OPEN, time.monotonic()
+        self._probing = False
+
+    @asynccontextmanager
+    async def deadline(self, seconds: float) -> AsyncIterator[None]:
+        """
+        Tempo massimo complessivo (tentativi e attese compresi): allo scadere la
+        chiamata in corso viene annullata e conta come un solo errore.
+        """
+        try:
+            async with asyncio.timeout(seconds):
+                yield
+        except TimeoutError:
+            self.record_failure()
+            raise ServiceUnavailableError(f"{self.name} non ha risposto entro {seconds:g} s", self.retry_after())
+
+    async def call(self, send: Callable[[], Awaitable[httpx.Response]]) -> httpx.Response:
+        """
+        Esegue `send` sotto il circuito. Errori di rete e timeout diventano 503; le
+        risposte 5xx contano come errori ma vengono restituite al chiamante.
+        """
+        self.before_call()
+        try:
+            response = await send()
+        except httpx.TransportError as e:
+            self.record_failure()
+            raise ServiceUnavailableError(f"{self.name} non raggiungibile: {e!r}", self.retry_after())
+        except BaseException:
+            # Chiamata annullata: non dice nulla sullo stato del servizio
+            self._probing = False
+            raise
+        if response.status_code >= 500:
+            self.record_failure()
+        else:
+            self.record_success()
+        return response
+
+
+# Un circuito per gruppo di endpoint: lettura dell'utente, login/MFA, admin, JWKS
+supabase_breakers: Dict[str, CircuitBreaker] = {
+    group: CircuitBreaker(
+        f"Supabase Auth ({group})",
+        failure_threshold=settings.SUPABASE_BREAKER_FAILURES,
+        reset_timeout=settings.SUPABASE_BREAKER_RESET,
+    )
+    for group in ("read", "auth", "admin", "jwks")
+}
@@ -1,18 +1,25 @@
 # app/Infrastructure/db_supabase.py
 from __future__ import annotations
 
-from typing import AsyncGenerator
+from typing import AsyncGenerator, AsyncIterator, Optional
+from contextlib import asynccontextmanager
 import ssl
+import time
+import uuid
+import asyncio
+from fastapi import Request
 from sqlalchemy.ext.asyncio import (
     AsyncSession,
+    AsyncEngine,
     async_sessionmaker,
     create_async_engine,
 )
-from sqlalchemy.pool import NullPool
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
 from sqlalchemy.orm import DeclarativeBase
 from sqlalchemy import text
 
 from app.Core.config import settings
+from app.Core.response_cache import order_cache, LISTS
 
 # Base class for SQLAlchemy models (SQLAlchemy 2.0 style)
 # Utilizzando una classe che eredita da DeclarativeBase risolviamo gli errori di tipo in Pylance
@@ -32,13 +39,13 @@ from app.Models.polygon import Polygon
 from app.Models.hole import Hole
 
 
-def _make_ssl_context() -> dict:
+def _make_ssl_context(url: str) -> dict:
     """
-    Configura il contesto SSL per la connessione al database.
+    Configura il contesto SSL per la connessione al database `url` (primario o replica).
     Supabase richiede SSL attivo. Usiamo 'require' come valore predefinito
     che è compatibile con asyncpg tramite SQLAlchemy.
     """
-    if "+asyncpg" not in settings.DATABASE_URL:
+    if "+asyncpg" not in url:
         return {}
 
     # Per asyncpg, passare ssl="require" è il modo più semplice e compatibile
@@ -46,15 +53,65 @@ def _make_ssl_context() -> dict:
     return {"ssl": "require"}
 
 
-# Ottimizzazione per Supabase: viene utilizzato NullPool quando un pooler esterno
-# (come pgBouncer) è attivo, per evitare conflitti nella gestione delle connessioni.
-engine = create_async_engine(
-    settings.DATABASE_URL,
-    echo=False,
-    pool_pre_ping=True,
-    connect_args=_make_ssl_context(),
-    poolclass=NullPool,
-)
+def _connect_args(url: str, pool_mode: str, read_only: bool = False) -> dict:
+    """
+    Parametri di connessione asyncpg: le impostazioni di sessione (fuso orario UTC)
+    viaggiano nel pacchetto di avvio, quindi valgono per tutta la vita della
+    connessione senza un `SET` a ogni richiesta.
+    Dietro un transaction pooler le transazioni possono finire su backend diversi:
+    i prepared statement vanno disattivati e devono avere nomi univoci.
+    """
+    if "+asyncpg" not in url:
+        return {}
+
+    args = _make_ssl_context(url)
+    args["server_settings"] = {"timezone": "UTC", "application_name": settings.APP_NAME}
+    if read_only:
+        # Protezione in più sulla replica: qualsiasi scrittura fallisce subito
+        args["server_settings"]["default_transaction_read_only"] = "on"
+
+    cache_size = settings.DB_STATEMENT_CACHE_SIZE
+    if cache_size is None:
+        cache_size = 0 if pool_mode == "null" else 100
+    # Cache di asyncpg e cache dei prepared statement del dialetto SQLAlchemy
+    args["statement_cache_size"] = cache_size
+    args["prepared_statement_cache_size"] = cache_size
+    if cache_size == 0:
+        args["prepared_statement_name_func"] = lambda: f"__asyncpg_{uuid.uuid4()}__"
+    return args
+
+
+def _make_engine(url: str, read_only: bool = False) -> AsyncEngine:
+    """
+    Engine con il pool scelto da DB_POOL_MODE (vedi config):
+    - queue: connessioni riusate tra le richieste, niente handshake TLS per richiesta;
+    - null: nessun pool nell'app, lo gestisce il transaction pooler (pgBouncer/Supavisor).
+    """
+    pool_mode = settings.pool_mode_for(url)
+    if pool_mode == "null":
+        pool_args = {"poolclass": NullPool}
+    else:
+        pool_args = {
+            "poolclass": AsyncAdaptedQueuePool,
+            "pool_size": settings.DB_POOL_SIZE,
+            "max_overflow": settings.DB_MAX_OVERFLOW,
+            "pool_timeout": settings.DB_POOL_TIMEOUT,
+            "pool_recycle": settings.DB_POOL_RECYCLE,
+        }
+    return create_async_engine(
+        url,
+        echo=False,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        connect_args=_connect_args(url, pool_mode, read_only),
+        **pool_args,
+    )
+
+
+engine = _make_engine(settings.DATABASE_URL)
+# Replica in sola lettura, se configurata (DATABASE_READ_URL): senza ORDER_CACHE_DIR
+# l'app non si avvia (vedi Settings.check_replica_config)
+settings.check_replica_config()
+read_engine = _make_engine(settings.DATABASE_READ_URL, read_only=True) if settings.DATABASE_READ_URL else None
 
 # Factory per le sessioni asincrone
 SessionLocal = async_sessionmaker(
@@ -62,15 +119,117 @@ SessionLocal = async_sessionmaker(
     class_=AsyncSession,
     expire_on_commit=False,
 )
+ReadSessionLocal = async_sessionmaker(
+    bind=read_engine,
+    class_=AsyncSession,
+    expire_on_commit=False,
+) if read_engine is not None else None
 
+# Ritardo della replica: 0 se ha applicato tutto il WAL ricevuto, altrimenti l'età
+# dell'ultima transazione applicata. NULL (= 0) se il server non è in recovery.
+_REPLICA_LAG_SQL = text("""
+    SELECT COALESCE(CASE
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END, 0)
+""")
 
-async def get_db() -> AsyncGenerator[AsyncSession, None]:
+
+class ReplicaMonitor:
     """
-    Dependency per ottenere una sessione del database asincrona.
-    Garantisce che il fuso orario della sessione sia impostato su UTC.
+    Ritardo di replica misurato al più ogni `interval` secondi; con richieste
+    concorrenti la misura è una sola (le altre attendono il risultato).
+    Se la replica non risponde viene considerata non utilizzabile fino al controllo successivo.
+    """
+
+    def __init__(self, engine: AsyncEngine, max_lag: float, interval: float) -> None:
+        self.engine = engine
+        self.max_lag = max_lag
+        self.interval = interval
+        self._lag: Optional[float] = None
+        self._checked_at = float("-inf")
+        self._lock = asyncio.Lock()
+
+    async def lag(self) -> Optional[float]:
+        if time.monotonic() - self._checked_at < self.interval:
+            return self._lag
+        async with self._lock:
+            if time.monotonic() - self._checked_at < self.interval:
+                return self._lag
+            try:
+                async with self.engine.connect() as conn:
+                    self._lag = float((await conn.execute(_REPLICA_LAG_SQL)).scalar_one())
+            except Exception:
+                self._lag = None
+            self._checked_at = time.monotonic()
+        return self._lag
+
+    async def usable(self) -> bool:
+        lag = await self.lag()
+        return lag is not None and lag <= self.max_lag
+
+
+replica_monitor = ReplicaMonitor(
+    read_engine, settings.DB_REPLICA_MAX_LAG, settings.DB_REPLICA_LAG_CHECK
+) if read_engine is not None else None
+
+
+@asynccontextmanager
+async def open_session() -> AsyncIterator[AsyncSession]:
+    """
+    Sessione per chi deve aprirla solo quando serve (es. dopo aver verificato
+    una cache) invece che come dependency. Il fuso orario UTC è già impostato
+    sulla connessione (vedi `_connect_args`).
     """
     async with SessionLocal() as session:
-        await session.execute(text("SET TIME ZONE 'UTC'"))
+        yield session
+
+
+async def get_db() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Dependency per ottenere una sessione del database asincrona (fuso orario UTC).
+    La sessione è pigra: la connessione viene presa dal pool solo alla prima query,
+    quindi le richieste che non interrogano il DB (cache, 404, 429, auth fallita)
+    non la occupano mai, e torna al pool a ogni commit/rollback.
+    Va dichiarata con `Depends(get_db, scope="function")`: la sessione si chiude
+    appena termina l'endpoint, prima di serializzare e inviare la risposta.
+    """
+    async with open_session() as session:
+        yield session
+
+
+async def use_replica(*scopes: str) -> bool:
+    """
+    True se la lettura può andare sulla replica: replica configurata e allineata, e
+    nessuno degli ambiti (id ordine o elenchi) modificato negli ultimi
+    DB_READ_YOUR_WRITES secondi, così chi ha appena importato rilegge i propri dati.
+    """
+    if replica_monitor is None:
+        return False
+    if any(order_cache.changed_within(scope, settings.DB_READ_YOUR_WRITES) for scope in scopes):
+        return False
+    return await replica_monitor.usable()
+
+
+@asynccontextmanager
+async def open_read_session(*scopes: str) -> AsyncIterator[AsyncSession]:
+    """Come `open_session`, ma sulla replica quando `use_replica(*scopes)` lo consente."""
+    if await use_replica(*scopes):
+        async with ReadSessionLocal() as session:
+            yield session
+    else:
+        async with open_session() as session:
+            yield session
+
+
+async def get_read_db(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    """
+    Dependency per le route in sola lettura. L'ambito per il read-your-writes è
+    l'ordine del path (`order_id`) oppure, in sua assenza, gli elenchi.
+    Da dichiarare con `Depends(get_read_db, scope="function")` come `get_db`.
+    """
+    order_id = request.path_params.get("order_id")
+    async with open_read_session(str(order_id) if order_id else LISTS) as session:
         yield session
 
 
@@ -88,6 +247,8 @@ async def check_connection() -> bool:
 
 async def dispose_engine() -> None:
     """
-    Chiude correttamente l'engine SQLAlchemy.
+    Chiude correttamente gli engine SQLAlchemy.
     """
     await engine.dispose()
+    if read_engine is not None:
+        await read_engine.dispose()
@@ -0,0 +1,51 @@
+# app/Infrastructure/http_client.py
+
+from __future__ import annotations
+
+import importlib.util
+from typing import Optional
+
+import httpx
+
+from app.Core.config import settings
+
+"""
+Client HTTP condiviso per tutte le chiamate verso Supabase (Auth, JWKS, client supabase).
+Un solo pool di connessioni keep-alive per processo: DNS, TCP e TLS si pagano alla
+prima chiamata verso un host e non a ogni richiesta. Creato e chiuso dalla lifespan
+dell'app; fuori dall'app (CLI, script) viene creato alla prima chiamata.
+"""
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _http2_enabled() -> bool:
+    # HTTP/2 richiede il pacchetto opzionale `h2` (pip install "httpx[http2]")
+    return settings.HTTP_CLIENT_HTTP2 and importlib.util.find_spec("h2") is not None
+
+
+def _build_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(settings.HTTP_CLIENT_TIMEOUT, connect=settings.HTTP_CLIENT_CONNECT_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=settings.HTTP_CLIENT_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.HTTP_CLIENT_MAX_KEEPALIVE,
+            keepalive_expiry=settings.HTTP_CLIENT_KEEPALIVE_EXPIRY,
+        ),
+        http2=_http2_enabled(),
+    )
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Client condiviso; ricreato se è stato chiuso (es. dopo lo shutdown in un test)."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _build_client()
+    return _client
+
+
+async def close_http_client() -> None:
+    global _client
+    if _client is not None:
+        client, _client = _client, None
+        await client.aclose()
@@ -1,11 +1,17 @@
 # app/Infrastructure/supabase_auth_client.py
 
 from __future__ import annotations
+import asyncio
+import random
+import time
 import httpx
 from typing import Any, Dict, Optional
 from datetime import datetime, timezone
 
+from app.Core import server_timing
 from app.Core.config import settings
+from app.Infrastructure.circuit_breaker import CLOSED, CircuitBreaker, ServiceUnavailableError, supabase_breakers
+from app.Infrastructure.http_client import get_http_client
 
 """
 Service async per Supabase Auth (GoTrue).
@@ -24,20 +30,76 @@ def _service_headers() -> dict[str, str]:
         "apikey": k,  # obbligatorio per Supabase
     }
 
+_RETRYABLE_STATUS = {502, 503, 504}
+
+
+def _endpoint_group(method: str, path: str) -> str:
+    """Gruppo dell'endpoint, con il proprio budget di tempo e il proprio circuito."""
+    if path.startswith(("/auth/v1/admin/", "/auth/v1/signup")):
+        return "admin"
+    if method == "GET":
+        # La lettura dell'utente è in ogni richiesta autenticata
+        return "read"
+    return "auth"
+
+
+def _timeout_budget(group: str) -> float:
+    return {
+        "read": settings.SUPABASE_TIMEOUT_READ,
+        "auth": settings.SUPABASE_TIMEOUT_AUTH,
+        "admin": settings.SUPABASE_TIMEOUT_ADMIN,
+    }[group]
+
+
+async def _send(
+    breaker: CircuitBreaker,
+    method: str,
+    path: str,
+    headers: dict[str, str],
+    json: Optional[dict],
+    operation: str,
+) -> httpx.Response:
+    url = f"{settings.SUPABASE_URL.rstrip('/')}{path}"
+    # Client condiviso: connessione keep-alive riusata, niente handshake TLS per chiamata
+    started = time.perf_counter()
+    try:
+        return await breaker.call(
+            lambda: get_http_client().request(method, url, headers=headers, json=json)
+        )
+    finally:
+        # Etichetta fissa per operazione: il path contiene id di utenti e fattori
+        server_timing.record("supabase", (time.perf_counter() - started) * 1000, operation)
+
+
 async def _request(
     method: str,
     path: str,
     json: Optional[dict] = None,
     extra_headers: Optional[dict[str, str]] = None,
+    *,
+    operation: str,
 ) -> Dict[str, Any]:
-    base = settings.SUPABASE_URL.rstrip("/")
-    url = f"{base}{path}"
-    timeout = httpx.Timeout(30.0, connect=8.0)
     headers = _service_headers()
     if extra_headers:
         headers.update(extra_headers)
-    async with httpx.AsyncClient(timeout=timeout) as client:
-        resp = await client.request(method, url, headers=headers, json=json)
+    group = _endpoint_group(method, path)
+    breaker = supabase_breakers[group]
+    # Solo le GET sono idempotenti e quindi ritentabili
+    retries = settings.SUPABASE_GET_RETRIES if method == "GET" else 0
+    # Il budget copre l'intera chiamata, tentativi e attese compresi
+    async with breaker.deadline(_timeout_budget(group)):
+        for attempt in range(retries + 1):
+            try:
+                resp = await _send(breaker, method, path, headers, json, operation)
+            except ServiceUnavailableError:
+                # Circuito aperto: inutile ritentare prima di Retry-After
+                if attempt == retries or breaker.state != CLOSED:
+                    raise
+            else:
+                if resp.status_code not in _RETRYABLE_STATUS or attempt == retries:
+                    break
+            # Attesa casuale ("full jitter") per non ritentare tutti nello stesso istante
+            await asyncio.sleep(random.uniform(0, settings.SUPABASE_RETRY_BACKOFF * 2 ** attempt))
 
     try:
         data: Dict[str, Any] = resp.json() if resp.content else {}
@@ -67,11 +129,11 @@ async def sign_up(email: str, password: str, user_meta: Optional[dict] = None) -
     payload = {"email": email, "password": password}
     if user_meta:
         payload["data"] = user_meta
-    return await _request("POST", "/auth/v1/signup", payload)
+    return await _request("POST", "/auth/v1/signup", payload, operation="signup")
 
 async def sign_in(email: str, password: str) -> Dict[str, Any]:
     payload = {"email": email, "password": password}
-    return await _request("POST", "/auth/v1/token?grant_type=password", payload)
+    return await _request("POST", "/auth/v1/token?grant_type=password", payload, operation="login")
 
 
 # ----------------- Flussi "admin" (SERVE Authorization Bearer service_role) -----------------
@@ -85,6 +147,7 @@ async def update_user(user_id: str, patch: dict) -> Dict[str, Any]:
         f"/auth/v1/admin/users/{user_id}",
         patch,
         extra_headers=_admin_auth_headers(),
+        operation="admin_update_user",
     )
 
 async def admin_logout_user(user_id: str) -> Dict[str, Any]:
@@ -93,6 +156,7 @@ async def admin_logout_user(user_id: str) -> Dict[str, Any]:
         f"/auth/v1/admin/users/{user_id}/logout",
         json={},
         extra_headers=_admin_auth_headers(),
+        operation="admin_logout",
     )
 
 async def admin_confirm_user(user_id: str) -> Dict[str, Any]:
@@ -101,41 +165,73 @@ async def admin_confirm_user(user_id: str) -> Dict[str, Any]:
     return await update_user(user_id, patch)
 
 
-async def register_user(
+async def admin_create_user(
     email: str,
     password: str,
     user_meta: Optional[dict] = None,
     app_meta: Optional[dict] = None,
-    banned_until: Optional[str] = None,
     phone: Optional[str] = None,
+    email_confirm: bool = False,
 ) -> Dict[str, Any]:
-    res = await sign_up(email, password, user_meta or {})
+    """
+    POST /auth/v1/admin/users: utente, metadati e conferma email in una sola chiamata.
+    La risposta è l'utente: viene restituito in `user` come per il signup.
+    """
+    payload: dict = {"email": email, "password": password, "email_confirm": email_confirm}
+    if user_meta:
+        payload["user_metadata"] = user_meta
+    if app_meta is not None:
+        payload["app_metadata"] = app_meta
+    if phone is not None:
+        payload["phone"] = phone
+    res = await _request(
+        "POST", "/auth/v1/admin/users", payload, extra_headers=_admin_auth_headers(), operation="admin_create_user"
+    )
     if res.get("error"):
         return res
+    status_code = res.pop("http_status")
+    res.pop("error")
+    return {"user": res, "http_status": status_code, "error": None}
 
-    user = (res.get("user") or {})
-    user_id = user.get("id")
-    if not user_id:
-        return res
 
+async def register_user(
+    email: str,
+    password: str,
+    user_meta: Optional[dict] = None,
+    app_meta: Optional[dict] = None,
+    banned_until: Optional[str] = None,
+    phone: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Con conferma automatica (dev) l'utente è creato già confermato e con tutti i
+    metadati da una sola chiamata admin. Altrimenti si passa dal signup, che invia
+    l'email di conferma, e gli attributi riservati all'admin seguono con un update.
+    """
+    auto_confirm = settings.ENV == "dev" and settings.AUTH_AUTO_CONFIRM_DEV
     patch: dict = {}
-    if app_meta is not None:
-        patch["app_metadata"] = app_meta
     if banned_until is not None:
         patch["banned_until"] = banned_until
-    if phone is not None:
-        patch["phone"] = phone
 
-    if patch:
+    if auto_confirm:
+        res = await admin_create_user(
+            email, password, user_meta or {}, app_meta, phone, email_confirm=True
+        )
+    else:
+        res = await sign_up(email, password, user_meta or {})
+        if app_meta is not None:
+            patch["app_metadata"] = app_meta
+        if phone is not None:
+            patch["phone"] = phone
+    if res.get("error"):
+        return res
+
+    user = (res.get("user") or {})
+    user_id = user.get("id")
+    if user_id and patch:
         upd = await update_user(user_id, patch)
         if not upd.get("error") and isinstance(upd.get("user"), dict):
             res["user"] = upd["user"]
 
-    if settings.ENV == "dev" and settings.AUTH_AUTO_CONFIRM_DEV:
-        conf = await admin_confirm_user(user_id)
-        if not conf.get("error") and isinstance(conf.get("user"), dict):
-            res["user"] = conf["user"]
-
     return res
 
 
@@ -154,6 +250,7 @@ async def get_user_from_access_token(access_token: str) -> Dict[str, Any]:
         "/auth/v1/user",
         json=None,
         extra_headers=_bearer_auth_headers(access_token),
+        operation="get_user",
     )
 
 # ----------------- Flussi MFA (richiedono Bearer token utente) -----------------
@@ -171,6 +268,7 @@ async def enroll_totp(access_token: str, friendly_name: Optional[str] = None) ->
         "/auth/v1/factors",
         json=payload,
         extra_headers=_bearer_auth_headers(access_token),
+        operation="mfa_enroll",
     )
 
 async def create_mfa_challenge(access_token: str, factor_id: str) -> Dict[str, Any]:
@@ -180,6 +278,7 @@ async def create_mfa_challenge(access_token: str, factor_id: str) -> Dict[str, A
         f"/auth/v1/factors/{factor_id}/challenge",
         json={},
         extra_headers=_bearer_auth_headers(access_token),
+        operation="mfa_challenge",
     )
 
 async def verify_mfa_challenge(
@@ -192,6 +291,7 @@ async def verify_mfa_challenge(
         f"/auth/v1/factors/{factor_id}/verify",
         json=payload,
         extra_headers=_bearer_auth_headers(access_token),
+        operation="mfa_verify",
     )
 
 async def list_factors(access_token: str) -> Dict[str, Any]:
@@ -205,4 +305,5 @@ async def delete_mfa_factor(access_token: str, factor_id: str) -> Dict[str, Any]
         "DELETE",
         f"/auth/v1/factors/{factor_id}",
         extra_headers=_bearer_auth_headers(access_token),
+        operation="mfa_delete",
     )
@@ -0,0 +1,154 @@
+import zlib
+from typing import Optional
+
+import anyio.to_thread
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:  # brotli è opzionale: senza il pacchetto si usa solo gzip
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+# Tipi che vale la pena comprimere; immagini raster, ZIP e simili sono già compressi
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+    "image/vnd.dxf",
+    "application/dxf",
+)
+
+# Oltre questa dimensione la compressione di un blocco avviene in un thread
+_THREAD_MIN_SIZE = 128 * 1024
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Sceglie la codifica dall'header Accept-Encoding: brotli se disponibile, poi gzip."""
+    accepted = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+class _Compressor:
+    def __init__(self, encoding: str, level: int) -> None:
+        if encoding == "br":
+            self._br = brotli.Compressor(quality=level)
+            self._gz = None
+        else:
+            self._br = None
+            self._gz = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        if self._br is not None:
+            out = self._br.process(data)
+            return out + (self._br.finish() if final else self._br.flush())
+        out = self._gz.compress(data)
+        # Flush sincrono a ogni blocco: le risposte in streaming (es. NDJSON) arrivano subito
+        return out + self._gz.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class CompressionMiddleware:
+    """
+    Compressione delle risposte (brotli o gzip) come middleware ASGI puro, senza
+    bufferizzare le risposte in streaming. Non tocca risposte piccole, già codificate,
+    parziali (Range) o di tipi non comprimibili.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 5) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.levels = {"gzip": gzip_level, "br": brotli_quality}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = Headers(scope=scope)
+        encoding = negotiate_encoding(request_headers.get("accept-encoding", ""))
+        if encoding is None or "range" in request_headers:
+            await self.app(scope, receive, send)
+            return
+
+        start: Optional[Message] = None
+        compressor: Optional[_Compressor] = None
+        passthrough = False
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start, compressor, passthrough
+            if passthrough:
+                await send(message)
+                return
+
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                media_type = headers.get("content-type", "").partition(";")[0].strip().lower()
+                if (
+                    "content-encoding" in headers
+                    or message["status"] in (204, 206, 304)
+                    or not media_type.startswith(COMPRESSIBLE_TYPES)
+                ):
+                    passthrough = True
+                    await send(message)
+                else:
+                    start = message  # inviato solo quando si conosce il primo blocco
+                return
+
+            if message["type"] != "http.response.body":
+                # es. http.response.pathsend: il file viene inviato così com'è
+                passthrough = True
+                await send(start)
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if compressor is None:
+                if not more_body and len(body) < self.minimum_size:
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+                compressor = _Compressor(encoding, self.levels[encoding])
+                headers = MutableHeaders(raw=start["headers"])
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                # La rappresentazione compressa non è identica byte per byte: l'ETag diventa debole
+                if "etag" in headers and not headers["etag"].startswith("W/"):
+                    headers["ETag"] = "W/" + headers["etag"]
+                del headers["Content-Length"]
+                if not more_body:
+                    data = await self._compress(compressor, body, final=True)
+                    headers["Content-Length"] = str(len(data))
+                    await send(start)
+                    await send({"type": "http.response.body", "body": data})
+                    return
+                await send(start)
+
+            data = await self._compress(compressor, body, final=not more_body)
+            await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
+
+    @staticmethod
+    async def _compress(compressor: _Compressor, body: bytes, final: bool) -> bytes:
+        if len(body) >= _THREAD_MIN_SIZE:
+            return await anyio.to_thread.run_sync(compressor.compress, body, final)
+        return compressor.compress(body, final)
@@ -0,0 +1,33 @@
+import time
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.Core import server_timing
+
+
+class ServerTimingMiddleware:
+    """
+    Aggiunge `Server-Timing` alle risposte che hanno fatto chiamate in uscita
+    registrate con `server_timing.record` (una voce per chiamata più il totale).
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        timings = server_timing.start()
+
+        async def send_with_timing(message: Message) -> None:
+            if message["type"] == "http.response.start" and timings:
+                total_ms = (time.perf_counter() - started) * 1000
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", server_timing.header_value(timings, total_ms))
+            await send(message)
+
+        await self.app(scope, receive, send_with_timing)
@@ -2,7 +2,7 @@
 
 from __future__ import annotations
 from typing import TYPE_CHECKING
-from sqlalchemy import String, ForeignKey, Float
+from sqlalchemy import String, ForeignKey, Float, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.Infrastructure.db_supabase import Base
 from uuid import UUID
@@ -13,6 +13,7 @@ if TYPE_CHECKING:
 
 class Hole(Base):
     __tablename__ = "holes"
+    __table_args__ = (Index("ix_public_holes_polygon_id", "polygon_id"),)
 
     id: Mapped[UUID] = mapped_column(primary_key=True, default=uuid.uuid4)
     polygon_id: Mapped[UUID] = mapped_column(ForeignKey("polygons.id", ondelete="CASCADE"))
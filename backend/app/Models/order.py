@@ -2,7 +2,8 @@
 
 from __future__ import annotations
 from typing import TYPE_CHECKING, List
-from sqlalchemy import String, ForeignKey, DateTime, func
+from sqlalchemy import String, ForeignKey, DateTime, Integer, Float, Index, func, text
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.Infrastructure.db_supabase import Base
 from uuid import UUID
@@ -19,6 +20,20 @@ class Order(Base):
     user_id: Mapped[UUID] = mapped_column(ForeignKey("auth.users.id", ondelete="CASCADE"), nullable=True)
     client_id: Mapped[UUID] = mapped_column(ForeignKey("clients.id", ondelete="CASCADE"), nullable=True)
     created_at: Mapped[DateTime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    # SHA-256 del PDF importato: un reimport dello stesso file non viene rielaborato
+    source_sha256: Mapped[str] = mapped_column(String(64), nullable=True)
+
+    # Aggregati denormalizzati, aggiornati a ogni import/rielaborazione (vedi OrderService)
+    piece_count: Mapped[int] = mapped_column(Integer, default=0, server_default=text("0"))
+    hole_count: Mapped[int] = mapped_column(Integer, default=0, server_default=text("0"))
+    total_area_m2: Mapped[float] = mapped_column(Float, default=0.0, server_default=text("0"))
+    total_cut_length_m: Mapped[float] = mapped_column(Float, default=0.0, server_default=text("0"))
+    materials: Mapped[list] = mapped_column(JSONB, default=list, server_default=text("'[]'"))
 
     client: Mapped[Client] = relationship(back_populates="orders")
     polygons: Mapped[List[Polygon]] = relationship(back_populates="order", cascade="all, delete-orphan")
+
+# Ordinamento degli elenchi e paginazione keyset su (created_at, id), anche filtrati per cliente/utente
+Index("ix_public_orders_created_at", Order.created_at.desc(), Order.id.desc())
+Index("ix_public_orders_client_id", Order.client_id, Order.created_at.desc(), Order.id.desc())
+Index("ix_public_orders_user_id", Order.user_id, Order.created_at.desc(), Order.id.desc())
@@ -2,7 +2,8 @@
 
 from __future__ import annotations
 from typing import TYPE_CHECKING, List
-from sqlalchemy import String, ForeignKey, Float
+from sqlalchemy import String, ForeignKey, Float, Integer, Index
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.Infrastructure.db_supabase import Base
 from uuid import UUID
@@ -14,10 +15,13 @@ if TYPE_CHECKING:
 
 class Polygon(Base):
     __tablename__ = "polygons"
+    # Pezzi di un ordine nell'ordine di pagina (alberi, miniature, delete in cascata)
+    __table_args__ = (Index("ix_public_polygons_order_id", "order_id", "page_number", "is_mirrored"),)
 
     id: Mapped[UUID] = mapped_column(primary_key=True, default=uuid.uuid4)
     order_id: Mapped[UUID] = mapped_column(ForeignKey("orders.id", ondelete="CASCADE"))
     label: Mapped[str] = mapped_column(String(128), nullable=True) # e.g. "X4 - START TIME"
+    page_number: Mapped[int] = mapped_column(Integer, nullable=True) # pagina del PDF di origine (1-based)
     width_mm: Mapped[float] = mapped_column(Float)
     height_mm: Mapped[float] = mapped_column(Float)
     dxf_path: Mapped[str] = mapped_column(String(255), nullable=True)
@@ -27,6 +31,10 @@ class Polygon(Base):
     is_machining: Mapped[bool] = mapped_column(default=False)
     material: Mapped[str] = mapped_column(String(128), nullable=True)
     thickness_mm: Mapped[float] = mapped_column(Float, nullable=True)
+    area_mm2: Mapped[float] = mapped_column(Float, nullable=True) # superficie netta (fori passanti esclusi)
+    cut_length_mm: Mapped[float] = mapped_column(Float, nullable=True) # contorno + fori passanti
+    outer_coords: Mapped[list] = mapped_column(JSONB, nullable=True) # contorno in mm [[x, y], ...]
+    fingerprint: Mapped[str] = mapped_column(String(64), nullable=True) # SHA-256 di geometria e metadati
 
     order: Mapped[Order] = relationship(back_populates="polygons")
     holes: Mapped[List[Hole]] = relationship(back_populates="polygon", cascade="all, delete-orphan")
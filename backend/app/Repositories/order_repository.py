@@ -0,0 +1,307 @@
+# app/Repositories/order_repository.py
+
+from __future__ import annotations
+
+import json
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+from sqlalchemy import select, delete, insert, update, or_, func, tuple_
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload, aliased
+
+from app.Models.client import Client
+from app.Models.order import Order
+from app.Models.polygon import Polygon
+from app.Models.hole import Hole
+from app.Core.config import settings
+
+
+def _polygon_values(piece: Dict[str, Any]) -> Dict[str, Any]:
+    """Colonne di `polygons` valorizzate a partire da un pezzo prodotto dal parser."""
+    return {
+        "label": piece["label"],
+        "page_number": piece.get("page_number"),
+        "width_mm": piece["width_mm"],
+        "height_mm": piece["height_mm"],
+        "dxf_path": piece["dxf_path"],
+        "preview_path": piece["preview_path"],
+        "technical_preview_path": piece.get("technical_preview_path"),
+        "is_mirrored": piece.get("is_mirrored", False),
+        "is_machining": piece.get("is_machining", False),
+        "material": piece.get("material"),
+        "thickness_mm": piece.get("thickness_mm"),
+        "area_mm2": piece.get("area_mm2"),
+        "cut_length_mm": piece.get("cut_length_mm"),
+        "outer_coords": [[round(x, 3), round(y, 3)] for x, y in piece.get("outer_coords") or []] or None,
+        "fingerprint": piece.get("fingerprint"),
+    }
+
+
+def _hole_values(polygon_id: UUID, hole: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": uuid.uuid4(),
+        "polygon_id": polygon_id,
+        "type": hole["type"],
+        "x_mm": hole["x_mm"],
+        "y_mm": hole["y_mm"],
+        "width_mm": hole.get("width_mm"),
+        "height_mm": hole.get("height_mm"),
+        "diameter_mm": hole.get("diameter_mm"),
+        "depth_mm": hole.get("depth_mm"),
+        "hole_library_id": None,
+    }
+
+
+def build_piece_rows(
+    order_id: UUID,
+    pieces: Sequence[Dict[str, Any]],
+    polygon_ids: Optional[Sequence[UUID]] = None,
+) -> List[Tuple[Dict[str, Any], List[Dict[str, Any]]]]:
+    """
+    Converte i pezzi del parser in righe pronte per l'inserimento massivo.
+    Gli UUID sono generati lato client, così pezzi e fori possono essere
+    inseriti con un solo statement per tabella senza attendere le PK.
+    """
+    rows = []
+    for i, piece in enumerate(pieces):
+        polygon_id = polygon_ids[i] if polygon_ids is not None else uuid.uuid4()
+        poly_row = {"id": polygon_id, "order_id": order_id, **_polygon_values(piece)}
+        rows.append((poly_row, [_hole_values(polygon_id, h) for h in piece["holes"]]))
+    return rows
+
+
+class OrderRepository:
+    """Repository per ordini, pezzi (polygons) e fori (holes)."""
+
+    def __init__(self, db: AsyncSession) -> None:
+        self.db = db
+
+    async def get_with_tree(self, order_id: UUID) -> Optional[Order]:
+        """
+        Ritorna l'ordine con poligoni e fori caricati, oppure None.
+        `populate_existing` garantisce dati aggiornati anche per oggetti già in sessione.
+        """
+        stmt = (
+            select(Order)
+            .where(Order.id == order_id)
+            .options(selectinload(Order.polygons).selectinload(Polygon.holes))
+            .execution_options(populate_existing=True)
+        )
+        res = await self.db.execute(stmt)
+        return res.scalar_one_or_none()
+
+    async def list_summaries(
+        self,
+        limit: int,
+        after: Optional[Tuple[datetime, UUID]] = None,
+        client_id: Optional[UUID] = None,
+        user_id: Optional[UUID] = None,
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Elenco ordini dal più recente, paginato per keyset su (created_at, id):
+        il costo di una pagina non dipende da quante ne precedono.
+        Ritorna righe leggere (aggregati denormalizzati e prima miniatura) senza caricare pezzi e fori.
+        """
+        thumbnail = (
+            select(Polygon.preview_path)
+            .where(Polygon.order_id == Order.id, Polygon.preview_path.is_not(None))
+            .order_by(Polygon.page_number, Polygon.is_mirrored, Polygon.label)
+            .limit(1)
+            .scalar_subquery()
+        )
+        stmt = (
+            select(
+                Order.id,
+                Order.code,
+                Order.client_id,
+                Client.name.label("client_name"),
+                Order.user_id,
+                Order.created_at,
+                Order.piece_count,
+                Order.hole_count,
+                Order.total_area_m2,
+                Order.total_cut_length_m,
+                Order.materials,
+                thumbnail.label("thumbnail_path"),
+            )
+            .outerjoin(Client, Client.id == Order.client_id)
+            .order_by(Order.created_at.desc(), Order.id.desc())
+            .limit(limit)
+        )
+        if after is not None:
+            stmt = stmt.where(tuple_(Order.created_at, Order.id) < tuple_(*after))
+        if client_id is not None:
+            stmt = stmt.where(Order.client_id == client_id)
+        if user_id is not None:
+            stmt = stmt.where(Order.user_id == user_id)
+        if created_from is not None:
+            stmt = stmt.where(Order.created_at >= created_from)
+        if created_to is not None:
+            stmt = stmt.where(Order.created_at < created_to)
+        res = await self.db.execute(stmt)
+        return [dict(r) for r in res.mappings().all()]
+
+    async def sum_pieces(self, order_id: UUID) -> Dict[str, Any]:
+        """
+        Totali calcolati a DB sui pezzi dell'ordine, per riallineare gli aggregati
+        quando in memoria è disponibile solo una parte dei pezzi (es. rielaborazione di pagina).
+        """
+        owner = aliased(Polygon)
+        hole_count = (
+            select(func.count(Hole.id))
+            .join(owner, Hole.polygon_id == owner.id)
+            .where(owner.order_id == order_id)
+            .scalar_subquery()
+        )
+        res = await self.db.execute(
+            select(
+                func.count(Polygon.id).label("piece_count"),
+                hole_count.label("hole_count"),
+                func.coalesce(func.sum(Polygon.area_mm2), 0.0).label("area_mm2"),
+                func.coalesce(func.sum(Polygon.cut_length_mm), 0.0).label("cut_length_mm"),
+            ).where(Polygon.order_id == order_id)
+        )
+        totals = dict(res.mappings().one())
+        res = await self.db.execute(
+            select(Polygon.material).where(Polygon.order_id == order_id, Polygon.material.is_not(None)).distinct()
+        )
+        totals["materials"] = list(res.scalars().all())
+        return totals
+
+    async def fetch_trees(
+        self,
+        order_ids: Optional[Sequence[UUID]],
+        order_fields: Sequence[str],
+        polygon_fields: Optional[Sequence[str]] = None,
+        hole_fields: Optional[Sequence[str]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Alberi ordine -> pezzi -> fori come dict pronti da serializzare, letti
+        come righe (nessun oggetto ORM, nessuna identity map): una query per livello.
+        `order_ids` None = tutti gli ordini (dal più recente); `polygon_fields`/`hole_fields`
+        None = relazione non caricata.
+        """
+        stmt = select(Order.id, *(Order.__table__.c[f] for f in order_fields))
+        if order_ids is not None:
+            stmt = stmt.where(Order.id.in_(order_ids))
+        res = await self.db.execute(stmt.order_by(Order.created_at.desc(), Order.id.desc()))
+        trees: Dict[UUID, Dict[str, Any]] = {}
+        for order_id, *values in res.all():
+            trees[order_id] = dict(zip(order_fields, values))
+        if polygon_fields is None or not trees:
+            return list(trees.values())
+
+        for tree in trees.values():
+            tree["polygons"] = []
+        stmt = select(Polygon.order_id, Polygon.id, *(Polygon.__table__.c[f] for f in polygon_fields))
+        if order_ids is not None:
+            stmt = stmt.where(Polygon.order_id.in_(order_ids))
+        res = await self.db.execute(stmt.order_by(Polygon.page_number, Polygon.is_mirrored))
+        pieces: Dict[UUID, Dict[str, Any]] = {}
+        for order_id, polygon_id, *values in res.all():
+            piece = dict(zip(polygon_fields, values))
+            pieces[polygon_id] = piece
+            trees[order_id]["polygons"].append(piece)
+        if hole_fields is None or not pieces:
+            return list(trees.values())
+
+        for piece in pieces.values():
+            piece["holes"] = []
+        stmt = select(Hole.polygon_id, *(Hole.__table__.c[f] for f in hole_fields))
+        if order_ids is not None:
+            stmt = stmt.join(Polygon, Hole.polygon_id == Polygon.id).where(Polygon.order_id.in_(order_ids))
+        res = await self.db.execute(stmt)
+        for polygon_id, *values in res.all():
+            pieces[polygon_id]["holes"].append(dict(zip(hole_fields, values)))
+        return list(trees.values())
+
+    async def get_by_code(self, code: str) -> Optional[Order]:
+        res = await self.db.execute(select(Order).where(Order.code == code))
+        return res.scalar_one_or_none()
+
+    async def list_pieces(self, order_id: UUID, with_holes: bool = False) -> Sequence[Polygon]:
+        """
+        Tutti i pezzi dell'ordine, opzionalmente con i fori caricati.
+        """
+        stmt = select(Polygon).where(Polygon.order_id == order_id)
+        if with_holes:
+            stmt = stmt.options(selectinload(Polygon.holes))
+        res = await self.db.execute(stmt)
+        return res.scalars().all()
+
+    async def insert_polygons(self, rows: List[Dict[str, Any]]) -> None:
+        """Inserimento massivo di righe `polygons` (PK già valorizzate). Non esegue commit."""
+        await self._bulk_insert(Polygon, rows)
+
+    async def update_polygons(self, rows: List[Dict[str, Any]]) -> None:
+        """Aggiornamento massivo per chiave primaria di righe `polygons`. Non esegue commit."""
+        if rows:
+            await self.db.execute(update(Polygon), rows)
+
+    async def insert_holes(self, rows: List[Dict[str, Any]]) -> None:
+        """Inserimento massivo di righe `holes` (PK già valorizzate). Non esegue commit."""
+        await self._bulk_insert(Hole, rows)
+
+    async def delete_holes(self, polygon_ids: Sequence[UUID]) -> None:
+        """Elimina tutti i fori dei pezzi indicati. Non esegue commit."""
+        if polygon_ids:
+            await self.db.execute(delete(Hole).where(Hole.polygon_id.in_(polygon_ids)))
+
+    async def _bulk_insert(self, model, rows: List[Dict[str, Any]]) -> None:
+        """
+        Un solo INSERT multi-riga per tabella; per ordini molto grandi su asyncpg
+        si passa a COPY, che evita il parsing SQL e il limite dei parametri.
+        """
+        if not rows:
+            return
+        if len(rows) >= settings.IMPORT_COPY_THRESHOLD and self.db.get_bind().dialect.driver == "asyncpg":
+            table = model.__table__
+            columns = list(rows[0].keys())
+            # In COPY binario asyncpg si aspetta i JSONB già serializzati
+            encode = [
+                (lambda v: None if v is None else json.dumps(v)) if isinstance(table.c[c].type, JSONB) else None
+                for c in columns
+            ]
+            conn = await self.db.connection()
+            raw = await conn.get_raw_connection()
+            await raw.driver_connection.copy_records_to_table(
+                table.name,
+                schema_name=table.schema or "public",
+                columns=columns,
+                records=[
+                    tuple(enc(r[c]) if enc else r[c] for c, enc in zip(columns, encode))
+                    for r in rows
+                ],
+            )
+            return
+        await self.db.execute(insert(model), rows)
+
+    async def list_page_pieces(self, order: Order, page_number: int) -> Sequence[Polygon]:
+        """
+        Pezzi dell'ordine generati da una pagina del PDF.
+        Per i pezzi importati prima dell'introduzione di page_number si usa
+        il nome del DXF ({code}_{pagina}[_mirrored].dxf).
+        """
+        legacy_names = [f"{order.code}_{page_number}.dxf", f"{order.code}_{page_number}_mirrored.dxf"]
+        stmt = select(Polygon).where(
+            Polygon.order_id == order.id,
+            or_(
+                Polygon.page_number == page_number,
+                Polygon.page_number.is_(None) & Polygon.dxf_path.in_(legacy_names),
+            ),
+        )
+        res = await self.db.execute(stmt)
+        return res.scalars().all()
+
+    async def delete_pieces(self, polygon_ids: Sequence[UUID]) -> None:
+        """
+        Elimina i pezzi indicati; i fori seguono via ON DELETE CASCADE. Non esegue commit.
+        """
+        if polygon_ids:
+            await self.db.execute(delete(Polygon).where(Polygon.id.in_(polygon_ids)))
@@ -7,6 +7,7 @@ from fastapi import HTTPException
 from sqlalchemy import select, delete
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.Core.role_cache import role_cache
 from app.Models.role import Role
 
 
@@ -83,6 +84,8 @@ class RoleRepository:
             for k, v in data.items():
                 setattr(obj, k, v)
             await self.db.commit()
+            # Un ruolo rinominato cambia i ruoli in cache di tutti i suoi utenti
+            role_cache.clear()
             await self.db.refresh(obj)
         return obj
 
@@ -94,4 +97,5 @@ class RoleRepository:
         stmt = delete(Role).where(Role.id == role_id)
         res = await self.db.execute(stmt)
         await self.db.commit()
+        role_cache.clear()
         return (res.rowcount or 0) > 0
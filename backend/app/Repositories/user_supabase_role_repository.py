@@ -2,14 +2,15 @@
 
 from __future__ import annotations
 
-from typing import List
+from typing import FrozenSet, List
 from uuid import UUID
 
-from sqlalchemy import select, func
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError
 from fastapi import HTTPException
 
+from app.Core.role_cache import role_cache, normalize_role
 from app.Models.role import Role
 from app.Models.user_supabase_role import UserSupabaseRole
 
@@ -44,21 +45,23 @@ class UserSupabaseRoleRepository:
         res = await self.db.execute(stmt)
         return [row[0] for row in res.all()]
 
+    async def get_role_names(self, user_id: UUID) -> FrozenSet[str]:
+        """
+        Nomi dei ruoli dell'utente dalla cache in memoria, con una sola query
+        (sul ponte, per user_id) quando mancano.
+        """
+        roles = role_cache.get(user_id)
+        if roles is None:
+            roles = frozenset(await self.list_role_names(user_id))
+            role_cache.set(user_id, roles)
+        return roles
+
     async def user_has_role(self, user_id: UUID, role_name: str) -> bool:
         """
         True se l'utente ha un ruolo con quel nome (match case-insensitive e trim).
         """
-        stmt = (
-            select(Role.id)
-            .join(UserSupabaseRole, UserSupabaseRole.role_id == Role.id)
-            .where(
-                UserSupabaseRole.user_id == user_id,
-                func.lower(func.trim(Role.name)) == func.lower(func.trim(role_name)),
-            )
-            .limit(1)
-        )
-        res = await self.db.execute(stmt)
-        return res.scalar() is not None
+        wanted = normalize_role(role_name)
+        return any(normalize_role(name) == wanted for name in await self.get_role_names(user_id))
 
     async def assign(self, user_id: UUID, role_id: UUID) -> UserSupabaseRole:
         """
@@ -84,6 +87,7 @@ class UserSupabaseRoleRepository:
                     detail="This role is already assigned to the user.",
                 )
             raise
+        role_cache.invalidate(user_id)
         await self.db.refresh(row)
         return row
 
@@ -99,4 +103,5 @@ class UserSupabaseRoleRepository:
         )
         res = await self.db.execute(stmt)
         await self.db.commit()
+        role_cache.invalidate(user_id)
         return (res.rowcount or 0) > 0
@@ -8,8 +8,8 @@ from uuid import UUID
 from sqlalchemy.ext.asyncio import AsyncSession
 
 # 🔒 Dipendenze/guardie
-from app.Router.supabase_auth import require_roles, get_current_claims, get_optional_claims
-from app.Infrastructure.db_supabase import get_db
+from app.Router.supabase_auth import require_roles, get_current_claims, get_optional_claims, resolve_roles
+from app.Infrastructure.db_supabase import get_db, get_read_db
 
 # 📦 Controller applicativi
 from app.Controllers.supabase_auth_controller import SupabaseAuthController
@@ -25,8 +25,6 @@ from app.Schemas.user_supabase import UserSupabaseRead
 from app.Schemas.role import RoleRead
 from app.Schemas.supabase_session import SupabaseLoginResponse, SupabaseRegisterResponse, SupabaseLogoutResponse, SupabaseLoginMfaChallenge
 
-# Repo per diagnostica ruoli
-from app.Repositories.user_supabase_role_repository import UserSupabaseRoleRepository
 
 # ──────────────────────────────────────────────────────────────────────────────
 # Istanze controller (stateless)
@@ -66,12 +64,9 @@ async def who_am_i(claims=Depends(get_current_claims)):
 @router_auth.get("/me/roles", tags=["Auth"])
 async def my_roles(
     claims=Depends(get_current_claims),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_db, scope="function"),
 ):
-    repo = UserSupabaseRoleRepository(db)
-    user_id = UUID(claims["sub"])
-    roles_list = await repo.list_user_supabase_roles(user_id)
-    return {"roles": [r.name for r in roles_list]}
+    return {"roles": sorted(await resolve_roles(claims, db))}
 
 # ──────────────────────────────────────────────────────────────────────────────
 # 🔐 MFA (Multi-Factor Authentication)
@@ -194,29 +189,98 @@ router.include_router(hole_library_router, prefix="/api/v1")
 # ──────────────────────────────────────────────────────────────────────────────
 # 📦 ORDERS (protetto: utenti autenticati)
 # ──────────────────────────────────────────────────────────────────────────────
-from app.Schemas.order import OrderRead
-from fastapi import UploadFile, File
+from app.Schemas.order import OrderRead, OrderPreview, ParserOverrides, OrderSummaryPage
+from fastapi import UploadFile, File, Body, Path, Query, Request, Header
+from app.Core.uploads import PDF_UPLOAD_OPENAPI
+from app.Core.pagination import MAX_PAGE_SIZE
+from datetime import datetime
 
 router_orders = APIRouter(
     prefix="/api/v1/orders",
     tags=["Orders"],
 )
 
+# `fields` (es. code,polygons.dxf_path) e `include` (polygons, polygons.holes) limitano
+# colonne e relazioni lette e restituite; senza parametri si ottiene l'albero completo.
+# Il controller restituisce JSON già serializzato (orjson): response_model documenta la
+# forma senza `fields`, verificata da tests/test_order_selection.py
 @router_orders.get("/", response_model=List[OrderRead])
-async def list_orders(db: AsyncSession = Depends(get_db)):
-    return await orders.list_orders(db)
+async def list_orders(
+    fields: str | None = Query(default=None),
+    include: str | None = Query(default=None),
+    if_none_match: str | None = Header(default=None),
+):
+    return await orders.list_orders(fields, include, if_none_match)
+
+# Elenco paginato e leggero (senza pezzi e fori): l'albero completo si ottiene da GET /{order_id}
+@router_orders.get("/summary", response_model=OrderSummaryPage)
+async def list_order_summaries(
+    limit: int = Query(default=50, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = Query(default=None),
+    client_id: UUID | None = Query(default=None),
+    user_id: UUID | None = Query(default=None),
+    created_from: datetime | None = Query(default=None),
+    created_to: datetime | None = Query(default=None),
+    if_none_match: str | None = Header(default=None),
+):
+    return await orders.list_order_summaries(
+        limit, cursor, client_id, user_id, created_from, created_to, if_none_match
+    )
 
-@router_orders.post("/import", response_model=OrderRead)
+# Il body multipart è letto in streaming dal controller (niente spooling di Starlette)
+@router_orders.post("/import", response_model=OrderRead | OrderPreview, openapi_extra=PDF_UPLOAD_OPENAPI)
 async def import_pdf(
-    db: AsyncSession = Depends(get_db),
-    file: UploadFile = File(...),
+    request: Request,
+    db: AsyncSession = Depends(get_db, scope="function"),
+    dry_run: bool = Query(default=False),
     claims=Depends(get_optional_claims)
 ):
-    return await orders.import_pdf(db, file, claims)
+    return await orders.import_pdf(db, request, claims, dry_run=dry_run)
 
 @router_orders.get("/{order_id}", response_model=OrderRead)
-async def get_order(order_id: UUID, db: AsyncSession = Depends(get_db)):
-    return await orders.get_order(order_id, db)
+async def get_order(
+    order_id: UUID,
+    fields: str | None = Query(default=None),
+    include: str | None = Query(default=None),
+    if_none_match: str | None = Header(default=None),
+):
+    # Nessuna sessione DB come dependency: viene aperta solo se la risposta non è in cache
+    return await orders.get_order(order_id, fields, include, if_none_match)
+
+# ZIP generato in streaming con tutti i DXF dell'ordine (e le anteprime con previews=true)
+@router_orders.get("/{order_id}/bundle.zip")
+async def download_bundle(
+    order_id: UUID,
+    previews: bool = Query(default=False),
+    db: AsyncSession = Depends(get_read_db, scope="function"),
+):
+    return await orders.download_bundle(order_id, db, previews)
+
+# DXF unico con tutti i pezzi affiancati, opzionalmente filtrato per materiale e spessore
+@router_orders.get("/{order_id}/merged.dxf")
+async def download_merged_dxf(
+    order_id: UUID,
+    material: str | None = Query(default=None),
+    thickness_mm: float | None = Query(default=None),
+    db: AsyncSession = Depends(get_read_db, scope="function"),
+):
+    return await orders.download_merged_dxf(order_id, db, material, thickness_mm)
+
+@router_orders.post("/import/batch")
+async def import_batch(
+    files: List[UploadFile] = File(...),
+    claims=Depends(get_optional_claims)
+):
+    return await orders.import_batch(files, claims)
+
+@router_orders.post("/{order_id}/pages/{page_number}/reprocess", response_model=OrderRead)
+async def reprocess_page(
+    order_id: UUID,
+    page_number: int = Path(..., ge=1),
+    overrides: ParserOverrides | None = Body(default=None),
+    db: AsyncSession = Depends(get_db, scope="function"),
+):
+    return await orders.reprocess_page(order_id, page_number, db, overrides)
 
 router.include_router(router_orders)
 
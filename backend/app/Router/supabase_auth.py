@@ -1,13 +1,16 @@
 # app/Router/supabase_auth.py
 from __future__ import annotations
 
+from typing import FrozenSet, Optional
 from uuid import UUID
 from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.Core.config import settings
+from app.Core.role_cache import normalize_role
 from app.Infrastructure.db_supabase import get_db
-from app.Services.supabase_jwt_service import get_jwks, validate_token_local
+from app.Services.supabase_jwt_service import verify_token
 from app.Repositories.user_supabase_role_repository import UserSupabaseRoleRepository
 
 bearer = HTTPBearer(auto_error=True)
@@ -22,10 +25,7 @@ async def get_current_claims(
     evitare chiamate di rete lente a Supabase.
     Ritorna il payload del token decodificato.
     """
-    token = creds.credentials
-    jwks = await get_jwks()
-    payload = validate_token_local(token, jwks)
-    return payload
+    return await verify_token(creds.credentials)
 
 
 async def get_optional_claims(
@@ -38,36 +38,62 @@ async def get_optional_claims(
     if not creds:
         return None
     try:
-        token = creds.credentials
-        jwks = await get_jwks()
-        payload = validate_token_local(token, jwks)
-        return payload
+        return await verify_token(creds.credentials)
     except Exception:
         return None
 
 
+def roles_from_claims(claims: dict) -> Optional[FrozenSet[str]]:
+    """
+    Ruoli inclusi nel token come claim personalizzato (in radice o in app_metadata),
+    solo se AUTH_TRUST_JWT_ROLES è attivo. None se non disponibili.
+    """
+    if not settings.AUTH_TRUST_JWT_ROLES:
+        return None
+    value = claims.get(settings.AUTH_ROLES_CLAIM)
+    if value is None:
+        value = (claims.get("app_metadata") or {}).get(settings.AUTH_ROLES_CLAIM)
+    if isinstance(value, str):
+        value = value.split(",")
+    if not isinstance(value, list):
+        return None
+    return frozenset(str(v).strip() for v in value if str(v).strip())
+
+
+async def resolve_roles(claims: dict, db: AsyncSession) -> FrozenSet[str]:
+    """
+    Ruoli dell'utente del token: dal claim se attendibile, altrimenti dalla cache
+    o con una sola query. Con la cache valida la sessione non apre alcuna connessione.
+    """
+    user_id_str = claims.get("sub")
+    if not user_id_str:
+        raise HTTPException(status_code=401, detail="Token senza sub")
+
+    try:
+        user_uuid = UUID(user_id_str)
+    except Exception:
+        raise HTTPException(status_code=401, detail="sub non è un UUID valido")
+
+    roles = roles_from_claims(claims)
+    if roles is None:
+        roles = await UserSupabaseRoleRepository(db).get_role_names(user_uuid)
+    return roles
+
+
 def require_roles(roles: list[str]):
     """
     Dipendenza che conferma che l'utente autenticato abbia ALMENO uno dei ruoli richiesti.
     I ruoli sono nella tua tabella 'public.roles' via tabella ponte 'public.user_supabase_roles'.
     """
+    wanted = {normalize_role(r) for r in roles}
+
     async def dep(
         claims=Depends(get_current_claims),
-        db: AsyncSession = Depends(get_db),
+        db: AsyncSession = Depends(get_db, scope="function"),
     ):
-        user_id_str = claims.get("sub")
-        if not user_id_str:
-            raise HTTPException(status_code=401, detail="Token senza sub")
-
-        try:
-            user_uuid = UUID(user_id_str)
-        except Exception:
-            raise HTTPException(status_code=401, detail="sub non è un UUID valido")
-
-        repo = UserSupabaseRoleRepository(db)
-        for r in roles:
-            if await repo.user_has_role(user_uuid, r):
-                return claims
+        user_roles = await resolve_roles(claims, db)
+        if wanted & {normalize_role(r) for r in user_roles}:
+            return claims
 
         raise HTTPException(status_code=403, detail="Ruolo non autorizzato")
     return dep
@@ -1,8 +1,8 @@
 # app/Schemas/order.py
 
 from __future__ import annotations
-from typing import List, Optional
-from pydantic import BaseModel, ConfigDict
+from typing import List, Optional, Tuple
+from pydantic import BaseModel, ConfigDict, Field
 from uuid import UUID
 from datetime import datetime
 
@@ -22,6 +22,7 @@ class HoleRead(HoleBase):
 
 class PolygonBase(BaseModel):
     label: Optional[str] = None
+    page_number: Optional[int] = None
     width_mm: float
     height_mm: float
     dxf_path: Optional[str] = None
@@ -41,9 +42,60 @@ class OrderBase(BaseModel):
     code: str
     client_id: Optional[UUID] = None
 
-class OrderRead(OrderBase):
+class OrderAggregates(BaseModel):
+    piece_count: int = 0
+    hole_count: int = 0
+    total_area_m2: float = 0.0
+    total_cut_length_m: float = 0.0
+    materials: List[str] = []
+
+class OrderRead(OrderBase, OrderAggregates):
     id: UUID
     user_id: Optional[UUID] = None
     created_at: datetime
     polygons: List[PolygonRead] = []
     model_config = ConfigDict(from_attributes=True)
+
+class OrderSummary(OrderAggregates):
+    """Riga leggera per gli elenchi: nessun pezzo né foro, solo aggregati e una miniatura."""
+    id: UUID
+    code: str
+    client_id: Optional[UUID] = None
+    client_name: Optional[str] = None
+    user_id: Optional[UUID] = None
+    created_at: datetime
+    thumbnail_path: Optional[str] = None
+    model_config = ConfigDict(from_attributes=True)
+
+class OrderSummaryPage(BaseModel):
+    items: List[OrderSummary] = []
+    # Da passare come `cursor` per la pagina successiva; None se non ci sono altri ordini
+    next_cursor: Optional[str] = None
+
+
+class PiecePreview(BaseModel):
+    """Geometria di un pezzo calcolata in dry-run (nessun file né riga a DB)."""
+    label: Optional[str] = None
+    page_number: Optional[int] = None
+    width_mm: float
+    height_mm: float
+    material: Optional[str] = None
+    thickness_mm: Optional[float] = None
+    is_mirrored: bool = False
+    is_machining: bool = False
+    outer_coords: List[Tuple[float, float]] = []
+    holes: List[HoleBase] = []
+
+class OrderPreview(BaseModel):
+    code: str
+    dry_run: bool = True
+    pieces: List[PiecePreview] = []
+
+class ParserOverrides(BaseModel):
+    """Parametri del parser sovrascrivibili per una singola rielaborazione."""
+    min_edge_len: Optional[float] = Field(default=None, gt=0)
+    snap_tol: Optional[float] = Field(default=None, ge=0)
+    page_border_margin: Optional[float] = Field(default=None, ge=0)
+    max_page_fill_frac: Optional[float] = Field(default=None, gt=0, le=1)
+    min_hole_area_frac: Optional[float] = Field(default=None, ge=0, le=1)
+    max_hole_area_frac: Optional[float] = Field(default=None, gt=0, le=1)
@@ -0,0 +1,208 @@
+# app/Services/merged_dxf_service.py
+
+from __future__ import annotations
+
+import io
+import re
+from itertools import groupby
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import ezdxf
+from ezdxf.document import Drawing
+from ezdxf.layouts import BlockLayout
+from ezdxf.lldxf.tagwriter import TagWriter
+
+# Colonne lette dal DB per comporre il DXF unico: solo geometria salvata, nessun file letto
+PIECE_FIELDS = (
+    "label", "page_number", "is_mirrored", "width_mm", "height_mm",
+    "material", "thickness_mm", "outer_coords",
+)
+HOLE_FIELDS = ("x_mm", "y_mm", "width_mm", "height_mm", "diameter_mm")
+
+# Distanza tra pezzi affiancati e tra le righe di materiali diversi
+GAP_MM = 100.0
+TEXT_HEIGHT_MM = 40.0
+
+_CHUNK = 64 * 1024
+# Caratteri non ammessi nei nomi di layer e blocchi DXF
+_INVALID_NAME = re.compile(r"[<>/\\\":;?*|=',\s]+")
+
+GroupKey = Tuple[Optional[str], Optional[float]]
+
+
+def group_key(piece: Dict[str, Any]) -> GroupKey:
+    return piece.get("material"), piece.get("thickness_mm")
+
+
+def group_name(key: GroupKey) -> str:
+    """Nome leggibile e valido come layer DXF, es. `QUARZO_20MM`."""
+    material, thickness = key
+    parts = [material or "SENZA_MATERIALE"]
+    if thickness is not None:
+        parts.append(f"{thickness:g}MM")
+    return _INVALID_NAME.sub("_", "_".join(parts)).upper()
+
+
+def filter_pieces(
+    pieces: Iterable[Dict[str, Any]],
+    material: Optional[str] = None,
+    thickness_mm: Optional[float] = None,
+) -> List[Dict[str, Any]]:
+    return [
+        p for p in pieces
+        if (material is None or p.get("material") == material)
+        and (thickness_mm is None or p.get("thickness_mm") == thickness_mm)
+    ]
+
+
+def split_by_group(pieces: Iterable[Dict[str, Any]]) -> Dict[GroupKey, List[Dict[str, Any]]]:
+    """Pezzi raggruppati per materiale e spessore, nell'ordine in cui compaiono."""
+    groups: Dict[GroupKey, List[Dict[str, Any]]] = {}
+    for piece in pieces:
+        groups.setdefault(group_key(piece), []).append(piece)
+    return groups
+
+
+def _outline(piece: Dict[str, Any]) -> List[Tuple[float, float]]:
+    """
+    Contorno del pezzo in mm senza il punto di chiusura. Per i pezzi importati prima
+    che il contorno venisse salvato si usa il rettangolo width x height.
+    """
+    coords = [tuple(pt) for pt in piece.get("outer_coords") or []]
+    if len(coords) >= 4 and coords[0] == coords[-1]:
+        coords = coords[:-1]
+    if len(coords) >= 3:
+        return coords
+    w, h = piece["width_mm"], piece["height_mm"]
+    return [(0.0, 0.0), (w, 0.0), (w, h), (0.0, h)]
+
+
+def _block_name(piece: Dict[str, Any], index: int) -> str:
+    page = piece.get("page_number")
+    name = f"PEZZO_{page if page is not None else index}"
+    if piece.get("is_mirrored"):
+        name += "_SPECCHIATO"
+    return name
+
+
+def _layout(pieces: Sequence[Dict[str, Any]], title: Optional[str]) -> Tuple[Drawing, List[Tuple[BlockLayout, Dict[str, Any]]]]:
+    """
+    Documento con layer, blocchi vuoti, inserimenti ed etichette: tutto tranne la
+    geometria dei pezzi, che viene aggiunta ai blocchi restituiti.
+    """
+    doc = ezdxf.new("R2010")
+    doc.units = ezdxf.units.MM
+    for layer in ("PERIMETRO", "LAVORAZIONE", "ETICHETTE"):
+        doc.layers.add(layer)
+    msp = doc.modelspace()
+
+    blocks: List[Tuple[BlockLayout, Dict[str, Any]]] = []
+    y = 0.0
+    used: Dict[str, int] = {}
+    index = 0
+    for key, group in groupby(sorted(pieces, key=_sort_key), key=group_key):
+        group = list(group)
+        layer = group_name(key)
+        doc.layers.add(layer)
+        row_height = max(p["height_mm"] for p in group)
+        msp.add_text(
+            f"{title} - {layer}" if title else layer,
+            height=TEXT_HEIGHT_MM,
+            dxfattribs={"layer": "ETICHETTE", "insert": (0.0, y + row_height + TEXT_HEIGHT_MM)},
+        )
+
+        x = 0.0
+        for piece in group:
+            index += 1
+            name = _block_name(piece, index)
+            # Nomi dei blocchi univoci anche con pagine ripetute
+            used[name] = used.get(name, 0) + 1
+            if used[name] > 1:
+                name = f"{name}_{used[name]}"
+
+            blocks.append((doc.blocks.new(name=name), piece))
+            msp.add_blockref(name, (x, y), dxfattribs={"layer": layer})
+            msp.add_text(
+                piece.get("label") or name,
+                height=TEXT_HEIGHT_MM / 2,
+                dxfattribs={"layer": "ETICHETTE", "insert": (x, y - TEXT_HEIGHT_MM)},
+            )
+            x += piece["width_mm"] + GAP_MM
+
+        y -= row_height + GAP_MM + 2 * TEXT_HEIGHT_MM
+
+    return doc, blocks
+
+
+def _add_geometry(block: BlockLayout, piece: Dict[str, Any]) -> None:
+    """Contorno su PERIMETRO e fori su LAVORAZIONE, come nei DXF singoli."""
+    block.add_lwpolyline(_outline(piece), close=True, dxfattribs={"layer": "PERIMETRO"})
+    for h in piece.get("holes") or []:
+        if h.get("diameter_mm"):
+            block.add_circle((h["x_mm"], h["y_mm"]), h["diameter_mm"] / 2, dxfattribs={"layer": "LAVORAZIONE"})
+        else:
+            block.add_lwpolyline([
+                (h["x_mm"], h["y_mm"]),
+                (h["x_mm"] + h["width_mm"], h["y_mm"]),
+                (h["x_mm"] + h["width_mm"], h["y_mm"] + h["height_mm"]),
+                (h["x_mm"], h["y_mm"] + h["height_mm"]),
+            ], close=True, dxfattribs={"layer": "LAVORAZIONE"})
+
+
+def build_merged_dxf(pieces: Sequence[Dict[str, Any]], title: Optional[str] = None) -> Drawing:
+    """
+    Un unico DXF con tutti i pezzi affiancati: ogni pezzo è un blocco (contorno su
+    PERIMETRO, fori su LAVORAZIONE, come nei DXF singoli) inserito su un layer per
+    materiale e spessore. Ogni gruppo occupa una riga, i pezzi sono separati da GAP_MM.
+    """
+    doc, blocks = _layout(pieces, title)
+    for block, piece in blocks:
+        _add_geometry(block, piece)
+    return doc
+
+
+def _sort_key(piece: Dict[str, Any]):
+    material, thickness = group_key(piece)
+    return (material or "", thickness or 0.0, piece.get("page_number") or 0, bool(piece.get("is_mirrored")))
+
+
+def iter_merged_dxf(pieces: Sequence[Dict[str, Any]], title: Optional[str] = None) -> Iterator[bytes]:
+    """
+    Stesso DXF di build_merged_dxf, per StreamingResponse, generato un pezzo alla volta.
+    Si scrive prima lo scheletro (tabelle, blocchi vuoti, inserimenti: pochi byte per
+    pezzo); la geometria di ogni blocco viene creata, scritta al posto della sua
+    chiusura (ENDBLK) e subito eliminata, quindi in memoria c'è un solo pezzo per volta.
+    La generazione avviene durante l'iterazione, quindi nel threadpool e non nell'event loop.
+    """
+    doc, blocks = _layout(pieces, title)
+
+    # Gli handle della geometria sono riservati prima di scrivere lo scheletro,
+    # così $HANDSEED nell'header è già oltre l'ultimo handle usato
+    handles = doc.entitydb.handles
+    first = int(str(handles), 16)
+    seed = first + sum(1 + len(piece.get("holes") or []) for _, piece in blocks)
+    handles.reset("%X" % seed)
+
+    skeleton = io.StringIO()
+    doc.write(skeleton)
+    text = skeleton.getvalue()
+    del skeleton
+
+    handles.reset("%X" % first)
+    pos = 0
+    for block, piece in blocks:
+        # Con handle abilitati ezdxf scrive sempre il codice 5 subito dopo il tipo
+        end = text.index(f"  0\nENDBLK\n  5\n{block.endblk.dxf.handle}\n", pos)
+        yield text[pos:end].encode("utf-8")
+        pos = end
+
+        _add_geometry(block, piece)
+        out = io.StringIO()
+        writer = TagWriter(out, write_handles=True, dxfversion=doc.dxfversion)
+        for entity in list(block):
+            entity.export_dxf(writer)
+            block.delete_entity(entity)
+        yield out.getvalue().encode("utf-8")
+
+    for start in range(pos, len(text), _CHUNK):
+        yield text[start:start + _CHUNK].encode("utf-8")
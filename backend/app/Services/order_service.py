@@ -0,0 +1,310 @@
+# app/Services/order_service.py
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+from uuid import UUID
+
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.Core.response_cache import order_cache
+from app.Models.client import Client
+from app.Models.order import Order
+from app.Models.polygon import Polygon
+from app.Repositories.order_repository import OrderRepository, build_piece_rows
+from app.Schemas.order import OrderRead, PolygonRead
+from app.Services.pdf_processing_service import PDFProcessingService
+from app.Services.parsers.base_parser import piece_metrics
+
+ARTIFACT_FIELDS = ("dxf_path", "preview_path", "technical_preview_path")
+
+
+@dataclass
+class PiecesDiff:
+    """Esito del confronto tra i pezzi a DB e quelli appena estratti dal PDF."""
+    to_insert: List[Dict[str, Any]] = field(default_factory=list)
+    to_update: List[Tuple[Polygon, Dict[str, Any]]] = field(default_factory=list)
+    to_delete: List[Polygon] = field(default_factory=list)
+    unchanged: List[Polygon] = field(default_factory=list)
+
+
+def piece_key(page_number: Optional[int], is_mirrored: Optional[bool]) -> Tuple[Optional[int], bool]:
+    """Identità di un pezzo all'interno di un ordine: pagina di origine + specchiatura."""
+    return page_number, bool(is_mirrored)
+
+
+def diff_pieces(
+    existing: Sequence[Polygon],
+    incoming: List[Dict[str, Any]],
+    reusable: Optional[Set[str]] = None,
+) -> PiecesDiff:
+    """
+    Confronta i pezzi esistenti con quelli nuovi usando chiave e impronta.
+    I pezzi senza pagina (import precedenti) e i duplicati vengono eliminati.
+    Con `reusable` (le impronte passate al parser) un pezzo resta invariato solo se
+    il parser non ne ha rigenerato gli artefatti: altrimenti i nuovi nomi dei file
+    vanno salvati e il pezzo finisce tra gli aggiornati.
+    """
+    diff = PiecesDiff()
+    by_key: Dict[Tuple[Optional[int], bool], Polygon] = {}
+    for poly in existing:
+        key = piece_key(poly.page_number, poly.is_mirrored)
+        if poly.page_number is None or key in by_key:
+            diff.to_delete.append(poly)
+        else:
+            by_key[key] = poly
+
+    for piece in incoming:
+        old = by_key.pop(piece_key(piece.get("page_number"), piece.get("is_mirrored")), None)
+        if old is None:
+            diff.to_insert.append(piece)
+        elif (
+            old.fingerprint and old.fingerprint == piece.get("fingerprint")
+            and (reusable is None or old.fingerprint in reusable)
+        ):
+            diff.unchanged.append(old)
+        else:
+            diff.to_update.append((old, piece))
+
+    diff.to_delete.extend(by_key.values())
+    return diff
+
+
+def order_aggregates(
+    piece_count: int,
+    hole_count: int,
+    area_mm2: float,
+    cut_length_mm: float,
+    materials: Sequence[Optional[str]],
+) -> Dict[str, Any]:
+    """Valori delle colonne aggregate di `orders` a partire dai totali sui pezzi."""
+    return {
+        "piece_count": piece_count,
+        "hole_count": hole_count,
+        "total_area_m2": round(area_mm2 / 1_000_000, 4),
+        "total_cut_length_m": round(cut_length_mm / 1000, 3),
+        "materials": sorted({m for m in materials if m}),
+    }
+
+
+class OrderService:
+    """
+    Orchestra import e rielaborazione degli ordini: parsing del PDF, confronto
+    con i pezzi già salvati e pubblicazione degli artefatti.
+    """
+
+    def __init__(self, db: AsyncSession, pdf_svc: PDFProcessingService) -> None:
+        self.db = db
+        self.pdf_svc = pdf_svc
+        self.orders = OrderRepository(db)
+
+    async def import_pdf(
+        self,
+        import_path: Path,
+        order_code: str,
+        user_id: Optional[UUID] = None,
+        source_sha256: Optional[str] = None,
+    ) -> OrderRead:
+        """
+        Importa (o reimporta) un PDF. Sui reimport vengono toccati solo i pezzi
+        cambiati e gli artefatti dei pezzi invariati non vengono rigenerati;
+        se il file è identico all'ultimo importato (stesso SHA-256) e gli artefatti
+        sono ancora presenti, il parsing viene saltato del tutto.
+        La risposta è costruita dai dati in memoria, senza rileggere l'ordine.
+        """
+        order = await self.orders.get_by_code(order_code)
+        existing = await self.orders.list_pieces(order.id, with_holes=True) if order else []
+
+        if (
+            order and existing and source_sha256 and order.source_sha256 == source_sha256
+            and all(self.pdf_svc.has_artifacts(getattr(p, f) for f in ARTIFACT_FIELDS) for p in existing)
+        ):
+            return self._order_read(order, [PolygonRead.model_validate(p) for p in existing])
+
+        reusable = self._reusable_fingerprints(existing)
+        staging_dir = self.pdf_svc.create_staging_dir()
+        try:
+            results = await self.pdf_svc.aprocess_pdf(
+                import_path,
+                order_code,
+                outputs_dir=staging_dir,
+                known_fingerprints=reusable,
+            )
+            if not results:
+                raise HTTPException(status_code=400, detail="Nessuna quota valida trovata nel PDF")
+
+            # `results` contiene tutti i pezzi dell'ordine: gli aggregati si calcolano in memoria
+            self._measure(results)
+            aggregates = order_aggregates(
+                len(results),
+                sum(len(res["holes"]) for res in results),
+                sum(res["area_mm2"] for res in results),
+                sum(res["cut_length_mm"] for res in results),
+                [res.get("material") for res in results],
+            )
+            if not order:
+                # Default client for now: Veneta Cucine
+                res_client = await self.db.execute(select(Client.id).where(Client.code == "VENETA_CUCINE"))
+                order = Order(code=order_code, user_id=user_id, client_id=res_client.scalar_one_or_none())
+                self._set_aggregates(order, aggregates)
+                order.source_sha256 = source_sha256
+                self.db.add(order)
+                await self.db.flush()
+            else:
+                self._set_aggregates(order, aggregates)
+                if source_sha256:
+                    order.source_sha256 = source_sha256
+
+            diff, written, stale = await self._apply_diff(order, existing, results, reusable)
+            await self.db.commit()
+        except Exception:
+            self.pdf_svc.discard_staging(staging_dir)
+            await self.db.rollback()
+            raise
+
+        self._publish(staging_dir, stale)
+        order_cache.invalidate(str(order.id))
+
+        unchanged = {piece_key(p.page_number, p.is_mirrored): p for p in diff.unchanged}
+        polygons = [
+            PolygonRead.model_validate({**rows[0], "holes": rows[1]}) if rows is not None
+            else PolygonRead.model_validate(unchanged[piece_key(piece.get("page_number"), piece.get("is_mirrored"))])
+            for piece, rows in zip(results, written)
+        ]
+        return self._order_read(order, polygons)
+
+    async def reprocess_page(
+        self,
+        order_id: UUID,
+        page_number: int,
+        overrides: Optional[Dict[str, Any]] = None,
+    ) -> Order:
+        """
+        Rielabora una sola pagina del PDF di import già salvato e sostituisce
+        in modo atomico i pezzi (e i fori) generati da quella pagina.
+        """
+        order = await self.db.get(Order, order_id)
+        if not order:
+            raise HTTPException(status_code=404, detail="Ordine non trovato")
+
+        import_path = self.pdf_svc.find_import_file(order.code)
+        if not import_path:
+            raise HTTPException(status_code=404, detail="File di import non trovato per l'ordine")
+
+        existing = await self.orders.list_page_pieces(order, page_number)
+
+        # Gli artefatti vengono scritti in staging e promossi solo dopo il commit,
+        # così un errore non lascia DXF/PNG incoerenti con il DB.
+        reusable = self._reusable_fingerprints(existing)
+        staging_dir = self.pdf_svc.create_staging_dir()
+        try:
+            results = await self.pdf_svc.aprocess_pdf(
+                import_path,
+                order.code,
+                pages=[page_number],
+                overrides=overrides,
+                outputs_dir=staging_dir,
+                known_fingerprints=reusable,
+            )
+            if not results:
+                raise HTTPException(status_code=400, detail="Nessuna quota valida trovata nella pagina")
+
+            self._measure(results)
+            _, _, stale = await self._apply_diff(order, existing, results, reusable)
+            # Solo una pagina è in memoria: i totali dell'ordine si ricalcolano a DB
+            self._set_aggregates(order, order_aggregates(**await self.orders.sum_pieces(order.id)))
+            await self.db.commit()
+        except Exception:
+            self.pdf_svc.discard_staging(staging_dir)
+            await self.db.rollback()
+            raise
+
+        self._publish(staging_dir, stale)
+        order_cache.invalidate(str(order.id))
+        return order
+
+    @staticmethod
+    def _order_read(order: Order, polygons: List[PolygonRead]) -> OrderRead:
+        return OrderRead(
+            id=order.id,
+            code=order.code,
+            client_id=order.client_id,
+            user_id=order.user_id,
+            created_at=order.created_at,
+            piece_count=order.piece_count,
+            hole_count=order.hole_count,
+            total_area_m2=order.total_area_m2,
+            total_cut_length_m=order.total_cut_length_m,
+            materials=order.materials,
+            polygons=polygons,
+        )
+
+    @staticmethod
+    def _measure(results: List[Dict[str, Any]]) -> None:
+        # Superficie e lunghezza di taglio restano salvate sul pezzo, così i totali
+        # dell'ordine si possono ricalcolare anche senza la geometria completa
+        for res in results:
+            res.update(piece_metrics(res))
+
+    @staticmethod
+    def _set_aggregates(order: Order, values: Dict[str, Any]) -> None:
+        for key, value in values.items():
+            setattr(order, key, value)
+
+    def _reusable_fingerprints(self, existing: Sequence[Polygon]) -> Set[str]:
+        # Un pezzo invariato può saltare la rigenerazione solo se i suoi file esistono ancora
+        return {
+            p.fingerprint for p in existing
+            if p.fingerprint and self.pdf_svc.has_artifacts(getattr(p, f) for f in ARTIFACT_FIELDS)
+        }
+
+    async def _apply_diff(
+        self,
+        order: Order,
+        existing: Sequence[Polygon],
+        results: List[Dict[str, Any]],
+        reusable: Set[str],
+    ) -> Tuple[PiecesDiff, List[Optional[Tuple[Dict[str, Any], List[Dict[str, Any]]]]], Set[str]]:
+        """
+        Applica al DB le differenze tra pezzi esistenti e nuovi (senza commit) con un
+        numero costante di statement, indipendente dal numero di pezzi.
+        Ritorna il diff, le righe scritte (allineate a `results`, None per i pezzi
+        invariati) e i nomi degli artefatti non più referenziati.
+        """
+        diff = diff_pieces(existing, results, reusable)
+
+        old_files = {
+            getattr(p, f) for p in [*diff.to_delete, *(poly for poly, _ in diff.to_update)]
+            for f in ARTIFACT_FIELDS if getattr(p, f)
+        }
+        new_files = {res[f] for res in results for f in ARTIFACT_FIELDS if res.get(f)}
+
+        inserted = build_piece_rows(order.id, diff.to_insert)
+        updated = build_piece_rows(
+            order.id,
+            [piece for _, piece in diff.to_update],
+            polygon_ids=[poly.id for poly, _ in diff.to_update],
+        )
+
+        await self.orders.delete_pieces([p.id for p in diff.to_delete])
+        await self.orders.delete_holes([poly.id for poly, _ in diff.to_update])
+        await self.orders.insert_polygons([row for row, _ in inserted])
+        await self.orders.update_polygons([row for row, _ in updated])
+        await self.orders.insert_holes([h for _, holes in (*inserted, *updated) for h in holes])
+
+        written_by_piece = {
+            id(piece): rows
+            for piece, rows in zip(
+                [*diff.to_insert, *(piece for _, piece in diff.to_update)],
+                [*inserted, *updated],
+            )
+        }
+        return diff, [written_by_piece.get(id(piece)) for piece in results], old_files - new_files
+
+    def _publish(self, staging_dir: Path, stale: Set[str]) -> None:
+        self.pdf_svc.promote_artifacts(staging_dir)
+        self.pdf_svc.remove_artifacts(stale)
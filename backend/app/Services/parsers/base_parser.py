@@ -1,17 +1,88 @@
 # app/Services/parsers/base_parser.py
 
+import json
+import math
+import hashlib
 from abc import ABC, abstractmethod
 from pathlib import Path
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, Iterable, Set, Union, BinaryIO
 import pdfplumber
 from shapely.geometry import Polygon as ShapelyPolygon
 
+# Campi del pezzo che concorrono all'impronta (tutto ciò che finisce a DB o negli artefatti)
+_FINGERPRINT_FIELDS = (
+    "label", "page_number", "width_mm", "height_mm", "material", "thickness_mm",
+    "is_mirrored", "is_machining",
+)
+_HOLE_FIELDS = ("type", "x_mm", "y_mm", "width_mm", "height_mm", "diameter_mm", "depth_mm")
+
+
+def _round(value: Any) -> Any:
+    return round(float(value), 2) if isinstance(value, (int, float)) and not isinstance(value, bool) else value
+
+
+def piece_fingerprint(piece: Dict[str, Any]) -> str:
+    """
+    Impronta SHA-256 di geometria e metadati di un pezzo, con coordinate arrotondate
+    al centesimo di mm per essere stabile tra un import e l'altro.
+    """
+    holes = [[_round(h.get(k)) for k in _HOLE_FIELDS] for h in piece.get("holes", [])]
+    canonical = {
+        "fields": [_round(piece.get(k)) for k in _FINGERPRINT_FIELDS],
+        "outer": [[_round(x), _round(y)] for x, y in piece.get("outer_coords", [])],
+        "holes": sorted(holes, key=lambda h: json.dumps(h)),
+    }
+    payload = json.dumps(canonical, separators=(",", ":"), sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def piece_metrics(piece: Dict[str, Any]) -> Dict[str, float]:
+    """
+    Superficie netta (mm²) e lunghezza di taglio (mm) di un pezzo: contorno esterno
+    più i fori passanti. I fori con profondità (es. bussole) non sono tagli né
+    riducono la superficie. Senza contorno si usa il rettangolo width x height.
+    """
+    coords = piece.get("outer_coords") or []
+    if len(coords) >= 3:
+        outer = ShapelyPolygon(coords)
+        area, length = abs(outer.area), outer.exterior.length
+    else:
+        w, h = piece.get("width_mm") or 0.0, piece.get("height_mm") or 0.0
+        area, length = w * h, 2 * (w + h)
+
+    for hole in piece.get("holes", []):
+        if hole.get("depth_mm"):
+            continue
+        if hole.get("diameter_mm"):
+            d = hole["diameter_mm"]
+            area -= math.pi * d * d / 4
+            length += math.pi * d
+        elif hole.get("width_mm") and hole.get("height_mm"):
+            area -= hole["width_mm"] * hole["height_mm"]
+            length += 2 * (hole["width_mm"] + hole["height_mm"])
+
+    return {"area_mm2": max(area, 0.0), "cut_length_mm": length}
+
+
 class BaseParser(ABC):
     def __init__(self, outputs_dir: Path):
         self.outputs_dir = outputs_dir
 
     @abstractmethod
-    def parse(self, pdf_path: Path, order_code: str) -> List[Dict[str, Any]]:
+    def parse(
+        self,
+        pdf_path: Union[Path, BinaryIO],
+        order_code: str,
+        pages: Optional[Iterable[int]] = None,
+        known_fingerprints: Optional[Set[str]] = None,
+        render: bool = True,
+    ) -> List[Dict[str, Any]]:
+        """
+        Elabora il PDF (path o file già aperto) e ritorna un dizionario per ogni pezzo trovato.
+        Se `pages` è valorizzato vengono elaborate solo quelle pagine (1-based).
+        I pezzi la cui impronta è in `known_fingerprints` non rigenerano gli artefatti;
+        con `render=False` si calcola solo la geometria, senza scrivere DXF/PNG
+        (i percorsi degli artefatti restano None).
+        """
         pass
 
     @abstractmethod
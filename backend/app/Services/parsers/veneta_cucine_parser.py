@@ -3,13 +3,13 @@
 import re
 import math
 from pathlib import Path
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, Iterable, Set, Union, BinaryIO
 import pdfplumber
 import ezdxf
 from PIL import Image
 from shapely.geometry import LineString, Polygon as ShapelyPolygon, Point as ShapelyPoint
 from shapely.ops import unary_union, polygonize, snap, transform
-from .base_parser import BaseParser
+from .base_parser import BaseParser, piece_fingerprint
 
 class VenetaCucineParser(BaseParser):
     def __init__(self, outputs_dir: Path):
@@ -57,10 +57,24 @@ class VenetaCucineParser(BaseParser):
 
         return metadata
 
-    def parse(self, pdf_path: Path, order_code: str) -> List[Dict[str, Any]]:
+    def parse(
+        self,
+        pdf_path: Union[Path, BinaryIO],
+        order_code: str,
+        pages: Optional[Iterable[int]] = None,
+        known_fingerprints: Optional[Set[str]] = None,
+        render: bool = True,
+    ) -> List[Dict[str, Any]]:
         results = []
-        with pdfplumber.open(str(pdf_path)) as pdf:
-            for pageno, page in enumerate(pdf.pages, start=1):
+        source = pdf_path if hasattr(pdf_path, "read") else str(pdf_path)
+        with pdfplumber.open(source) as pdf:
+            if pages is None:
+                selected = list(enumerate(pdf.pages, start=1))
+            else:
+                # Solo le pagine richieste: le altre non vengono nemmeno lette
+                selected = [(n, pdf.pages[n - 1]) for n in sorted(set(pages)) if 1 <= n <= len(pdf.pages)]
+
+            for pageno, page in selected:
                 text = page.extract_text() or ""
                 meta = self.extract_metadata(text)
 
@@ -83,20 +97,22 @@ class VenetaCucineParser(BaseParser):
 
                 # Create the main piece
                 piece_data = self.build_piece_result(
-                    pageno, order_code, page, outer, holes, meta, is_mirrored=False
+                    pageno, order_code, page, outer, holes, meta, is_mirrored=False,
+                    known_fingerprints=known_fingerprints, render=render,
                 )
                 results.append(piece_data)
 
                 # If Sottotop, create the mirrored piece with template holes
                 if meta["is_sottotop"]:
                     mirrored_piece = self.build_piece_result(
-                        pageno, order_code, page, outer, holes, meta, is_mirrored=True
+                        pageno, order_code, page, outer, holes, meta, is_mirrored=True,
+                        known_fingerprints=known_fingerprints, render=render,
                     )
                     results.append(mirrored_piece)
 
         return results
 
-    def build_piece_result(self, pageno, order_code, page, outer, holes, meta, is_mirrored=False) -> Dict[str, Any]:
+    def build_piece_result(self, pageno, order_code, page, outer, holes, meta, is_mirrored=False, known_fingerprints=None, render=True) -> Dict[str, Any]:
         suffix = "_mirrored" if is_mirrored else ""
         dxf_filename = f"{order_code}_{pageno}{suffix}.dxf"
         preview_filename = f"{order_code}_{pageno}{suffix}.png"
@@ -135,14 +151,11 @@ class VenetaCucineParser(BaseParser):
             template_holes = self.generate_template_holes(holes_data)
             holes_data.extend(template_holes)
 
-        # Generate DXF and PNGs
-        outer_coords = self.write_dxf(self.outputs_dir / dxf_filename, outer, holes_data, meta, is_mirrored)
-        # Note: png preview for mirrored might just be the same or a flip of the original
-        self.save_preview(page, self.outputs_dir / preview_filename, is_mirrored)
-        self.save_technical_preview(self.outputs_dir / tech_preview_filename, outer_coords, holes_data, meta)
+        outer_coords = self.outer_to_mm(outer, meta, is_mirrored)
 
-        return {
+        result = {
             "label": f"Pezzo {pageno}{' (Specchiato)' if is_mirrored else ''}",
+            "page_number": pageno,
             "width_mm": meta["width_mm"],
             "height_mm": meta["height_mm"],
             "material": meta["material"],
@@ -152,8 +165,27 @@ class VenetaCucineParser(BaseParser):
             "dxf_path": dxf_filename,
             "preview_path": preview_filename,
             "technical_preview_path": tech_preview_filename,
+            "outer_coords": outer_coords,
             "holes": holes_data
         }
+        result["fingerprint"] = piece_fingerprint(result)
+
+        # Solo geometria (dry-run): nessun artefatto, quindi nessun percorso da restituire
+        if not render:
+            result.update(dxf_path=None, preview_path=None, technical_preview_path=None)
+            return result
+
+        # Pezzo invariato rispetto all'import precedente: gli artefatti esistono già
+        if known_fingerprints and result["fingerprint"] in known_fingerprints:
+            return result
+
+        # Generate DXF and PNGs
+        self.write_dxf(self.outputs_dir / dxf_filename, outer_coords, holes_data)
+        # Note: png preview for mirrored might just be the same or a flip of the original
+        self.save_preview(page, self.outputs_dir / preview_filename, is_mirrored)
+        self.save_technical_preview(self.outputs_dir / tech_preview_filename, outer_coords, holes_data, meta)
+
+        return result
 
     def generate_template_holes(self, main_holes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         new_holes = []
@@ -224,11 +256,8 @@ class VenetaCucineParser(BaseParser):
         fixed = poly.buffer(0)
         return max(list(fixed.geoms), key=lambda g: g.area) if fixed.geom_type == "MultiPolygon" else fixed
 
-    def write_dxf(self, path: Path, outer: ShapelyPolygon, holes_data: List[Dict[str, Any]], meta: Dict[str, Any], is_mirrored: bool) -> List[Tuple[float, float]]:
-        doc = ezdxf.new("R2010")
-        doc.units = ezdxf.units.MM
-        msp = doc.modelspace()
-
+    def outer_to_mm(self, outer: ShapelyPolygon, meta: Dict[str, Any], is_mirrored: bool) -> List[Tuple[float, float]]:
+        """Converte il contorno dalle coordinate pagina ai millimetri del pezzo."""
         minx, miny, maxx, maxy = outer.bounds
         ow, oh = maxx - minx, maxy - miny
 
@@ -239,7 +268,13 @@ class VenetaCucineParser(BaseParser):
                 tx = meta["width_mm"] - tx
             return float(tx), float(ty)
 
-        outer_coords = [transform_pt(x, y) for x, y in outer.exterior.coords]
+        return [transform_pt(x, y) for x, y in outer.exterior.coords]
+
+    def write_dxf(self, path: Path, outer_coords: List[Tuple[float, float]], holes_data: List[Dict[str, Any]]) -> None:
+        doc = ezdxf.new("R2010")
+        doc.units = ezdxf.units.MM
+        msp = doc.modelspace()
+
         msp.add_lwpolyline(outer_coords[:-1], close=True, dxfattribs={"layer": "PERIMETRO"})
 
         for h in holes_data:
@@ -256,7 +291,6 @@ class VenetaCucineParser(BaseParser):
                 msp.add_lwpolyline(pts, close=True, dxfattribs={"layer": "LAVORAZIONE"})
 
         doc.saveas(str(path))
-        return outer_coords
 
     def save_technical_preview(self, path: Path, outer_coords: List[Tuple[float, float]], holes_data: List[Dict[str, Any]], meta: Dict[str, Any]):
         from PIL import Image, ImageDraw, ImageFont
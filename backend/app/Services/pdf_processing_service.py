@@ -1,12 +1,50 @@
 # app/Services/pdf_processing_service.py
 
 import os
+import copy
+import shutil
+import asyncio
+import zipfile
+import tempfile
+import functools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Container, Iterable, Iterator, Set, Tuple, Union, BinaryIO
 
+from fastapi import HTTPException
+
+from app.Core.config import settings
+from app.Core.uploads import StoredUpload, store_stream
+from app.Core.artifact_files import HASHED_NAME, PRECOMPRESSED_SUFFIXES, rename_to_content_hash, write_gzip_sibling
+from app.Core.zip_stream import stream_zip
 from .parsers.veneta_cucine_parser import VenetaCucineParser
 from .parsers.base_parser import BaseParser
 
+# Pool di processi condiviso per il parsing (CPU-bound): evita di bloccare l'event loop
+# e permette agli import batch di sfruttare tutti i core.
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # "spawn" evita di duplicare nei worker lo stato dell'event loop e le connessioni aperte
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.import_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _executor
+
+
+def shutdown_executor() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
 class PDFProcessingService:
     def __init__(self, imports_dir: str = "imports", outputs_dir: str = "outputs"):
         # Se i path sono relativi, li rendiamo assoluti rispetto alla root del backend
@@ -21,9 +59,179 @@ class PDFProcessingService:
             "VENETA_CUCINE": VenetaCucineParser(self.outputs_dir)
         }
 
-    def process_pdf(self, pdf_path: Path, order_code: str, client_code: str = "VENETA_CUCINE") -> List[Dict[str, Any]]:
+    def process_pdf(
+        self,
+        pdf_path: Union[Path, BinaryIO],
+        order_code: str,
+        client_code: str = "VENETA_CUCINE",
+        pages: Optional[Iterable[int]] = None,
+        overrides: Optional[Dict[str, Any]] = None,
+        outputs_dir: Optional[Path] = None,
+        known_fingerprints: Optional[Set[str]] = None,
+        render: bool = True,
+    ) -> List[Dict[str, Any]]:
         parser = self._parsers.get(client_code)
         if not parser:
             raise ValueError(f"No parser found for client code: {client_code}")
 
-        return parser.parse(pdf_path, order_code)
+        # Overrides e cartella di output alternativa valgono solo per questa chiamata:
+        # lavoriamo su una copia per non toccare il parser condiviso.
+        if overrides or outputs_dir is not None:
+            parser = copy.copy(parser)
+            if outputs_dir is not None:
+                parser.outputs_dir = outputs_dir
+            for key, value in (overrides or {}).items():
+                attr = key.upper()
+                if value is None or not hasattr(parser, attr):
+                    continue
+                setattr(parser, attr, value)
+
+        results = parser.parse(
+            pdf_path, order_code, pages=pages, known_fingerprints=known_fingerprints, render=render
+        )
+        if render:
+            self._content_address(results, parser.outputs_dir, known_fingerprints or set())
+        return results
+
+    @staticmethod
+    def _content_address(results: List[Dict[str, Any]], outputs_dir: Path, skipped: Set[str]) -> None:
+        """
+        Dà agli artefatti appena generati un nome con l'hash del contenuto, così un URL
+        identifica sempre gli stessi byte e può essere messo in cache per sempre.
+        I pezzi invariati (impronta in `skipped`) non hanno generato file e mantengono
+        i nomi già salvati a DB.
+        """
+        for res in results:
+            if res.get("fingerprint") in skipped:
+                continue
+            for key in ("dxf_path", "preview_path", "technical_preview_path"):
+                name = res.get(key)
+                if name and (outputs_dir / name).is_file():
+                    res[key] = rename_to_content_hash(outputs_dir / name)
+                    if res[key].endswith(PRECOMPRESSED_SUFFIXES):
+                        write_gzip_sibling(outputs_dir / res[key])
+
+    async def aprocess_pdf(self, pdf_path: Path, order_code: str, **kwargs: Any) -> List[Dict[str, Any]]:
+        """
+        Come process_pdf, ma eseguito nel pool di processi di parsing.
+        Se un worker muore (memoria esaurita, crash di una libreria nativa) il pool
+        diventa inutilizzabile: viene ricreato e l'elaborazione ritentata una volta.
+        """
+        loop = asyncio.get_running_loop()
+        call = functools.partial(self.process_pdf, pdf_path, order_code, **kwargs)
+        for attempt in range(2):
+            executor = get_executor()
+            try:
+                return await loop.run_in_executor(executor, call)
+            except BrokenProcessPool:
+                # Con import concorrenti il pool può essere già stato ricreato da un'altra richiesta
+                if _executor is executor:
+                    shutdown_executor()
+        raise HTTPException(status_code=500, detail=f"Elaborazione del PDF non riuscita per l'ordine {order_code}")
+
+    def store_upload(self, fileobj: BinaryIO, filename: str) -> StoredUpload:
+        """
+        Salva un PDF caricato nella cartella degli import (solo il nome base del file),
+        calcolandone SHA-256 e dimensione durante la copia.
+        """
+        return store_stream(fileobj, filename, self.imports_dir)
+
+    @staticmethod
+    def _zip_pdfs(zf: zipfile.ZipFile) -> Iterator[Tuple[zipfile.ZipInfo, str]]:
+        """Voci PDF di uno ZIP con il loro nome base (cartelle e file di sistema esclusi)."""
+        for info in zf.infolist():
+            name = Path(info.filename).name
+            if info.is_dir() or not name.lower().endswith(".pdf"):
+                continue
+            if name.startswith(".") or info.filename.startswith("__MACOSX/"):
+                continue
+            yield info, name
+
+    def list_zip_pdfs(self, fileobj: BinaryIO) -> List[str]:
+        """Nomi base dei PDF contenuti in uno ZIP, senza estrarre nulla."""
+        with zipfile.ZipFile(fileobj) as zf:
+            return [name for _, name in self._zip_pdfs(zf)]
+
+    def extract_zip(self, fileobj: BinaryIO, exclude: Container[str] = ()) -> List[StoredUpload]:
+        """
+        Estrae i PDF contenuti in uno ZIP direttamente nella cartella degli import,
+        una voce alla volta e a blocchi (l'archivio non viene mai decompresso in memoria).
+        Le voci il cui nome base è in `exclude` vengono saltate.
+        """
+        uploads: List[StoredUpload] = []
+        with zipfile.ZipFile(fileobj) as zf:
+            for info, name in self._zip_pdfs(zf):
+                if name in exclude:
+                    continue
+                with zf.open(info) as src:
+                    uploads.append(self.store_upload(src, name))
+        return uploads
+
+    def find_import_file(self, order_code: str) -> Optional[Path]:
+        """
+        Ritorna il PDF originale salvato in fase di import per l'ordine, se presente.
+        """
+        candidate = self.imports_dir / f"{order_code}.pdf"
+        if candidate.is_file():
+            return candidate
+        matches = sorted(p for p in self.imports_dir.glob(f"{order_code}.*") if p.is_file())
+        return matches[0] if matches else None
+
+    def create_staging_dir(self) -> Path:
+        """
+        Crea una cartella temporanea accanto agli output (stesso filesystem),
+        così la promozione dei file è un semplice rename atomico.
+        """
+        return Path(tempfile.mkdtemp(prefix=".staging-", dir=self.outputs_dir))
+
+    def promote_artifacts(self, staging_dir: Path) -> None:
+        """
+        Sposta gli artefatti generati in staging nella cartella di output definitiva,
+        sovrascrivendo atomicamente i file con lo stesso nome.
+        """
+        for f in staging_dir.iterdir():
+            if f.is_file():
+                os.replace(f, self.outputs_dir / f.name)
+        self.discard_staging(staging_dir)
+
+    def discard_staging(self, staging_dir: Path) -> None:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+    def has_artifacts(self, filenames: Iterable[Optional[str]]) -> bool:
+        """
+        True se tutti gli artefatti indicati sono presenti negli output.
+        """
+        names = [n for n in filenames if n]
+        return bool(names) and all((self.outputs_dir / Path(n).name).is_file() for n in names)
+
+    def iter_bundle(self, folder: str, pieces: Iterable[Dict[str, Any]], previews: bool = False) -> Iterator[bytes]:
+        """
+        ZIP in streaming con i DXF dei pezzi (e opzionalmente le anteprime PNG).
+        Nell'archivio i file hanno il nome senza hash del contenuto (es. ORD_1.dxf).
+        """
+        fields = ("dxf_path", "preview_path", "technical_preview_path") if previews else ("dxf_path",)
+        entries: List[Tuple[str, Path, bool]] = []
+        seen: Set[str] = set()
+        for piece in pieces:
+            for key in fields:
+                name = piece.get(key)
+                if not name or name in seen:
+                    continue
+                seen.add(name)
+                plain = HASHED_NAME.sub(r"\g<ext>", Path(name).name)
+                arcname = f"{folder}/{plain}" if key == "dxf_path" else f"{folder}/previews/{plain}"
+                # I PNG sono già compressi: salvati come STORED
+                entries.append((arcname, self.outputs_dir / Path(name).name, key == "dxf_path"))
+        return stream_zip(entries)
+
+    def remove_artifacts(self, filenames: Iterable[Optional[str]]) -> None:
+        """
+        Elimina dagli output gli artefatti non più referenziati.
+        """
+        for name in filenames:
+            if not name:
+                continue
+            path = self.outputs_dir / Path(name).name
+            path.unlink(missing_ok=True)
+            # Eventuale copia precompressa (DXF)
+            path.with_name(path.name + ".gz").unlink(missing_ok=True)
@@ -152,10 +152,13 @@ class SupabaseAuthService:
         if delete_res.get("error"):
             return delete_res
 
-        # Recuperiamo lo stato aggiornato dell'utente dopo la rimozione del fattore
-        refreshed_user = await supabase_auth_client.get_user_from_access_token(aal2_token)
-        if not refreshed_user.get("error"):
-            verify_res["user"] = refreshed_user
+        # Stato aggiornato dell'utente senza rileggerlo: è quello restituito dalla
+        # verifica, senza il fattore appena rimosso
+        user = verify_res.get("user") or {k: v for k, v in user_res.items() if k not in ("error", "http_status")}
+        verify_res["user"] = {
+            **user,
+            "factors": [f for f in user.get("factors") or [] if f.get("id") != factor_id],
+        }
 
         return verify_res
 
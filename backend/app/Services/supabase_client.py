@@ -1,19 +1,27 @@
 from __future__ import annotations
-from supabase import create_client, Client
+from supabase import AsyncClient, AsyncClientOptions, acreate_client
 from app.Core.config import settings
+from app.Infrastructure.http_client import get_http_client
 
 # Type alias for clarity in dependency injection
-SupabaseClient = Client
+SupabaseClient = AsyncClient
 
-def get_supabase_client() -> SupabaseClient:
+async def get_supabase_client() -> SupabaseClient:
     """
     Dependency function to create and yield a Supabase client.
+    Usa il client HTTP condiviso dell'app, quindi non apre nuove connessioni a ogni chiamata.
     """
     if not settings.SUPABASE_URL or not settings.SUPABASE_SERVICE_KEY:
         raise ValueError("Supabase URL and Service Key must be set in environment variables.")
 
-    supabase: SupabaseClient = create_client(
+    supabase: SupabaseClient = await acreate_client(
         settings.SUPABASE_URL,
-        settings.SUPABASE_SERVICE_KEY
+        settings.SUPABASE_SERVICE_KEY,
+        options=AsyncClientOptions(
+            httpx_client=get_http_client(),
+            # Client di servizio: nessuna sessione utente da conservare o rinnovare
+            auto_refresh_token=False,
+            persist_session=False,
+        ),
     )
-    return supabase
\ No newline at end of file
+    return supabase
@@ -1,62 +1,192 @@
 # app/Services/supabase_jwt_service.py
-import httpx
+import time
+import asyncio
+import hashlib
+from typing import Any, Dict, Optional
+
 from jose import jwt, jwk
 from jose.exceptions import JWTError
-from cachetools import TTLCache
+from cachetools import LRUCache
 from fastapi import HTTPException, status
 from app.Core.config import settings
+from app.Infrastructure.circuit_breaker import ServiceUnavailableError, supabase_breakers
+from app.Infrastructure.http_client import get_http_client
+
+# Chiavi pubbliche già costruite per `kid`, valide finché non cambia il JWKS da cui derivano
+_public_keys: Dict[str, Any] = {}
+_public_keys_source: Optional[dict] = None
+
+# Token già verificati (hash SHA-256 -> (payload, kid)), riusati fino alla scadenza `exp`
+# finché la chiave che li ha firmati resta nel JWKS
+verified_tokens: LRUCache = LRUCache(maxsize=settings.JWT_VERIFIED_CACHE_SIZE)
+
+
+class UnknownKeyError(HTTPException):
+    """Il `kid` del token non è nel JWKS in uso (es. dopo una rotazione delle chiavi)."""
+
+    def __init__(self) -> None:
+        super().__init__(status_code=401, detail="Chiave pubblica per la validazione del token non trovata.")
 
-# Cache per le chiavi JWKS con un TTL (Time To Live) di 1 ora
-jwks_cache = TTLCache(maxsize=1, ttl=3600)
 
-async def get_jwks():
+class JwksStore:
     """
-    Recupera le chiavi JWKS da Supabase, utilizzando una cache per evitare
-    chiamate di rete ripetute.
+    JWKS di Supabase in memoria, senza picchi di latenza alla scadenza:
+    - una sola richiesta alla volta verso Supabase (le altre attendono la stessa);
+    - dopo `refresh_after` secondi il JWKS viene aggiornato in background e nel
+      frattempo si continua a usare quello corrente;
+    - se Supabase non risponde si continua a usare l'ultimo JWKS valido;
+    - un `kid` sconosciuto provoca al più un nuovo download ogni `min_interval` secondi.
     """
-    if "jwks" in jwks_cache:
-        return jwks_cache["jwks"]
 
-    url = f"{settings.SUPABASE_URL}/auth/v1/.well-known/jwks.json"
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url)
+    def __init__(self, url: str, refresh_after: float, min_interval: float) -> None:
+        self.url = url
+        self.refresh_after = refresh_after
+        self.min_interval = min_interval
+        self.jwks: Optional[dict] = None
+        self._fetched_at = float("-inf")
+        self._attempted_at = float("-inf")
+        self._inflight: Optional[asyncio.Task] = None
+
+    async def get(self) -> dict:
+        if self.jwks is None:
+            return await self.refresh()
+        if self._due(self._fetched_at, self.refresh_after) and self._due(self._attempted_at, self.min_interval):
+            self._start_refresh()
+        return self.jwks
+
+    async def refresh_for_unknown_kid(self) -> dict:
+        """Nuovo download per un `kid` sconosciuto, se l'ultimo tentativo non è troppo recente."""
+        if self._inflight is not None or self._due(self._attempted_at, self.min_interval):
+            return await self.refresh()
+        return await self.get()
+
+    async def refresh(self) -> dict:
+        """
+        Scarica il JWKS (o attende il download già in corso). In caso di errore
+        restituisce l'ultimo JWKS valido; senza JWKS risponde 503.
+        """
+        task = self._start_refresh()
+        try:
+            # shield: se la richiesta che attende viene annullata, il download prosegue per le altre
+            return await asyncio.shield(task)
+        except HTTPException:
+            if self.jwks is not None:
+                return self.jwks
+            raise
+
+    def _start_refresh(self) -> asyncio.Task:
+        if self._inflight is None:
+            self._attempted_at = time.monotonic()
+            self._inflight = asyncio.ensure_future(self._fetch())
+            self._inflight.add_done_callback(self._finish)
+        return self._inflight
+
+    def _finish(self, task: asyncio.Task) -> None:
+        self._inflight = None
+        if not task.cancelled() and task.exception() is None:
+            jwks = task.result()
+            # Chiavi ruotate o revocate: i token verificati con il JWKS precedente vanno riverificati
+            if self.jwks is not None and _kids(jwks) != _kids(self.jwks):
+                verified_tokens.clear()
+            self.jwks = jwks
+            self._fetched_at = time.monotonic()
+
+    async def _fetch(self) -> dict:
+        try:
+            breaker = supabase_breakers["jwks"]
+            async with breaker.deadline(5.0):
+                response = await breaker.call(lambda: get_http_client().get(self.url))
             response.raise_for_status()
             jwks = response.json()
-            jwks_cache["jwks"] = jwks
-            return jwks
-    except httpx.HTTPStatusError as e:
-        raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail=f"Impossibile recuperare le chiavi di validazione JWT da Supabase: {e}",
-        )
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Errore imprevisto durante il recupero delle chiavi JWKS: {e}",
-        )
+        except ServiceUnavailableError:
+            raise
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=f"Impossibile recuperare le chiavi di validazione JWT da Supabase: {e}",
+            )
+        if not isinstance(jwks, dict) or not isinstance(jwks.get("keys"), list):
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Risposta JWKS di Supabase non valida",
+            )
+        return jwks
+
+    @staticmethod
+    def _due(since: float, seconds: float) -> bool:
+        return time.monotonic() - since >= seconds
+
+
+jwks_store = JwksStore(
+    f"{settings.SUPABASE_URL}/auth/v1/.well-known/jwks.json",
+    refresh_after=settings.JWKS_REFRESH_AFTER,
+    min_interval=settings.JWKS_MIN_REFETCH_INTERVAL,
+)
+
+
+async def get_jwks() -> dict:
+    """
+    Recupera le chiavi JWKS da Supabase, utilizzando una cache per evitare
+    chiamate di rete ripetute (vedi JwksStore).
+    """
+    return await jwks_store.get()
+
+
+async def verify_token(token: str) -> dict:
+    """
+    Valida il token con il JWKS in cache; se il `kid` è sconosciuto (chiavi ruotate)
+    riprova una volta dopo aver riscaricato il JWKS.
+    """
+    try:
+        return validate_token_local(token, await jwks_store.get())
+    except UnknownKeyError:
+        return validate_token_local(token, await jwks_store.refresh_for_unknown_kid())
+
+def _kids(jwks: dict) -> set:
+    return {k.get("kid") for k in jwks.get("keys", [])}
+
+
+def _public_key(jwks: dict, kid: Optional[str]) -> Any:
+    """
+    Chiave pubblica per `kid`, costruita con `jwk.construct` una sola volta per JWKS.
+    None se il JWKS non contiene la chiave.
+    """
+    global _public_keys, _public_keys_source
+    if _public_keys_source is not jwks:
+        _public_keys, _public_keys_source = {}, jwks
+    key = _public_keys.get(kid)
+    if key is None:
+        # `jwk.construct` gestisce i diversi formati di chiave (es. RSA vs EC) in base al 'kty'
+        signing_key = next((k for k in jwks["keys"] if k.get("kid") == kid), None)
+        if signing_key is None:
+            return None
+        key = _public_keys[kid] = jwk.construct(signing_key)
+    return key
+
 
 def validate_token_local(token: str, jwks: dict) -> dict:
     """
     Decodifica e valida un token JWT localmente utilizzando le chiavi JWKS fornite.
-    Supporta algoritmi sia RS256 che ES256.
+    Supporta algoritmi sia RS256 che ES256. Un token già verificato e non ancora
+    scaduto viene riconosciuto dal suo hash senza ripetere la verifica della firma,
+    purché la sua chiave sia ancora in `jwks`.
     """
+    token_hash = hashlib.sha256(token.encode()).digest()
+    cached = verified_tokens.get(token_hash)
+    if cached is not None:
+        payload, kid = cached
+        if payload.get("exp", 0) > time.time() and _public_key(jwks, kid) is not None:
+            return dict(payload)
+        verified_tokens.pop(token_hash, None)
+
     try:
         unverified_header = jwt.get_unverified_header(token)
 
         # Trova la chiave corretta dal JWKS basandosi sul 'kid' del token
-        signing_key = None
-        for key in jwks["keys"]:
-            if key["kid"] == unverified_header["kid"]:
-                signing_key = key
-                break
-
-        if not signing_key:
-            raise HTTPException(status_code=401, detail="Chiave pubblica per la validazione del token non trovata.")
-
-        # Costruisce la chiave pubblica. `jwk.construct` gestisce i diversi
-        # formati di chiave (es. RSA vs EC) in base al 'kty'.
-        public_key = jwk.construct(signing_key)
+        kid = unverified_header.get("kid")
+        public_key = _public_key(jwks, kid)
+        if public_key is None:
+            raise UnknownKeyError()
 
         # Decodifica il token, accettando gli algoritmi asimmetrici comuni di Supabase
         payload = jwt.decode(
@@ -66,8 +196,13 @@ def validate_token_local(token: str, jwks: dict) -> dict:
             audience="authenticated",
             issuer=f"{settings.SUPABASE_URL}/auth/v1",
         )
-        return payload
+        # Solo token con scadenza: senza `exp` la verifica si ripete a ogni richiesta
+        if isinstance(payload.get("exp"), (int, float)):
+            verified_tokens[token_hash] = (payload, kid)
+        return dict(payload)
 
+    except HTTPException:
+        raise
     except JWTError as e:
         raise HTTPException(status_code=401, detail=f"Token non valido o scaduto: {e}")
     except Exception as e:
@@ -0,0 +1,70 @@
+# app/cli.py
+"""
+Comandi da riga di comando per il backend. Dalla cartella `backend/`:
+
+    python -m app.cli merged-dxf ORD123                 # ORD123.dxf con tutti i pezzi
+    python -m app.cli merged-dxf ORD123 --split -o out  # un DXF per materiale e spessore
+"""
+
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+from typing import List, Optional
+
+from app.Infrastructure.db_supabase import open_session
+from app.Repositories.order_repository import OrderRepository
+from app.Services import merged_dxf_service
+
+
+async def merged_dxf(
+    code: str,
+    output_dir: Path,
+    split: bool = False,
+    material: Optional[str] = None,
+    thickness_mm: Optional[float] = None,
+) -> List[Path]:
+    async with open_session() as db:
+        repo = OrderRepository(db)
+        order = await repo.get_by_code(code)
+        if order is None:
+            raise SystemExit(f"Ordine {code} non trovato")
+        trees = await repo.fetch_trees(
+            [order.id], ("code",), merged_dxf_service.PIECE_FIELDS, merged_dxf_service.HOLE_FIELDS
+        )
+
+    pieces = merged_dxf_service.filter_pieces(trees[0]["polygons"], material, thickness_mm)
+    if not pieces:
+        raise SystemExit(f"Nessun pezzo da esportare per l'ordine {code}")
+
+    groups = merged_dxf_service.split_by_group(pieces) if split else {None: pieces}
+    output_dir.mkdir(parents=True, exist_ok=True)
+    written = []
+    for key, group in groups.items():
+        name = code if key is None else f"{code}_{merged_dxf_service.group_name(key)}"
+        path = output_dir / f"{name}.dxf"
+        merged_dxf_service.build_merged_dxf(group, title=code).saveas(str(path))
+        written.append(path)
+    return written
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.cli")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    merged = commands.add_parser("merged-dxf", help="DXF unico con tutti i pezzi di un ordine")
+    merged.add_argument("code", help="codice ordine")
+    merged.add_argument("-o", "--output-dir", type=Path, default=Path("."))
+    merged.add_argument("--split", action="store_true", help="un file per materiale e spessore")
+    merged.add_argument("--material")
+    merged.add_argument("--thickness", type=float, dest="thickness_mm")
+
+    args = parser.parse_args(argv)
+    if args.command == "merged-dxf":
+        paths = asyncio.run(merged_dxf(args.code, args.output_dir, args.split, args.material, args.thickness_mm))
+        for path in paths:
+            print(path)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
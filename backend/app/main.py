@@ -1,6 +1,7 @@
 # app/main.py
 
-from fastapi import FastAPI
+from contextlib import asynccontextmanager, suppress
+from fastapi import FastAPI, HTTPException
 from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 
@@ -9,9 +10,29 @@ from app.Router.health import router as health_router
 from app.Core.config import settings
 from app.Core.rate_limiter import limiter
 from app.Core.middleware_config import setup_middlewares
+from app.Services.pdf_processing_service import shutdown_executor
+from app.Infrastructure.db_supabase import dispose_engine
+from app.Services.supabase_jwt_service import jwks_store
+from app.Infrastructure.http_client import get_http_client, close_http_client
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Risorse condivise per tutta la vita dell'applicazione.
+    """
+    # Pool HTTP keep-alive verso Supabase, condiviso da tutte le richieste
+    get_http_client()
+    # JWKS scaricato all'avvio, così la prima richiesta autenticata non lo attende;
+    # se Supabase non risponde verrà riprovato alla prima richiesta
+    with suppress(HTTPException):
+        await jwks_store.refresh()
+    yield
+    shutdown_executor()
+    await close_http_client()
+    await dispose_engine()
 
 # Inizializzazione dell'app FastAPI
-app = FastAPI(title=settings.APP_NAME)
+app = FastAPI(title=settings.APP_NAME, lifespan=lifespan)
 
 # Configurazione del Rate Limiter
 app.state.limiter = limiter
@@ -22,14 +43,15 @@ setup_middlewares(app)
 
 # --- Mount Static Files (opzionale) ---
 import os
-from fastapi.staticfiles import StaticFiles
+from app.Core.artifact_files import ArtifactFiles
 
 # Assicuriamoci che la cartella outputs esista
 outputs_dir = os.path.join(os.path.dirname(__file__), "..", "outputs")
 if not os.path.exists(outputs_dir):
     os.makedirs(outputs_dir, exist_ok=True)
 
-app.mount("/api/v1/outputs", StaticFiles(directory=outputs_dir), name="outputs")
+# Artefatti con nome content-hash: serviti come immutabili, con ETag forte e richieste Range
+app.mount("/api/v1/outputs", ArtifactFiles(directory=outputs_dir), name="outputs")
 
 # Inclusione dei router
 app.include_router(health_router, prefix="/api/v1")
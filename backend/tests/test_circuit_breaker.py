@@ -0,0 +1,87 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from app.Core.config import settings
+from app.Infrastructure import supabase_auth_client
+from app.Infrastructure.circuit_breaker import CLOSED, OPEN, CircuitBreaker, ServiceUnavailableError
+
+
+@pytest.fixture
+def gotrue(monkeypatch):
+    """GoTrue finto: risponde con gli stati in coda (poi 200) e conta le richieste."""
+    state = {"statuses": [], "calls": 0, "delay": 0}
+
+    async def handler(request):
+        state["calls"] += 1
+        await asyncio.sleep(state["delay"])
+        code = state["statuses"].pop(0) if state["statuses"] else 200
+        return httpx.Response(code, json={"id": "u1"} if code == 200 else {"msg": "down"})
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    breakers = {g: CircuitBreaker(g, failure_threshold=3, reset_timeout=30) for g in ("read", "auth", "admin")}
+    monkeypatch.setattr(supabase_auth_client, "get_http_client", lambda: client)
+    monkeypatch.setattr(supabase_auth_client, "supabase_breakers", breakers)
+    monkeypatch.setattr(settings, "SUPABASE_RETRY_BACKOFF", 0)
+    state["breakers"] = breakers
+    return state
+
+
+async def test_gets_are_retried_and_posts_are_not(gotrue):
+    gotrue["statuses"] = [503, 502]
+    res = await supabase_auth_client.get_user_from_access_token("tok")
+    assert res["id"] == "u1" and gotrue["calls"] == 3
+    assert gotrue["breakers"]["read"].state == CLOSED
+
+    gotrue["statuses"] = [503]
+    res = await supabase_auth_client.sign_in("a@b.it", "pw")
+    assert res["http_status"] == 503 and gotrue["calls"] == 4
+
+
+async def test_open_breaker_fails_fast_then_probes(gotrue):
+    breaker = gotrue["breakers"]["read"]
+    gotrue["statuses"] = [503, 503, 503]
+    await supabase_auth_client.get_user_from_access_token("tok")
+    assert breaker.state == OPEN and gotrue["calls"] == 3
+
+    with pytest.raises(ServiceUnavailableError) as exc:
+        await supabase_auth_client.get_user_from_access_token("tok")
+    assert exc.value.status_code == 503
+    assert 1 <= int(exc.value.headers["Retry-After"]) <= 30
+    assert gotrue["calls"] == 3  # nessuna richiesta partita
+
+    # Trascorso il reset passa una chiamata di prova: se riesce il circuito si richiude
+    breaker._opened_at -= 30
+    res = await supabase_auth_client.get_user_from_access_token("tok")
+    assert res["error"] is None and breaker.state == CLOSED
+
+
+async def test_budget_bounds_the_whole_call_and_groups_are_isolated(gotrue, monkeypatch):
+    monkeypatch.setattr(settings, "SUPABASE_TIMEOUT_READ", 0.05)
+    gotrue["delay"] = 1
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    with pytest.raises(ServiceUnavailableError):
+        await supabase_auth_client.get_user_from_access_token("tok")
+    # Un solo errore per la scadenza, senza tentativi oltre il budget
+    assert loop.time() - started < 0.5
+    assert gotrue["breakers"]["read"].failures == 1 and gotrue["calls"] == 1
+
+    # Un circuito admin aperto non blocca i login
+    gotrue["delay"] = 0
+    gotrue["breakers"]["admin"].state = OPEN
+    gotrue["breakers"]["admin"]._opened_at = time.monotonic()
+    res = await supabase_auth_client.sign_in("a@b.it", "pw")
+    assert res["error"] is None
+
+
+def test_half_open_allows_a_single_probe():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    breaker.before_call()  # prova in corso
+    with pytest.raises(ServiceUnavailableError):
+        breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == OPEN
@@ -0,0 +1,51 @@
+import gzip
+
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.Middleware.compression import CompressionMiddleware, negotiate_encoding
+
+app = FastAPI()
+app.add_middleware(CompressionMiddleware, minimum_size=100)
+
+
+@app.get("/big")
+def big():
+    return {"rows": [{"code": "ORD", "n": i} for i in range(200)]}
+
+
+@app.get("/small")
+def small():
+    return PlainTextResponse("ok")
+
+
+@app.get("/stream")
+def stream():
+    return StreamingResponse((f'{{"n": {i}}}\n' for i in range(50)), media_type="application/x-ndjson")
+
+
+client = TestClient(app)
+
+
+def test_large_json_is_gzipped():
+    r = client.get("/big", headers={"Accept-Encoding": "gzip"})
+    assert r.headers["content-encoding"] == "gzip"
+    assert "accept-encoding" in r.headers["vary"].lower()
+    assert r.json()["rows"][199] == {"code": "ORD", "n": 199}
+
+
+def test_small_and_unaccepted_responses_are_untouched():
+    assert "content-encoding" not in client.get("/small", headers={"Accept-Encoding": "gzip"}).headers
+    assert "content-encoding" not in client.get("/big", headers={"Accept-Encoding": "identity"}).headers
+
+
+def test_streaming_response_is_compressed_incrementally():
+    r = client.get("/stream", headers={"Accept-Encoding": "gzip"})
+    assert r.headers["content-encoding"] == "gzip"
+    assert len(r.text.splitlines()) == 50
+
+
+def test_negotiation_honours_q_values():
+    assert negotiate_encoding("gzip;q=0, deflate") is None
+    assert negotiate_encoding("deflate, gzip;q=0.5") == "gzip"
@@ -0,0 +1,12 @@
+from app.Infrastructure.http_client import get_http_client, close_http_client
+
+
+async def test_shared_client_is_reused_until_closed():
+    client = get_http_client()
+    assert get_http_client() is client
+
+    await close_http_client()
+    assert client.is_closed
+    fresh = get_http_client()
+    assert fresh is not client and not fresh.is_closed
+    await close_http_client()
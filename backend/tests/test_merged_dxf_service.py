@@ -0,0 +1,66 @@
+import io
+import ezdxf
+from app.Services.merged_dxf_service import iter_merged_dxf, group_name, split_by_group
+
+def make_piece(page, material, thickness, width=1000.0, coords=None):
+    return {
+        "label": f"Pezzo {page}", "page_number": page, "is_mirrored": False,
+        "width_mm": width, "height_mm": 600.0, "material": material, "thickness_mm": thickness,
+        "outer_coords": coords,
+        "holes": [
+            {"x_mm": 100.0, "y_mm": 50.0, "width_mm": 300.0, "height_mm": 200.0, "diameter_mm": None},
+            {"x_mm": 700.0, "y_mm": 300.0, "width_mm": None, "height_mm": None, "diameter_mm": 35.0},
+        ],
+    }
+
+def test_merged_dxf_lays_pieces_side_by_side_per_group():
+    pieces = [
+        make_piece(1, "Quarzo", 20.0, coords=[[0, 0], [1000, 0], [1000, 600], [0, 600], [0, 0]]),
+        make_piece(2, "Quarzo", 20.0, width=1500.0),  # senza contorno salvato: rettangolo
+        make_piece(3, "Laminato HPL", 12.0),
+    ]
+
+    data = b"".join(iter_merged_dxf(pieces, title="ORD"))
+    doc = ezdxf.read(io.StringIO(data.decode("utf-8")))
+    inserts = doc.modelspace().query("INSERT")
+
+    assert sorted(i.dxf.name for i in inserts) == ["PEZZO_1", "PEZZO_2", "PEZZO_3"]
+    by_name = {i.dxf.name: i for i in inserts}
+    assert by_name["PEZZO_1"].dxf.layer == by_name["PEZZO_2"].dxf.layer == "QUARZO_20MM"
+    assert by_name["PEZZO_3"].dxf.layer == "LAMINATO_HPL_12MM"
+    # Stessa riga, affiancati senza sovrapposizioni; gruppo diverso su un'altra riga
+    assert by_name["PEZZO_2"].dxf.insert.x >= 1000.0
+    assert by_name["PEZZO_2"].dxf.insert.y == by_name["PEZZO_1"].dxf.insert.y
+    assert by_name["PEZZO_3"].dxf.insert.y != by_name["PEZZO_1"].dxf.insert.y
+
+    block = doc.blocks.get("PEZZO_2")
+    assert len(block.query("LWPOLYLINE[layer=='PERIMETRO']")) == 1
+    assert len(block.query("LWPOLYLINE[layer=='LAVORAZIONE']")) == 1
+    assert len(block.query("CIRCLE[layer=='LAVORAZIONE']")) == 1
+
+    assert list(split_by_group(pieces)) == [("Quarzo", 20.0), ("Laminato HPL", 12.0)]
+    assert group_name((None, None)) == "SENZA_MATERIALE"
+
+def test_streamed_dxf_matches_built_document():
+    import re
+    from app.Services.merged_dxf_service import build_merged_dxf
+
+    pieces = [make_piece(page, "Quarzo" if page % 2 else "HPL", 20.0) for page in range(1, 6)]
+    chunks = list(iter_merged_dxf(pieces, title="ORD"))
+    data = b"".join(chunks).decode("utf-8")
+    built = io.StringIO()
+    build_merged_dxf(pieces, title="ORD").write(built)
+
+    def shape(doc):
+        blocks = {b.name: sorted((e.dxftype(), e.dxf.layer) for e in b) for b in doc.blocks if b.name.startswith("PEZZO")}
+        return blocks, sorted((e.dxftype(), e.dxf.layer) for e in doc.modelspace())
+
+    streamed = ezdxf.read(io.StringIO(data))
+    assert shape(streamed) == shape(ezdxf.read(io.StringIO(built.getvalue())))
+    assert len(streamed.audit().errors) == 0
+    # Un blocco di output per pezzo, handle univoci e tutti sotto $HANDSEED
+    assert len(chunks) > 2 * len(pieces)
+    body = data[data.index("ENDSEC"):]
+    handles = [int(h, 16) for h in re.findall(r"\n  5\n([0-9A-F]+)\n", body)]
+    assert len(handles) == len(set(handles))
+    assert max(handles) < int(streamed.header["$HANDSEED"], 16)
@@ -0,0 +1,119 @@
+import io
+import json
+import zipfile
+
+import app.Infrastructure.db_supabase  # registra i modelli prima dei servizi che li importano
+from fastapi import Request, UploadFile
+from app.Controllers import order_controller as module
+from app.Controllers.order_controller import OrderController
+from app.Services.pdf_processing_service import PDFProcessingService
+
+
+def make_pdf(text, drawing):
+    """PDF di una pagina con una riga di testo e i tracciati indicati (operatori PDF)."""
+    content = f"BT /F1 10 Tf 20 380 Td ({text}) Tj ET\n{drawing}".encode()
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 600 400] /Contents 4 0 R"
+        b" /Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    out, offsets = bytearray(b"%PDF-1.4\n"), []
+    for i, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % i + obj + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % o for o in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def multipart_request(filename, data):
+    body = (
+        b"--B\r\nContent-Disposition: form-data; name=\"file\"; filename=\"" + filename.encode() + b"\"\r\n"
+        b"Content-Type: application/pdf\r\n\r\n" + data + b"\r\n--B--\r\n"
+    )
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    headers = [(b"content-type", b"multipart/form-data; boundary=B"), (b"content-length", str(len(body)).encode())]
+    return Request({"type": "http", "method": "POST", "path": "/", "headers": headers}, receive)
+
+
+class NoDatabase:
+    def __getattr__(self, name):
+        raise AssertionError(f"il dry-run non deve usare il DB ({name})")
+
+
+def make_controller(tmp_path):
+    controller = OrderController()
+    controller.pdf_svc = PDFProcessingService(imports_dir=str(tmp_path / "imports"), outputs_dir=str(tmp_path / "outputs"))
+    return controller
+
+
+async def read_ndjson(response):
+    return [json.loads(line) async for line in response.body_iterator]
+
+
+async def test_batch_rejects_duplicate_order_codes_before_storing(tmp_path, monkeypatch):
+    controller = make_controller(tmp_path)
+    imported = []
+
+    async def import_one(source, upload, user_id):
+        imported.append((source, upload.path.read_bytes()))
+        return {"file": source, "status": "ok"}
+
+    monkeypatch.setattr(controller, "_import_one", import_one)
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as zf:
+        zf.writestr("a/ORD1.pdf", b"%PDF-zip-a")
+        zf.writestr("b/ORD1.pdf", b"%PDF-zip-b")
+        zf.writestr("ORD2.pdf", b"%PDF-zip-2")
+    buf.seek(0)
+    files = [
+        UploadFile(buf, filename="batch.zip"),
+        UploadFile(io.BytesIO(b"%PDF-2"), filename="ORD2.pdf"),
+        UploadFile(io.BytesIO(b"%PDF-3"), filename="ORD3.pdf"),
+    ]
+
+    results = await read_ndjson(await controller.import_batch(files))
+
+    errors = sorted(r["file"] for r in results if r["status"] == "error")
+    assert errors == ["ORD2.pdf", "batch.zip/ORD1.pdf", "batch.zip/ORD1.pdf", "batch.zip/ORD2.pdf"]
+    assert imported == [("ORD3.pdf", b"%PDF-3")]
+    assert sorted(p.name for p in controller.pdf_svc.imports_dir.iterdir()) == ["ORD3.pdf"]
+
+
+async def test_batch_hides_internal_error_text(tmp_path, monkeypatch):
+    controller = make_controller(tmp_path)
+
+    async def import_pdf(self, *args, **kwargs):
+        raise RuntimeError('duplicate key value violates unique constraint "orders_code_key"')
+
+    monkeypatch.setattr(module.OrderService, "import_pdf", import_pdf)
+    files = [UploadFile(io.BytesIO(b"%PDF-1"), filename="ORD1.pdf")]
+
+    results = await read_ndjson(await controller.import_batch(files))
+
+    assert results == [{"file": "ORD1.pdf", "status": "error", "detail": "Errore durante l'import"}]
+
+
+async def test_dry_run_writes_nothing_and_returns_geometry_only(tmp_path):
+    controller = make_controller(tmp_path)
+    pdf = make_pdf("Ordine 3CAD 12345 Top Caranto Ker Sp.20 1000 x 20 x 600", "100 100 300 180 re S\n")
+
+    preview = await controller.import_pdf(NoDatabase(), multipart_request("ORD1.pdf", pdf), dry_run=True)
+
+    assert preview.dry_run and preview.code == "ORD1"
+    assert [(p.width_mm, p.height_mm, p.material) for p in preview.pieces] == [(1000.0, 600.0, "Caranto Ker")]
+    assert len(preview.pieces[0].outer_coords) == 5
+    assert list(controller.pdf_svc.imports_dir.iterdir()) == []
+    assert list(controller.pdf_svc.outputs_dir.iterdir()) == []
+
+    [piece] = controller.pdf_svc.process_pdf(io.BytesIO(pdf), "ORD1", render=False)
+    assert piece["dxf_path"] is piece["preview_path"] is piece["technical_preview_path"] is None
+    assert list(controller.pdf_svc.outputs_dir.iterdir()) == []
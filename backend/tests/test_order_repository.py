@@ -0,0 +1,83 @@
+import json
+import uuid
+from types import SimpleNamespace
+
+import app.Infrastructure.db_supabase  # registra i modelli prima dei repository che li importano
+from app.Core.config import settings
+from app.Models.polygon import Polygon
+from app.Repositories.order_repository import OrderRepository, build_piece_rows
+
+
+def make_piece(label, holes):
+    return {
+        "label": label, "page_number": 1, "width_mm": 1000.0, "height_mm": 600.0,
+        "dxf_path": f"{label}.dxf", "preview_path": f"{label}.png",
+        "outer_coords": [(0.0, 0.0), (1000.0, 0.0), (1000.0, 600.0)], "holes": holes,
+    }
+
+
+def test_build_piece_rows_links_holes_to_client_side_ids():
+    order_id = uuid.uuid4()
+    hole = {"type": "foro", "x_mm": 10.0, "y_mm": 20.0, "width_mm": 30.0, "height_mm": 40.0}
+    pieces = [make_piece("A", [hole, dict(hole, x_mm=50.0)]), make_piece("B", []), make_piece("C", [hole])]
+
+    rows = build_piece_rows(order_id, pieces)
+
+    assert [poly["label"] for poly, _ in rows] == ["A", "B", "C"]
+    assert len({poly["id"] for poly, _ in rows}) == 3
+    for poly, holes in rows:
+        assert isinstance(poly["id"], uuid.UUID) and poly["order_id"] == order_id
+        assert all(h["polygon_id"] == poly["id"] for h in holes)
+    assert [len(holes) for _, holes in rows] == [2, 0, 1]
+    assert len({h["id"] for _, holes in rows for h in holes}) == 3
+
+    # Con id già noti (reimport) vengono mantenuti nell'ordine dei pezzi
+    ids = [uuid.uuid4() for _ in pieces]
+    assert [poly["id"] for poly, _ in build_piece_rows(order_id, pieces, polygon_ids=ids)] == ids
+
+
+class FakeSession:
+    """Sessione che registra INSERT e COPY invece di eseguirli."""
+
+    def __init__(self):
+        self.executed, self.copied = [], []
+        raw = SimpleNamespace(driver_connection=SimpleNamespace(copy_records_to_table=self.copy_records_to_table))
+
+        async def get_raw_connection():
+            return raw
+
+        self.conn = SimpleNamespace(get_raw_connection=get_raw_connection)
+
+    def get_bind(self):
+        return SimpleNamespace(dialect=SimpleNamespace(driver="asyncpg"))
+
+    async def connection(self):
+        return self.conn
+
+    async def execute(self, stmt, rows):
+        self.executed.append(rows)
+
+    async def copy_records_to_table(self, table, schema_name, columns, records):
+        self.copied.append((table, schema_name, columns, records))
+
+
+async def test_bulk_insert_serializes_jsonb_only_for_copy(monkeypatch):
+    monkeypatch.setattr(settings, "IMPORT_COPY_THRESHOLD", 2)
+    [(row, _)] = build_piece_rows(uuid.uuid4(), [make_piece("A", [])])
+    no_coords = dict(row, id=uuid.uuid4(), outer_coords=None)
+
+    db = FakeSession()
+    await OrderRepository(db)._bulk_insert(Polygon, [row])
+    assert db.executed == [[row]] and db.copied == []
+    assert db.executed[0][0]["outer_coords"] == [[0.0, 0.0], [1000.0, 0.0], [1000.0, 600.0]]
+
+    db = FakeSession()
+    await OrderRepository(db)._bulk_insert(Polygon, [row, no_coords])
+    assert db.executed == []
+    [(table, schema, columns, records)] = db.copied
+    assert (table, schema) == ("polygons", "public")
+    coords = [r[columns.index("outer_coords")] for r in records]
+    assert coords == [json.dumps(row["outer_coords"]), None]
+    # Le colonne non JSONB passano invariate
+    assert [r[columns.index("id")] for r in records] == [row["id"], no_coords["id"]]
+    assert records[0][columns.index("width_mm")] == 1000.0
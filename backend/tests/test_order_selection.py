@@ -0,0 +1,61 @@
+import pytest
+from fastapi import HTTPException
+
+import app.Infrastructure.db_supabase  # registra i modelli prima dei servizi che li importano
+from app.Controllers.order_controller import resolve_selection, ORDER_FIELDS, POLYGON_FIELDS, HOLE_FIELDS
+
+
+def test_defaults_return_full_tree():
+    assert resolve_selection() == (ORDER_FIELDS, POLYGON_FIELDS, HOLE_FIELDS)
+
+
+def test_fields_and_include_limit_columns_and_relations():
+    order, polygons, holes = resolve_selection("code,polygons.dxf_path,polygons.label", "polygons")
+
+    assert order == ("id", "code")
+    assert polygons == ("id", "dxf_path", "label")
+    assert holes is None
+
+
+def test_holes_imply_polygons():
+    order, polygons, holes = resolve_selection("polygons.holes.x_mm", "polygons.holes")
+
+    assert order == ORDER_FIELDS
+    assert polygons == POLYGON_FIELDS
+    assert holes == ("id", "x_mm")
+
+
+@pytest.mark.parametrize("fields,include", [
+    ("nope", None),
+    ("polygons.nope", None),
+    ("polygons.dxf_path", ""),
+    (None, "clients"),
+])
+def test_invalid_selection_is_rejected(fields, include):
+    with pytest.raises(HTTPException) as exc:
+        resolve_selection(fields, include)
+    assert exc.value.status_code == 400
+
+
+def test_orjson_body_matches_response_model():
+    import uuid
+    import orjson
+    from datetime import datetime, timezone
+    from app.Core.responses import dumps_json
+    from app.Schemas.order import OrderRead
+
+    # Riga come la restituisce fetch_trees con la selezione predefinita (asyncpg: date in UTC)
+    hole = {"id": uuid.uuid4(), "type": "foro", "x_mm": 100.5, "y_mm": 50.0, "width_mm": None, "height_mm": None,
+            "diameter_mm": 35.0, "depth_mm": None, "hole_library_id": None}
+    polygon = {f: None for f in POLYGON_FIELDS} | {
+        "id": uuid.uuid4(), "label": "Pezzo 1", "page_number": 1, "width_mm": 2000.0, "height_mm": 600.0,
+        "is_mirrored": False, "is_machining": False, "thickness_mm": 20.0, "holes": [hole],
+    }
+    tree = {f: None for f in ORDER_FIELDS} | {
+        "id": uuid.uuid4(), "code": "ORD", "created_at": datetime(2026, 3, 1, 9, 30, 15, 123456, tzinfo=timezone.utc),
+        "piece_count": 1, "hole_count": 1, "total_area_m2": 1.2, "total_cut_length_m": 5.2,
+        "materials": ["Quarzo"], "polygons": [polygon],
+    }
+
+    assert orjson.loads(dumps_json(tree)) == OrderRead.model_validate(tree).model_dump(mode="json")
+    assert orjson.loads(dumps_json(tree))["created_at"].endswith("Z")
@@ -0,0 +1,149 @@
+import pytest
+from types import SimpleNamespace
+import app.Infrastructure.db_supabase  # registra i modelli prima dei servizi che li importano
+from app.Services.parsers.base_parser import piece_fingerprint
+from app.Services.order_service import diff_pieces
+
+def make_piece(page, mirrored=False, hole_x=100.0):
+    piece = {
+        "label": f"Pezzo {page}", "page_number": page, "width_mm": 2000.0, "height_mm": 600.0,
+        "material": "Caranto", "thickness_mm": 20.0, "is_mirrored": mirrored, "is_machining": mirrored,
+        "outer_coords": [(0.0, 600.0), (2000.0, 600.0), (2000.0, 0.0), (0.0, 0.0), (0.0, 600.0)],
+        "holes": [{"type": "foro", "x_mm": hole_x, "y_mm": 50.0, "width_mm": 500.0, "height_mm": 400.0}],
+    }
+    piece["fingerprint"] = piece_fingerprint(piece)
+    return piece
+
+def make_poly(piece, fingerprint=None):
+    return SimpleNamespace(
+        id=object(), page_number=piece["page_number"], is_mirrored=piece["is_mirrored"],
+        fingerprint=fingerprint if fingerprint is not None else piece["fingerprint"],
+    )
+
+def test_fingerprint_is_stable_and_sensitive():
+    assert make_piece(1)["fingerprint"] == make_piece(1, hole_x=100.001)["fingerprint"]
+    assert make_piece(1)["fingerprint"] != make_piece(1, hole_x=120.0)["fingerprint"]
+    assert make_piece(1)["fingerprint"] != make_piece(1, mirrored=True)["fingerprint"]
+
+def test_diff_pieces():
+    unchanged = make_poly(make_piece(1))
+    changed = make_poly(make_piece(2))
+    removed = make_poly(make_piece(3))
+    duplicate = make_poly(make_piece(1))
+    legacy = SimpleNamespace(id=object(), page_number=None, is_mirrored=False, fingerprint=None)
+
+    incoming = [make_piece(1), make_piece(2, hole_x=300.0), make_piece(4)]
+    diff = diff_pieces([unchanged, changed, removed, duplicate, legacy], incoming)
+
+    assert diff.unchanged == [unchanged]
+    assert diff.to_update == [(changed, incoming[1])]
+    assert diff.to_insert == [incoming[2]]
+    assert {id(p) for p in diff.to_delete} == {id(removed), id(duplicate), id(legacy)}
+
+
+def test_piece_metrics_counts_only_through_holes():
+    import math
+    from app.Services.parsers.base_parser import piece_metrics
+
+    piece = {
+        "width_mm": 1000.0, "height_mm": 600.0,
+        "outer_coords": [(0, 0), (1000, 0), (1000, 600), (0, 600), (0, 0)],
+        "holes": [
+            {"type": "foro_lavello", "x_mm": 100, "y_mm": 100, "width_mm": 400, "height_mm": 200},
+            {"type": "bussola", "x_mm": 80, "y_mm": 80, "diameter_mm": 12.0, "depth_mm": 15.0},
+            {"type": "foro", "x_mm": 800, "y_mm": 300, "diameter_mm": 35.0},
+        ],
+    }
+
+    metrics = piece_metrics(piece)
+
+    assert metrics["area_mm2"] == pytest.approx(600_000 - 80_000 - math.pi * 35 ** 2 / 4)
+    assert metrics["cut_length_mm"] == pytest.approx(3200 + 1200 + math.pi * 35)
+
+
+def test_order_aggregates_units_and_materials():
+    from app.Services.order_service import order_aggregates
+
+    aggs = order_aggregates(3, 5, 2_500_000.0, 12_345.0, ["Quarzo", None, "Laminato", "Quarzo"])
+
+    assert aggs == {
+        "piece_count": 3,
+        "hole_count": 5,
+        "total_area_m2": 2.5,
+        "total_cut_length_m": 12.345,
+        "materials": ["Laminato", "Quarzo"],
+    }
+
+
+async def test_reimport_regenerates_missing_artifacts(tmp_path, monkeypatch):
+    import uuid
+    from datetime import datetime, timezone
+    from app.Models.order import Order
+    from app.Models.polygon import Polygon
+    from app.Services.order_service import OrderService
+    from app.Services.pdf_processing_service import PDFProcessingService
+    from app.Core.artifact_files import rename_to_content_hash
+
+    pdf_svc = PDFProcessingService(imports_dir=str(tmp_path / "imports"), outputs_dir=str(tmp_path / "outputs"))
+    order = Order(id=uuid.uuid4(), code="ORD", created_at=datetime.now(timezone.utc))
+    existing = []
+    for page in (1, 2):
+        piece = make_piece(page)
+        names = {}
+        for field, ext in (("dxf_path", "dxf"), ("preview_path", "png"), ("technical_preview_path", "png")):
+            path = pdf_svc.outputs_dir / f"ORD_{page}_{field}.{ext}"
+            path.write_bytes(f"v1 {page} {field}".encode())
+            names[field] = rename_to_content_hash(path)
+        existing.append(Polygon(
+            id=uuid.uuid4(), order_id=order.id, label=piece["label"], page_number=page,
+            width_mm=piece["width_mm"], height_mm=piece["height_mm"], is_mirrored=False,
+            is_machining=False, fingerprint=piece["fingerprint"], holes=[], **names,
+        ))
+    # Il DXF del pezzo 2 è andato perso
+    (pdf_svc.outputs_dir / existing[1].dxf_path).unlink()
+
+    def fake_parse(self, pdf_path, order_code, pages=None, known_fingerprints=None, render=True):
+        results = []
+        for page in (1, 2):
+            piece = make_piece(page)
+            for field in ("dxf_path", "preview_path", "technical_preview_path"):
+                piece[field] = f"ORD_{page}_{field}.{'dxf' if field == 'dxf_path' else 'png'}"
+                if piece["fingerprint"] not in known_fingerprints:
+                    # Output non stabile tra un'esecuzione e l'altra (es. $TDCREATE del DXF)
+                    (self.outputs_dir / piece[field]).write_bytes(f"v2 {page} {field}".encode())
+            results.append(piece)
+        return results
+
+    async def aprocess_pdf(pdf_path, order_code, **kwargs):
+        return pdf_svc.process_pdf(pdf_path, order_code, **kwargs)
+
+    monkeypatch.setattr(type(pdf_svc._parsers["VENETA_CUCINE"]), "parse", fake_parse)
+    monkeypatch.setattr(pdf_svc, "aprocess_pdf", aprocess_pdf)
+
+    class FakeDb:
+        async def commit(self): pass
+        async def rollback(self): pass
+
+    svc = OrderService(FakeDb(), pdf_svc)
+    updated = []
+
+    async def get_by_code(code): return order
+    async def list_pieces(order_id, with_holes=False): return existing
+    async def noop(rows): pass
+    async def update_polygons(rows): updated.extend(rows)
+
+    monkeypatch.setattr(svc.orders, "get_by_code", get_by_code)
+    monkeypatch.setattr(svc.orders, "list_pieces", list_pieces)
+    for name in ("delete_pieces", "delete_holes", "insert_polygons", "insert_holes"):
+        monkeypatch.setattr(svc.orders, name, noop)
+    monkeypatch.setattr(svc.orders, "update_polygons", update_polygons)
+
+    result = await svc.import_pdf(tmp_path / "ORD.pdf", "ORD")
+
+    by_page = {p.page_number: p for p in result.polygons}
+    assert by_page[1].dxf_path == existing[0].dxf_path
+    assert [row["page_number"] for row in updated] == [2]
+    for field in ("dxf_path", "preview_path", "technical_preview_path"):
+        name = getattr(by_page[2], field)
+        assert name == updated[0][field]
+        assert (pdf_svc.outputs_dir / name).is_file()
@@ -0,0 +1,21 @@
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+from fastapi import HTTPException
+
+from app.Core.pagination import encode_cursor, decode_cursor
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2026, 3, 1, 12, 30, 15, 123456, tzinfo=timezone.utc)
+    order_id = uuid.uuid4()
+
+    assert decode_cursor(encode_cursor(created_at, order_id)) == (created_at, order_id)
+
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", "", "W10", "WyJ4IiwgInkiXQ"])
+def test_invalid_cursor_is_rejected(cursor):
+    with pytest.raises(HTTPException) as exc:
+        decode_cursor(cursor)
+    assert exc.value.status_code == 400
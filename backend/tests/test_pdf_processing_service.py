@@ -0,0 +1,185 @@
+import pytest
+from pathlib import Path
+from app.Services.pdf_processing_service import PDFProcessingService
+
+def test_overrides_do_not_touch_shared_parser(tmp_path, monkeypatch):
+    svc = PDFProcessingService(imports_dir=str(tmp_path / "imports"), outputs_dir=str(tmp_path / "outputs"))
+    shared = svc._parsers["VENETA_CUCINE"]
+    seen = {}
+
+    def fake_parse(self, pdf_path, order_code, pages=None, known_fingerprints=None, render=True):
+        seen["snap_tol"] = self.SNAP_TOL
+        seen["outputs_dir"] = self.outputs_dir
+        seen["pages"] = pages
+        return []
+
+    monkeypatch.setattr(type(shared), "parse", fake_parse)
+    staging = svc.create_staging_dir()
+    svc.process_pdf(Path("x.pdf"), "ORD", pages=[3], overrides={"snap_tol": 2.5, "unknown": 1}, outputs_dir=staging)
+
+    assert seen == {"snap_tol": 2.5, "outputs_dir": staging, "pages": [3]}
+    assert shared.SNAP_TOL == 1.0
+    assert shared.outputs_dir == svc.outputs_dir
+    assert not hasattr(shared, "UNKNOWN")
+
+def test_find_import_file_and_promote(tmp_path):
+    svc = PDFProcessingService(imports_dir=str(tmp_path / "imports"), outputs_dir=str(tmp_path / "outputs"))
+    assert svc.find_import_file("ORD") is None
+    (svc.imports_dir / "ORD.pdf").write_bytes(b"%PDF")
+    assert svc.find_import_file("ORD") == svc.imports_dir / "ORD.pdf"
+
+    (svc.outputs_dir / "ORD_1.dxf").write_text("old")
+    staging = svc.create_staging_dir()
+    (staging / "ORD_1.dxf").write_text("new")
+    svc.promote_artifacts(staging)
+    assert (svc.outputs_dir / "ORD_1.dxf").read_text() == "new"
+    assert not staging.exists()
+
+    svc.remove_artifacts(["ORD_1.dxf", None, "missing.png"])
+    assert not (svc.outputs_dir / "ORD_1.dxf").exists()
+
+def test_extract_zip_keeps_only_pdfs(tmp_path):
+    import io
+    import zipfile
+    svc = PDFProcessingService(imports_dir=str(tmp_path / "imports"), outputs_dir=str(tmp_path / "outputs"))
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as zf:
+        zf.writestr("batch/ORD1.pdf", b"%PDF-1")
+        zf.writestr("ORD2.PDF", b"%PDF-2")
+        zf.writestr("__MACOSX/batch/._ORD1.pdf", b"junk")
+        zf.writestr("note.txt", b"ignored")
+    buf.seek(0)
+
+    uploads = svc.extract_zip(buf)
+
+    assert sorted(u.path.name for u in uploads) == ["ORD1.pdf", "ORD2.PDF"]
+    assert (svc.imports_dir / "ORD1.pdf").read_bytes() == b"%PDF-1"
+
+
+def test_store_upload_hashes_and_enforces_limit(tmp_path):
+    import io
+    import hashlib
+    import pytest
+    from fastapi import HTTPException
+    from app.Core.uploads import store_stream
+
+    svc = PDFProcessingService(imports_dir=str(tmp_path / "imports"), outputs_dir=str(tmp_path / "outputs"))
+    data = b"%PDF-" + b"x" * 4096
+    upload = svc.store_upload(io.BytesIO(data), "../ORD3.pdf")
+
+    assert upload.path == svc.imports_dir / "ORD3.pdf"
+    assert upload.size == len(data)
+    assert upload.sha256 == hashlib.sha256(data).hexdigest()
+
+    with pytest.raises(HTTPException) as exc:
+        store_stream(io.BytesIO(data), "ORD4.pdf", svc.imports_dir, max_bytes=1024)
+    assert exc.value.status_code == 413
+    # Nessun file parziale lasciato negli import
+    assert sorted(p.name for p in svc.imports_dir.iterdir()) == ["ORD3.pdf"]
+
+
+def test_artifacts_are_served_immutable_with_ranges(tmp_path):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from app.Core.artifact_files import ArtifactFiles, HASHED_NAME, rename_to_content_hash
+
+    (tmp_path / "ORD_1_tech.png").write_bytes(b"0123456789")
+    name = rename_to_content_hash(tmp_path / "ORD_1_tech.png")
+    assert name.startswith("ORD_1_tech.") and name.endswith(".png") and HASHED_NAME.search(name)
+
+    app = FastAPI()
+    app.mount("/outputs", ArtifactFiles(directory=tmp_path))
+    client = TestClient(app)
+
+    r = client.get(f"/outputs/{name}")
+    assert r.headers["cache-control"] == "public, max-age=31536000, immutable"
+    assert r.headers["etag"] == f'"{HASHED_NAME.search(name)["hash"]}"'
+    assert client.get(f"/outputs/{name}", headers={"If-None-Match": r.headers["etag"]}).status_code == 304
+
+    partial = client.get(f"/outputs/{name}", headers={"Range": "bytes=2-5"})
+    assert partial.status_code == 206
+    assert partial.content == b"2345"
+
+
+def test_dxf_gzip_sibling_is_negotiated(tmp_path):
+    import gzip
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from app.Core.artifact_files import ArtifactFiles, rename_to_content_hash, write_gzip_sibling
+
+    content = b"0\nSECTION\n2\nENTITIES\n" * 200
+    (tmp_path / "ORD_1.dxf").write_bytes(content)
+    name = rename_to_content_hash(tmp_path / "ORD_1.dxf")
+    write_gzip_sibling(tmp_path / name)
+
+    app = FastAPI()
+    app.mount("/outputs", ArtifactFiles(directory=tmp_path))
+    client = TestClient(app)
+
+    r = client.get(f"/outputs/{name}", headers={"Accept-Encoding": "gzip"})
+    assert r.headers["content-encoding"] == "gzip"
+    assert int(r.headers["content-length"]) < len(content)
+    assert r.content == content  # decompresso dal client
+
+    r = client.get(f"/outputs/{name}", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in r.headers
+    assert r.content == content
+
+
+def test_bundle_is_streamed_as_valid_zip(tmp_path):
+    import io
+    import os
+    import zipfile
+    from app.Core.artifact_files import rename_to_content_hash
+
+    svc = PDFProcessingService(imports_dir=str(tmp_path / "imports"), outputs_dir=str(tmp_path / "outputs"))
+    dxf_content = b"0\nSECTION\n" * 50_000
+    png_content = os.urandom(200_000)
+    (svc.outputs_dir / "ORD_1.dxf").write_bytes(dxf_content)
+    (svc.outputs_dir / "ORD_1.png").write_bytes(png_content)
+    dxf = rename_to_content_hash(svc.outputs_dir / "ORD_1.dxf")
+    png = rename_to_content_hash(svc.outputs_dir / "ORD_1.png")
+    pieces = [{"dxf_path": dxf, "preview_path": png}, {"dxf_path": "missing.dxf"}]
+
+    chunks = list(svc.iter_bundle("ORD", pieces, previews=True))
+
+    assert max(len(c) for c in chunks) < 1024 * 1024
+    with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as zf:
+        assert zf.namelist() == ["ORD/ORD_1.dxf", "ORD/previews/ORD_1.png"]
+        assert zf.read("ORD/ORD_1.dxf") == dxf_content
+        assert zf.getinfo("ORD/ORD_1.dxf").compress_type == zipfile.ZIP_DEFLATED
+        assert zf.getinfo("ORD/previews/ORD_1.png").compress_type == zipfile.ZIP_STORED
+        assert zf.read("ORD/previews/ORD_1.png") == png_content
+
+
+async def test_broken_process_pool_is_rebuilt(tmp_path, monkeypatch):
+    from concurrent.futures import Future
+    from concurrent.futures.process import BrokenProcessPool
+    from app.Services import pdf_processing_service as module
+
+    class FakePool:
+        def __init__(self, broken):
+            self.broken = broken
+            self.shut_down = False
+
+        def submit(self, fn, *args):
+            fut = Future()
+            if self.broken:
+                fut.set_exception(BrokenProcessPool("worker morto"))
+            else:
+                fut.set_result(fn(*args))
+            return fut
+
+        def shutdown(self, wait=True, cancel_futures=False):
+            self.shut_down = True
+
+    pools = [FakePool(broken=True), FakePool(broken=False)]
+    created = iter(pools)
+    monkeypatch.setattr(module, "_executor", None)
+    monkeypatch.setattr(module, "ProcessPoolExecutor", lambda **kwargs: next(created))
+    svc = PDFProcessingService(imports_dir=str(tmp_path / "imports"), outputs_dir=str(tmp_path / "outputs"))
+    monkeypatch.setattr(svc, "process_pdf", lambda pdf_path, order_code, **kw: [{"code": order_code}])
+
+    assert await svc.aprocess_pdf(Path("x.pdf"), "ORD") == [{"code": "ORD"}]
+    assert pools[0].shut_down and module._executor is pools[1]
+    module.shutdown_executor()
@@ -0,0 +1,117 @@
+from app.Core.response_cache import ResponseCache, LISTS
+from app.Core.responses import cached_json_response
+
+
+def test_invalidation_changes_keys_for_order_and_lists():
+    cache = ResponseCache(max_bytes=1024 * 1024, ttl=60)
+    order_key, list_key = cache.key("o1", "tree"), cache.key(LISTS, "tree")
+    etag = cache.set(order_key, b'{"code":"A"}')
+    cache.set(list_key, b"[]")
+
+    assert cache.get(cache.key("o1", "tree")) == (etag, b'{"code":"A"}')
+
+    cache.invalidate("o1")
+
+    assert cache.get(cache.key("o1", "tree")) is None
+    assert cache.get(cache.key(LISTS, "tree")) is None
+
+
+def test_shared_backend_is_seen_by_other_processes(tmp_path):
+    writer = ResponseCache(max_bytes=1024 * 1024, ttl=60, directory=str(tmp_path))
+    reader = ResponseCache(max_bytes=1024 * 1024, ttl=60, directory=str(tmp_path))
+
+    etag = writer.set(writer.key("o1", "tree"), b"{}")
+    assert reader.get(reader.key("o1", "tree")) == (etag, b"{}")
+
+    writer.invalidate("o1")
+    assert reader.get(reader.key("o1", "tree")) is None
+    assert list((tmp_path / "bodies").iterdir()) == []
+
+
+def test_if_none_match_answers_304():
+    assert cached_json_response(b"{}", '"abc"', 'W/"x", "abc"').status_code == 304
+    response = cached_json_response(b"{}", '"abc"', '"other"')
+    assert response.status_code == 200
+    assert response.headers["etag"] == '"abc"'
+
+
+def test_changed_within_tracks_recent_invalidations(tmp_path):
+    for cache in (
+        ResponseCache(max_bytes=1024, ttl=60),
+        ResponseCache(max_bytes=1024, ttl=60, directory=str(tmp_path)),
+    ):
+        assert not cache.changed_within("o1", 10)
+        cache.invalidate("o1")
+        assert cache.changed_within("o1", 10)
+        assert cache.changed_within(LISTS, 10)
+        assert not cache.changed_within("o2", 10)
+        assert not cache.changed_within("o1", 0)
+
+
+def test_reading_a_version_is_not_a_write(tmp_path):
+    cache = ResponseCache(max_bytes=1024, ttl=60, directory=str(tmp_path))
+    other = ResponseCache(max_bytes=1024, ttl=60, directory=str(tmp_path))
+
+    assert cache.version("o1") == other.version("o1")
+    assert not cache.changed_within("o1", 10)
+
+
+def test_file_backend_prunes_expired_and_oversized_bodies(tmp_path):
+    import os
+    import time
+
+    cache = ResponseCache(max_bytes=1024, ttl=60, directory=str(tmp_path), dir_max_bytes=140)
+    bodies = tmp_path / "bodies"
+    cache.set(cache.key("old", "tree"), b"x")
+    old = next(bodies.iterdir())
+    os.utime(old, (time.time() - 120,) * 2)
+    for i in range(4):
+        cache.set(cache.key(f"o{i}", "tree"), b"y" * 30)
+        os.utime(bodies / cache.key(f"o{i}", "tree"), (time.time() - 10 + i,) * 2)
+
+    cache._shared.prune()
+
+    assert sorted(p.name for p in bodies.iterdir()) == sorted(cache.key(f"o{i}", "tree") for i in (2, 3))
+
+
+async def test_reads_use_replica_only_when_aligned_and_not_recently_written(tmp_path, monkeypatch):
+    import pytest
+    from app.Core.config import settings
+    from app.Infrastructure import db_supabase
+
+    class Monitor:
+        lag = 0.0
+        async def usable(self):
+            return self.lag is not None and self.lag <= 5
+
+    monitor = Monitor()
+    cache = ResponseCache(max_bytes=1024, ttl=60, directory=str(tmp_path))
+    monkeypatch.setattr(db_supabase, "order_cache", cache)
+    monkeypatch.setattr(db_supabase, "replica_monitor", None)
+    assert not await db_supabase.use_replica("o1")
+
+    monkeypatch.setattr(db_supabase, "replica_monitor", monitor)
+    assert await db_supabase.use_replica("o1")
+    assert await db_supabase.use_replica(LISTS)
+
+    # Dopo una modifica l'ordine e gli elenchi vanno sul primario, gli altri ordini no
+    cache.invalidate("o1")
+    assert not await db_supabase.use_replica("o1")
+    assert not await db_supabase.use_replica(LISTS)
+    assert await db_supabase.use_replica("o2")
+
+    # Ritardo sconosciuto (replica non raggiungibile) o eccessivo: primario
+    for lag in (None, 30.0):
+        monitor.lag = lag
+        assert not await db_supabase.use_replica("o2")
+
+    class Unreachable:
+        def connect(self):
+            raise OSError("replica down")
+
+    assert not await db_supabase.ReplicaMonitor(Unreachable(), max_lag=5, interval=0).usable()
+
+    # Replica senza cache condivisa tra i worker: configurazione rifiutata
+    with pytest.raises(ValueError):
+        settings.model_copy(update={"DATABASE_READ_URL": "postgresql://r/db", "ORDER_CACHE_DIR": None}).check_replica_config()
+    settings.model_copy(update={"DATABASE_READ_URL": "postgresql://r/db", "ORDER_CACHE_DIR": str(tmp_path)}).check_replica_config()
@@ -0,0 +1,52 @@
+import uuid
+import pytest
+from types import SimpleNamespace
+from fastapi import HTTPException
+import app.Infrastructure.db_supabase  # registra i modelli prima dei repository
+from app.Core.config import settings
+from app.Core.role_cache import role_cache
+from app.Repositories.user_supabase_role_repository import UserSupabaseRoleRepository
+from app.Router.supabase_auth import require_roles
+
+
+class FakeDb:
+    async def execute(self, stmt):
+        return SimpleNamespace(rowcount=1)
+
+    async def commit(self):
+        pass
+
+
+async def test_require_roles_resolves_once_and_invalidates(monkeypatch):
+    calls = []
+
+    async def list_role_names(self, user_id):
+        calls.append(user_id)
+        return [" Admin"]
+
+    monkeypatch.setattr(UserSupabaseRoleRepository, "list_role_names", list_role_names)
+    role_cache.clear()
+    user_id = uuid.uuid4()
+    claims = {"sub": str(user_id)}
+    admin = require_roles(["admin", "operatore"])
+
+    assert await admin(claims=claims, db=None) == claims
+    assert await admin(claims=claims, db=None) == claims
+    assert calls == [user_id]
+
+    with pytest.raises(HTTPException) as exc:
+        await require_roles(["operatore"])(claims=claims, db=None)
+    assert exc.value.status_code == 403
+    assert calls == [user_id]
+
+    # Revoca di un ruolo: l'utente viene riletto dal DB
+    await UserSupabaseRoleRepository(FakeDb()).unassign(user_id, uuid.uuid4())
+    await admin(claims=claims, db=None)
+    assert calls == [user_id, user_id]
+
+    # Ruoli nel token: nessuna query
+    monkeypatch.setattr(settings, "AUTH_TRUST_JWT_ROLES", True)
+    role_cache.clear()
+    trusted = {"sub": str(user_id), "app_metadata": {"roles": ["operatore"]}}
+    assert await require_roles(["operatore"])(claims=trusted, db=None) == trusted
+    assert calls == [user_id, user_id]
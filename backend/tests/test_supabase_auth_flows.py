@@ -0,0 +1,89 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.Core import server_timing
+from app.Core.config import settings
+from app.Infrastructure import supabase_auth_client
+from app.Middleware.server_timing import ServerTimingMiddleware
+from app.Services.supabase_auth_service import SupabaseAuthService
+
+FACTOR = {"id": "f1", "factor_type": "totp", "status": "verified"}
+
+
+def fake_gotrue(monkeypatch, email_confirmed_at="now"):
+    calls = []
+
+    async def request(method, path, json=None, extra_headers=None, *, operation):
+        calls.append((method, path))
+        server_timing.record("supabase", 1.0, operation)
+        if path == "/auth/v1/admin/users":
+            return {"id": "u1", "email": json["email"], "email_confirmed_at": "now", "http_status": 200, "error": None}
+        if path == "/auth/v1/user":
+            return {"id": "u1", "factors": [FACTOR], "email_confirmed_at": email_confirmed_at, "http_status": 200, "error": None}
+        if path.endswith("/challenge"):
+            return {"id": "c1", "http_status": 200, "error": None}
+        if path.endswith("/verify"):
+            return {"access_token": "aal2", "user": {"id": "u1", "factors": [FACTOR]}, "http_status": 200, "error": None}
+        if path == "/auth/v1/factors":
+            return {"id": "f2", "totp": {"secret": "s"}, "http_status": 200, "error": None}
+        return {"http_status": 200, "error": None}
+
+    monkeypatch.setattr(supabase_auth_client, "_request", request)
+    return calls
+
+
+async def test_register_is_a_single_admin_call_when_auto_confirmed(monkeypatch):
+    calls = fake_gotrue(monkeypatch)
+    monkeypatch.setattr(settings, "ENV", "dev")
+    monkeypatch.setattr(settings, "AUTH_AUTO_CONFIRM_DEV", True)
+
+    res = await supabase_auth_client.register_user("a@b.it", "pw", {"display_name": "A"}, {"plan": "x"}, phone="123")
+
+    assert calls == [("POST", "/auth/v1/admin/users")]
+    assert res["user"]["id"] == "u1" and res["error"] is None
+
+
+async def test_mfa_flows_skip_redundant_round_trips(monkeypatch):
+    calls = fake_gotrue(monkeypatch)
+    svc = SupabaseAuthService()
+
+    res = await svc.disable_mfa("aal1", "123456")
+    assert [p for _, p in calls] == [
+        "/auth/v1/user", "/auth/v1/factors/f1/challenge", "/auth/v1/factors/f1/verify", "/auth/v1/factors/f1",
+    ]
+    assert res["user"]["factors"] == []
+
+    calls.clear()
+    res = await svc.enroll_totp("aal1", "telefono")
+    assert [p for _, p in calls] == ["/auth/v1/user", "/auth/v1/factors", "/auth/v1/factors/f2/challenge"]
+    assert res["challenge_id"] == "c1"
+
+
+async def test_enroll_requires_confirmed_email_before_creating_a_factor(monkeypatch):
+    calls = fake_gotrue(monkeypatch, email_confirmed_at=None)
+
+    res = await SupabaseAuthService().enroll_totp("aal1", "telefono")
+
+    assert res["http_status"] == 400 and res["message"] == "Email non confermata"
+    assert calls == [("GET", "/auth/v1/user")]
+
+
+def test_server_timing_header_lists_outbound_calls(monkeypatch):
+    calls = fake_gotrue(monkeypatch)
+    app = FastAPI()
+    app.add_middleware(ServerTimingMiddleware)
+
+    @app.get("/me")
+    async def me():
+        await supabase_auth_client.get_user_from_access_token("tok")
+        return {}
+
+    @app.get("/plain")
+    async def plain():
+        return {}
+
+    client = TestClient(app)
+    header = client.get("/me").headers["server-timing"]
+    assert header.startswith('supabase;dur=1.0;desc="get_user", total;dur=')
+    assert "server-timing" not in client.get("/plain").headers
+    assert len(calls) == 1
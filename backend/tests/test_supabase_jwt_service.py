@@ -0,0 +1,132 @@
+import time
+import pytest
+from fastapi import HTTPException
+from jose import jwk, jwt
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from app.Core.config import settings
+from app.Services import supabase_jwt_service as svc
+
+
+def make_signer(kid="k1"):
+    key = ec.generate_private_key(ec.SECP256R1())
+    pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption())
+    public = jwk.construct(pem, "ES256").public_key().to_dict()
+    public["kid"] = kid
+
+    def sign(exp_in=3600, **claims):
+        payload = {
+            "sub": "u1", "aud": "authenticated", "iss": f"{settings.SUPABASE_URL}/auth/v1",
+            "exp": int(time.time()) + exp_in, **claims,
+        }
+        return jwt.encode(payload, pem.decode(), algorithm="ES256", headers={"kid": kid})
+
+    return {"keys": [public]}, sign
+
+
+def test_keys_are_built_once_and_verified_tokens_reused(monkeypatch):
+    jwks, sign = make_signer()
+    token, other = sign(), sign(role="authenticated")
+    svc.verified_tokens.clear()
+    constructed, decoded = [], []
+    real_construct, real_decode = svc.jwk.construct, svc.jwt.decode
+    monkeypatch.setattr(svc.jwk, "construct", lambda *a, **k: constructed.append(1) or real_construct(*a, **k))
+    monkeypatch.setattr(svc.jwt, "decode", lambda *a, **k: decoded.append(1) or real_decode(*a, **k))
+
+    assert svc.validate_token_local(token, jwks)["sub"] == "u1"
+    assert svc.validate_token_local(token, jwks)["sub"] == "u1"
+    assert svc.validate_token_local(other, jwks)["sub"] == "u1"
+    assert len(constructed) == 1
+    assert len(decoded) == 2
+
+    # Il payload restituito è una copia: modificarlo non altera la cache
+    svc.validate_token_local(token, jwks)["sub"] = "x"
+    assert svc.validate_token_local(token, jwks)["sub"] == "u1"
+
+
+def test_expired_or_unknown_tokens_are_rejected():
+    jwks, sign = make_signer()
+    _, sign_other = make_signer(kid="k2")
+    svc.verified_tokens.clear()
+
+    with pytest.raises(HTTPException) as exc:
+        svc.validate_token_local(sign(exp_in=-10), jwks)
+    assert exc.value.status_code == 401
+
+    # Chiave sconosciuta: 401, non 500
+    with pytest.raises(HTTPException) as exc:
+        svc.validate_token_local(sign_other(), jwks)
+    assert exc.value.status_code == 401
+
+    # Una voce in cache oltre la scadenza non viene più usata
+    token = sign()
+    payload = svc.validate_token_local(token, jwks)
+    key = next(iter(svc.verified_tokens))
+    svc.verified_tokens[key] = ({**payload, "sub": "stale", "exp": time.time() - 1}, "k1")
+    assert svc.validate_token_local(token, jwks)["sub"] == "u1"
+
+
+async def test_rotated_out_kid_is_not_served_from_cache(monkeypatch):
+    old_jwks, sign_old = make_signer(kid="old")
+    new_jwks, _ = make_signer(kid="new")
+    svc.verified_tokens.clear()
+    token = sign_old()
+    assert svc.validate_token_local(token, old_jwks)["sub"] == "u1"
+
+    # Anche passando direttamente il nuovo JWKS la voce in cache non vale più
+    with pytest.raises(svc.UnknownKeyError):
+        svc.validate_token_local(token, new_jwks)
+
+    # Il JwksStore svuota la cache quando installa un JWKS con chiavi diverse
+    svc.validate_token_local(token, old_jwks)
+    store = svc.JwksStore("http://jwks", refresh_after=3000, min_interval=0)
+    store.jwks = old_jwks
+    responses = iter([old_jwks, new_jwks])
+
+    async def fetch():
+        return next(responses)
+
+    monkeypatch.setattr(store, "_fetch", fetch)
+    await store.refresh()
+    assert len(svc.verified_tokens) == 1
+    await store.refresh()
+    assert len(svc.verified_tokens) == 0
+
+
+async def test_jwks_store_single_flight_stale_and_rate_limited(monkeypatch):
+    import asyncio
+    store = svc.JwksStore("http://jwks", refresh_after=3000, min_interval=30)
+    fetches = []
+    fail = False
+
+    async def fetch():
+        fetches.append(1)
+        await asyncio.sleep(0.01)
+        if fail:
+            raise HTTPException(status_code=503, detail="down")
+        return {"keys": [{"kid": f"k{len(fetches)}"}]}
+
+    monkeypatch.setattr(store, "_fetch", fetch)
+
+    results = await asyncio.gather(*(store.get() for _ in range(20)))
+    assert len(fetches) == 1 and all(r is results[0] for r in results)
+
+    # kid sconosciuto: un solo nuovo download, poi limitato da min_interval
+    assert (await store.refresh_for_unknown_kid())["keys"][0]["kid"] == "k1"
+    assert len(fetches) == 1
+    store._attempted_at -= 60
+    assert (await store.refresh_for_unknown_kid())["keys"][0]["kid"] == "k2"
+    assert len(fetches) == 2
+
+    # Supabase irraggiungibile: si continua con l'ultimo JWKS valido
+    fail = True
+    store._attempted_at -= 60
+    assert (await store.refresh())["keys"][0]["kid"] == "k2"
+
+    # Scadenza: aggiornamento in background senza attendere
+    fail = False
+    store._fetched_at -= 3600
+    store._attempted_at -= 60
+    assert (await store.get())["keys"][0]["kid"] == "k2"
+    await asyncio.sleep(0.05)
+    assert (await store.get())["keys"][0]["kid"] == "k4"